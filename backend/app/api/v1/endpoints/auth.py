@@ -1,18 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from eth_account.messages import encode_defunct
-from web3 import Web3
 from app.core.security import create_access_token
-from app.core.config import settings
 from app.db.base import get_db
 from app.models.user import User
 from app.schemas.user import UserCreate
+from app.services.signature_service import get_signature_service
 import secrets
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-w3 = Web3(Web3.HTTPProvider(settings.WEB3_PROVIDER_URI))
 
 @router.post("/nonce/{wallet_address}")
 async def get_nonce(wallet_address: str, db: Session = Depends(get_db)):
@@ -46,13 +43,10 @@ async def verify_signature(
         raise HTTPException(status_code=404, detail="User not found")
     
     message = f"Sign this message to verify your wallet: {user.nonce}"
-    message_hash = encode_defunct(text=message)
     
     try:
-        recovered_address = w3.eth.account.recover_message(
-            message_hash, signature=signature
-        )
-        if recovered_address.lower() != wallet_address.lower():
+        # Recovery is CPU-bound; the shared service batches it onto worker processes
+        if not await get_signature_service().verify(wallet_address, message, signature):
             raise HTTPException(status_code=400, detail="Invalid signature")
         
         # Create new access token
@@ -2,6 +2,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.v1.api import api_router
+from app.services.balance_snapshot import get_balance_snapshots
+from app.services.gas_oracle import get_gas_oracle
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -18,4 +20,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(api_router, prefix="/api/v1")
\ No newline at end of file
+app.include_router(api_router, prefix="/api/v1")
+
+
+@app.on_event("startup")
+def start_background_services():
+    """Keep fee suggestions and the managed wallets' balances fresh while the app runs"""
+    get_gas_oracle(settings.WEB3_PROVIDER_URI).start()
+    get_balance_snapshots(settings.WEB3_PROVIDER_URI).start()
+
+
+@app.on_event("shutdown")
+def stop_background_services():
+    get_balance_snapshots(settings.WEB3_PROVIDER_URI).stop()
+    get_gas_oracle(settings.WEB3_PROVIDER_URI).stop()
@@ -0,0 +1,530 @@
+"""
+Storage codecs for analytics event files
+
+JsonLinesCodec keeps the original one-JSON-object-per-line format.
+BinaryRecordCodec writes length-prefixed records with interned field names and
+typed numeric fields; the timestamp sits at a fixed position in every record,
+so time filters can run without decoding the event.
+
+Both codecs address records by byte offset, which is what segment positions
+and the user index store. Forward scans memory-map plain files and apply the
+time filter to the raw bytes, so rejected records are never materialized.
+Decoders accept a field tree (see utils.event_fields); the binary codec then
+skips unwanted fields by their stored length instead of decoding them.
+
+JSONL stays the default format. Binary files are about a quarter smaller and
+encode about as fast, and time-filtered scans are on par, but decoding whole
+records in Python runs 2-2.5x slower than the C JSON decoder. The binary
+codec therefore pays off for disk-bound stores and projected or filtered
+reads, not for full scans.
+"""
+
+import os
+import re
+import json
+import mmap
+import struct
+from typing import Dict, Any, Iterator, List, Optional, Tuple, BinaryIO
+
+from ..utils.file_reader import read_lines_reverse
+from ..utils.block_file import open_segment
+from ..utils.event_fields import FieldTree, project
+
+_LENGTH = struct.Struct("<I")
+_INT64 = struct.Struct("<q")
+_FLOAT64 = struct.Struct("<d")
+_CONTAINER = struct.Struct("<II")  # byte length of the items, item count
+# A tag together with its fixed-size payload or length prefix, packed in one call
+_TAGGED_INT64 = struct.Struct("<Bq")
+_TAGGED_FLOAT64 = struct.Struct("<Bd")
+_TAGGED_LENGTH = struct.Struct("<BI")
+# Field id and value tag at the start of a dict entry
+_ENTRY = struct.Struct("<IB")
+
+# Value tags of the binary record format
+TAG_NONE, TAG_FALSE, TAG_TRUE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_LIST, TAG_DICT, TAG_BIGINT = range(9)
+
+# Read size used when walking binary files backwards from EOF
+REVERSE_BLOCK_SIZE = 64 * 1024
+
+# Top-level keys as json.dumps writes them; string values escape their quotes,
+# so the first match in a line is the event's own key
+_TIMESTAMP_KEY = b'"timestamp": '
+_DATA_KEY = b'"data": '
+_INTEGER = re.compile(rb"-?[0-9]+(?=[,}])")
+
+# raw_decode on str skips json.loads' encoding detection and trailing-data checks
+_DECODER = json.JSONDecoder()
+
+
+def _loads(line: bytes) -> Dict[str, Any]:
+    return _DECODER.raw_decode(line.decode("utf-8").lstrip())[0]
+
+
+def _in_range(event_time: int, start_time: int = None, end_time: int = None) -> bool:
+    if start_time and event_time < start_time:
+        return False
+    if end_time and event_time > end_time:
+        return False
+    return True
+
+
+def _map_file(f) -> Optional[mmap.mmap]:
+    """Map a plain file read-only; None for compressed (unmappable) or empty files"""
+    try:
+        fileno = f.fileno()
+    except (AttributeError, OSError):
+        return None
+    if os.fstat(fileno).st_size == 0:
+        return None
+    return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+
+class JsonLinesCodec:
+    """One JSON document per line (the original storage format)"""
+
+    name = "jsonl"
+    extension = ".jsonl"
+    # Line boundaries can be found from any byte offset
+    splittable = True
+
+    def encode(self, event: Dict[str, Any]) -> bytes:
+        return (json.dumps(event) + "\n").encode("utf-8")
+
+    def decode(self, record: bytes, fields: FieldTree = None) -> Dict[str, Any]:
+        return project(_loads(record), fields)
+
+    @staticmethod
+    def _timestamp_at(buffer, start: int, end: int) -> Optional[int]:
+        """Integer timestamp of the line buffer[start:end] without decoding it, if found"""
+        key = buffer.find(_TIMESTAMP_KEY, start, end)
+        if key < 0:
+            return None
+        data_key = buffer.find(_DATA_KEY, start, key)
+        if data_key >= 0:
+            return None  # only a nested timestamp; let the decoder decide
+        match = _INTEGER.match(buffer, key + len(_TIMESTAMP_KEY), end)
+        return int(match.group()) if match else None
+
+    def decode_in_range(self, record: bytes, start_time: int = None, end_time: int = None,
+                        fields: FieldTree = None) -> Optional[Dict[str, Any]]:
+        """Decode a record, or return None if its timestamp is outside the range"""
+        if start_time or end_time:
+            event_time = self._timestamp_at(record, 0, len(record))
+            if event_time is not None and not _in_range(event_time, start_time, end_time):
+                return None
+        event = _loads(record)
+        if not _in_range(event.get("timestamp", 0), start_time, end_time):
+            return None
+        return project(event, fields)
+
+    def scan(self, f: BinaryIO, start: int = 0, end: int = None, start_time: int = None,
+             end_time: int = None, fields: FieldTree = None) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        """
+        Yield (start offset, end offset, event) for in-range events starting in [start, end)
+
+        Plain files are memory-mapped: line boundaries are found with find()
+        on the mapping and the timestamp is parsed in place, so only lines
+        that pass the time filter are copied out and decoded.
+        """
+        mapped = _map_file(f)
+        if mapped is None:
+            for record_start, record_end, record in self.iter_records(f, start, end):
+                event = self.decode_in_range(record, start_time, end_time, fields)
+                if event is not None:
+                    yield record_start, record_end, event
+            return
+
+        with mapped:
+            size = len(mapped)
+            limit = size if end is None else min(end, size)
+            position = start
+            if position > 0:
+                # A line belongs to the range it starts in; skip the one in progress
+                newline = mapped.find(b"\n", position - 1)
+                position = size if newline < 0 else newline + 1
+            filtered = bool(start_time or end_time)
+            while position < limit:
+                newline = mapped.find(b"\n", position)
+                line_end = size if newline < 0 else newline + 1
+                if filtered:
+                    event_time = self._timestamp_at(mapped, position, line_end)
+                    if event_time is not None and not _in_range(event_time, start_time, end_time):
+                        position = line_end
+                        continue
+                line = mapped[position:line_end]
+                if line.strip():
+                    event = _loads(line)
+                    if not filtered or _in_range(event.get("timestamp", 0), start_time, end_time):
+                        yield position, line_end, project(event, fields)
+                position = line_end
+
+    def iter_records(self, f: BinaryIO, start: int = 0,
+                     end: int = None) -> Iterator[Tuple[int, int, bytes]]:
+        """
+        Yield (start offset, end offset, record) for records starting in [start, end)
+
+        If start falls inside a line, that line belongs to the previous range
+        and is skipped.
+        """
+        position = start
+        if position > 0:
+            f.seek(position - 1)
+            position += len(f.readline()) - 1
+        else:
+            f.seek(0)
+        while end is None or position < end:
+            line = f.readline()
+            if not line:
+                break
+            record_start, position = position, position + len(line)
+            if line.strip():
+                yield record_start, position, line
+
+    def iter_records_reverse(self, path: str) -> Iterator[bytes]:
+        """Yield the records of a file newest first"""
+        for line in read_lines_reverse(path):
+            yield line.encode("utf-8")
+
+    def read_record_at(self, f: BinaryIO, offset: int) -> bytes:
+        f.seek(offset)
+        return f.readline()
+
+
+class FieldTable:
+    """Append-only table interning field names to integer ids"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        # Bytes of the file read into names so far
+        self._size = 0
+        self.reload()
+
+    def reload(self):
+        """Read the names appended since the last read, by any writer"""
+        try:
+            if os.path.getsize(self.path) <= self._size:
+                return
+        except OSError:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._size)
+            data = f.read()
+        # A name still being written is picked up by a later reload
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            name = json.loads(line)
+            # A name appended twice by racing writers keeps its first id
+            self.ids.setdefault(name, len(self.names))
+            self.names.append(name)
+        self._size += complete
+
+    def id_of(self, name: str) -> int:
+        field_id = self.ids.get(name)
+        if field_id is None:
+            # Another writer may have added it since the last read
+            self.reload()
+            field_id = self.ids.get(name)
+        if field_id is None:
+            # Ids are line numbers in the file, so the id is read back after appending
+            with open(self.path, "a") as f:
+                f.write(json.dumps(name) + "\n")
+            self.reload()
+            field_id = self.ids[name]
+        return field_id
+
+    def name_of(self, field_id: int) -> str:
+        if field_id >= len(self.names):
+            # Written by another process since we last looked
+            self.reload()
+        return self.names[field_id]
+
+
+class BinaryRecordCodec:
+    """
+    Length-prefixed binary records
+
+    Layout: <u32 n> <i64 timestamp> <value> <u32 n>, where n is the byte length
+    of timestamp + value. The trailing length allows reading files backwards.
+    Values are tagged; dict keys are field ids from a shared FieldTable, and
+    lists/dicts carry their byte length so readers can skip them unread.
+    """
+
+    name = "binary"
+    extension = ".rec"
+    # Record boundaries cannot be recovered from an arbitrary byte offset
+    splittable = False
+
+    def __init__(self, fields_path: str):
+        self.fields = FieldTable(fields_path)
+        # Field name -> its id packed as written before each dict value
+        self._packed_ids: Dict[str, bytes] = {}
+
+    def encode(self, event: Dict[str, Any]) -> bytes:
+        body = bytearray(_LENGTH.size)
+        body += _INT64.pack(int(event.get("timestamp", 0)))
+        self._encode_value(event, body)
+        length = len(body) - _LENGTH.size
+        _LENGTH.pack_into(body, 0, length)
+        body += _LENGTH.pack(length)
+        return bytes(body)
+
+    def _packed_id(self, key: Any) -> bytes:
+        name = str(key)
+        packed = self._packed_ids.get(name)
+        if packed is None:
+            packed = self._packed_ids[name] = _LENGTH.pack(self.fields.id_of(name))
+        return packed
+
+    def _encode_value(self, value: Any, out: bytearray):
+        # Exact types first: events are mostly str, int, float and dict values
+        kind = type(value)
+        if kind is str:
+            encoded = value.encode("utf-8")
+            out += _TAGGED_LENGTH.pack(TAG_STR, len(encoded))
+            out += encoded
+        elif kind is int and -(1 << 63) <= value < (1 << 63):
+            out += _TAGGED_INT64.pack(TAG_INT, value)
+        elif kind is float:
+            out += _TAGGED_FLOAT64.pack(TAG_FLOAT, value)
+        elif kind is dict:
+            out.append(TAG_DICT)
+            header = len(out)
+            out += _CONTAINER.pack(0, len(value))
+            packed_ids = self._packed_ids
+            for key, item in value.items():
+                out += packed_ids.get(key) or self._packed_id(key)
+                self._encode_value(item, out)
+            _CONTAINER.pack_into(out, header, len(out) - header - _CONTAINER.size, len(value))
+        elif value is None:
+            out.append(TAG_NONE)
+        elif value is True:
+            out.append(TAG_TRUE)
+        elif value is False:
+            out.append(TAG_FALSE)
+        elif isinstance(value, int):
+            if -(1 << 63) <= value < (1 << 63):
+                out.append(TAG_INT)
+                out += _INT64.pack(value)
+            else:
+                encoded = str(value).encode("ascii")
+                out.append(TAG_BIGINT)
+                out += _LENGTH.pack(len(encoded)) + encoded
+        elif isinstance(value, float):
+            out.append(TAG_FLOAT)
+            out += _FLOAT64.pack(value)
+        elif isinstance(value, str):
+            encoded = value.encode("utf-8")
+            out.append(TAG_STR)
+            out += _LENGTH.pack(len(encoded)) + encoded
+        elif isinstance(value, (list, tuple)):
+            out.append(TAG_LIST)
+            header = len(out)
+            out += _CONTAINER.pack(0, len(value))
+            for item in value:
+                self._encode_value(item, out)
+            _CONTAINER.pack_into(out, header, len(out) - header - _CONTAINER.size, len(value))
+        elif isinstance(value, dict):
+            out.append(TAG_DICT)
+            header = len(out)
+            out += _CONTAINER.pack(0, len(value))
+            for key, item in value.items():
+                out += self._packed_id(key)
+                self._encode_value(item, out)
+            _CONTAINER.pack_into(out, header, len(out) - header - _CONTAINER.size, len(value))
+        else:
+            raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+    def _decode_value(self, data: memoryview, pos: int) -> Tuple[Any, int]:
+        tag = data[pos]
+        pos += 1
+        if tag == TAG_STR:
+            end = pos + _LENGTH.size + _LENGTH.unpack_from(data, pos)[0]
+            return str(data[pos + _LENGTH.size:end], "utf-8"), end
+        if tag == TAG_INT:
+            return _INT64.unpack_from(data, pos)[0], pos + 8
+        if tag == TAG_DICT:
+            _, count = _CONTAINER.unpack_from(data, pos)
+            pos += _CONTAINER.size
+            names = self.fields.names
+            result = {}
+            for _ in range(count):
+                field_id, item_tag = _ENTRY.unpack_from(data, pos)
+                name = names[field_id] if field_id < len(names) else self.fields.name_of(field_id)
+                # Scalars are decoded inline, saving a call per field
+                if item_tag == TAG_STR:
+                    start = pos + _ENTRY.size + _LENGTH.size
+                    pos = start + _LENGTH.unpack_from(data, pos + _ENTRY.size)[0]
+                    result[name] = str(data[start:pos], "utf-8")
+                elif item_tag == TAG_INT:
+                    result[name] = _INT64.unpack_from(data, pos + _ENTRY.size)[0]
+                    pos += _ENTRY.size + 8
+                elif item_tag == TAG_FLOAT:
+                    result[name] = _FLOAT64.unpack_from(data, pos + _ENTRY.size)[0]
+                    pos += _ENTRY.size + 8
+                else:
+                    result[name], pos = self._decode_value(data, pos + _LENGTH.size)
+            return result, pos
+        if tag == TAG_FLOAT:
+            return _FLOAT64.unpack_from(data, pos)[0], pos + 8
+        if tag == TAG_NONE:
+            return None, pos
+        if tag == TAG_TRUE:
+            return True, pos
+        if tag == TAG_FALSE:
+            return False, pos
+        if tag == TAG_BIGINT:
+            end = pos + _LENGTH.size + _LENGTH.unpack_from(data, pos)[0]
+            return int(str(data[pos + _LENGTH.size:end], "ascii")), end
+        if tag == TAG_LIST:
+            _, count = _CONTAINER.unpack_from(data, pos)
+            pos += _CONTAINER.size
+            items = []
+            for _ in range(count):
+                item, pos = self._decode_value(data, pos)
+                items.append(item)
+            return items, pos
+        raise ValueError(f"Unknown value tag {tag}")
+
+    def _skip_value(self, data: memoryview, pos: int) -> int:
+        """Position just past the value at pos, without decoding it"""
+        tag = data[pos]
+        pos += 1
+        if tag in (TAG_NONE, TAG_TRUE, TAG_FALSE):
+            return pos
+        if tag in (TAG_INT, TAG_FLOAT):
+            return pos + 8
+        if tag in (TAG_STR, TAG_BIGINT):
+            return pos + _LENGTH.size + _LENGTH.unpack_from(data, pos)[0]
+        if tag in (TAG_LIST, TAG_DICT):
+            return pos + _CONTAINER.size + _CONTAINER.unpack_from(data, pos)[0]
+        raise ValueError(f"Unknown value tag {tag}")
+
+    def _decode_fields(self, data: memoryview, pos: int, fields: FieldTree) -> Any:
+        """Decode only the fields of the value at pos named by the field tree"""
+        if data[pos] != TAG_DICT:
+            return self._decode_value(data, pos)[0]
+        _, count = _CONTAINER.unpack_from(data, pos + 1)
+        pos += 1 + _CONTAINER.size
+        result = {}
+        for _ in range(count):
+            name = self.fields.name_of(_LENGTH.unpack_from(data, pos)[0])
+            pos += _LENGTH.size
+            if name not in fields:
+                pos = self._skip_value(data, pos)
+            elif fields[name] is None:
+                result[name], pos = self._decode_value(data, pos)
+            else:
+                result[name] = self._decode_fields(data, pos, fields[name])
+                pos = self._skip_value(data, pos)
+        return result
+
+    def timestamp(self, record: bytes) -> int:
+        """Timestamp of a record, read without decoding the event"""
+        return _INT64.unpack_from(record, 0)[0]
+
+    def decode(self, record: bytes, fields: FieldTree = None) -> Dict[str, Any]:
+        if fields is None:
+            return self._decode_value(memoryview(record), _INT64.size)[0]
+        return self._decode_fields(memoryview(record), _INT64.size, fields)
+
+    def decode_in_range(self, record: bytes, start_time: int = None, end_time: int = None,
+                        fields: FieldTree = None) -> Optional[Dict[str, Any]]:
+        """Decode a record, or return None if its timestamp is outside the range"""
+        if not _in_range(self.timestamp(record), start_time, end_time):
+            return None
+        return self.decode(record, fields)
+
+    def scan(self, f: BinaryIO, start: int = 0, end: int = None, start_time: int = None,
+             end_time: int = None, fields: FieldTree = None) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        """
+        Yield (start offset, end offset, event) for in-range records starting in [start, end)
+
+        Plain files are memory-mapped and decoded in place: headers and
+        timestamps are unpacked straight from the mapping and rejected
+        records are skipped by their length without being copied.
+        """
+        mapped = _map_file(f)
+        if mapped is None:
+            for record_start, record_end, record in self.iter_records(f, start, end):
+                event = self.decode_in_range(record, start_time, end_time, fields)
+                if event is not None:
+                    yield record_start, record_end, event
+            return
+
+        view = memoryview(mapped)
+        try:
+            size = len(mapped)
+            limit = size if end is None else min(end, size)
+            position = start
+            while position < limit and position + _LENGTH.size <= size:
+                length = _LENGTH.unpack_from(mapped, position)[0]
+                record_end = position + length + 2 * _LENGTH.size
+                if record_end > size:
+                    break  # torn write at the end of the file
+                body = position + _LENGTH.size
+                if _in_range(_INT64.unpack_from(mapped, body)[0], start_time, end_time):
+                    if fields is None:
+                        yield position, record_end, self._decode_value(view, body + _INT64.size)[0]
+                    else:
+                        yield position, record_end, self._decode_fields(view, body + _INT64.size, fields)
+                position = record_end
+        finally:
+            view.release()
+            mapped.close()
+
+    def iter_records(self, f: BinaryIO, start: int = 0,
+                     end: int = None) -> Iterator[Tuple[int, int, bytes]]:
+        """Yield (start offset, end offset, record body) from a record boundary"""
+        position = start
+        f.seek(position)
+        while end is None or position < end:
+            header = f.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                break
+            length = _LENGTH.unpack(header)[0]
+            rest = f.read(length + _LENGTH.size)
+            if len(rest) < length + _LENGTH.size:
+                break  # torn write at the end of the file
+            record_start, position = position, position + _LENGTH.size + len(rest)
+            yield record_start, position, rest[:length]
+
+    def iter_records_reverse(self, path: str) -> Iterator[bytes]:
+        """Yield the record bodies of a file newest first, following the trailing lengths"""
+        with open_segment(path) as f:
+            position = f.seek(0, os.SEEK_END)
+            # Holds the file from buffer_start on; records are unpacked in place by offset
+            buffer, buffer_start = b"", position
+
+            def read_back(size: int) -> int:
+                # Offset in the buffer of position, with [position - size, position) loaded
+                nonlocal buffer, buffer_start
+                if position - size < buffer_start:
+                    read_start = max(0, min(position - size, position - REVERSE_BLOCK_SIZE))
+                    f.seek(read_start)
+                    # Consumed bytes past position are dropped here, once per block
+                    buffer = f.read(buffer_start - read_start) + buffer[:position - buffer_start]
+                    buffer_start = read_start
+                return position - buffer_start
+
+            while position >= 2 * _LENGTH.size:
+                offset = read_back(_LENGTH.size)
+                length = _LENGTH.unpack_from(buffer, offset - _LENGTH.size)[0]
+                record_size = length + 2 * _LENGTH.size
+                if record_size <= position:
+                    offset = read_back(record_size) - record_size
+                if record_size > position or _LENGTH.unpack_from(buffer, offset)[0] != length:
+                    # Torn write at the end of the file: recover the record
+                    # boundaries with a forward pass over the intact prefix
+                    intact = [body for _, end, body in self.iter_records(f) if end <= position]
+                    yield from reversed(intact)
+                    return
+                yield buffer[offset + _LENGTH.size:offset + _LENGTH.size + length]
+                position -= record_size
+
+    def read_record_at(self, f: BinaryIO, offset: int) -> bytes:
+        f.seek(offset)
+        length = _LENGTH.unpack(f.read(_LENGTH.size))[0]
+        return f.read(length)
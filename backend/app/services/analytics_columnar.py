@@ -0,0 +1,502 @@
+"""
+Columnar storage for compacted analytics segments
+
+Closed JSONL segments are converted into one NumPy ``.npy`` file per column and
+memory-mapped on read, so the metric calculations can run as vectorized
+group-bys instead of looping over decoded event dictionaries.
+"""
+
+import os
+import json
+import shutil
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+from collections import defaultdict
+
+import numpy as np
+
+from .analytics_sampling import (
+    add_to_intent_bucket, ai_estimates, event_weight, merge_intent_buckets, new_intent_bucket
+)
+from ..utils.quantile_sketch import QuantileSketch, percentile_summary
+
+# String columns are dictionary encoded: int32 codes plus a vocabulary array
+DICT_COLUMNS = ("user_id", "quest_type", "quest_id", "intent")
+
+# Columns where the per-event paths treat any falsy value (e.g. "") as missing
+FALSY_MISSING_COLUMNS = ("quest_type", "intent")
+
+# Every event field ColumnBuilder.add reads, for partial decoding
+BUILDER_FIELDS = ("timestamp", "sample_weight", "data.success", "data.processing_time_ms", "data.xp_gained",
+                  "data.rewards") + tuple(f"data.{column}" for column in DICT_COLUMNS)
+
+
+def parse_amount(amount: Any) -> Optional[float]:
+    """Convert a reward amount to float, or None if it is not numeric"""
+    if isinstance(amount, bool) or not isinstance(amount, (int, float, str)):
+        return None
+    try:
+        return float(amount)
+    except (ValueError, TypeError):
+        return None
+
+
+class ColumnBatch:
+    """A set of equally long column arrays describing a run of events"""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.columns["timestamp"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def weights(self) -> np.ndarray:
+        """Sample weight of every row; segments compacted before sampling existed weigh 1"""
+        if "sample_weight" in self.columns:
+            return self.columns["sample_weight"]
+        return np.ones(len(self))
+
+    def code_of(self, column: str, value: str) -> int:
+        """Return the dictionary code of a value, or -1 if it never occurs"""
+        matches = np.nonzero(self.columns[f"{column}.vocab"] == value)[0]
+        return int(matches[0]) if len(matches) else -1
+
+    def present_codes(self, column: str) -> np.ndarray:
+        """Codes of a dictionary column with empty strings mapped to missing (-1)"""
+        codes = self.columns[column]
+        # Segments compacted before FALSY_MISSING_COLUMNS existed encoded "" as a value
+        empty = np.nonzero(self.columns[f"{column}.vocab"] == "")[0]
+        if column in FALSY_MISSING_COLUMNS and len(empty):
+            codes = np.where(codes == empty[0], -1, codes)
+        return codes
+
+    def strings(self, column: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Decode a dictionary encoded column, dropping missing values"""
+        codes = self.columns[column]
+        if mask is not None:
+            codes = codes[mask]
+        codes = codes[codes >= 0]
+        return np.asarray(self.columns[f"{column}.vocab"])[codes]
+
+    def time_mask(self, start_time: Optional[int] = None,
+                  end_time: Optional[int] = None) -> np.ndarray:
+        """Boolean row mask for events inside [start_time, end_time]"""
+        timestamps = self.columns["timestamp"]
+        mask = np.ones(len(timestamps), dtype=bool)
+        if start_time:
+            mask &= timestamps >= start_time
+        if end_time:
+            mask &= timestamps <= end_time
+        return mask
+
+    def reward_mask(self, row_mask: np.ndarray) -> np.ndarray:
+        """Project a row mask onto the exploded reward columns"""
+        return row_mask[self.columns["reward_row"]]
+
+
+class ColumnBuilder:
+    """Accumulates events into typed column buffers"""
+
+    def __init__(self):
+        self.timestamp = array("q")
+        self.sample_weight = array("d")
+        self.success = array("b")
+        self.processing_time_ms = array("d")
+        self.xp_gained = array("d")
+        self.reward_row = array("i")
+        self.reward_token = array("i")
+        self.reward_amount = array("d")
+        self.codes = {column: array("i") for column in DICT_COLUMNS}
+        self.vocabs = {column: {} for column in DICT_COLUMNS + ("reward_token",)}
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def _encode(self, column: str, value: Any) -> int:
+        if value is None or (column in FALSY_MISSING_COLUMNS and not value):
+            return -1
+        vocab = self.vocabs[column]
+        value = str(value)
+        code = vocab.get(value)
+        if code is None:
+            code = vocab[value] = len(vocab)
+        return code
+
+    def add(self, event: Dict[str, Any]):
+        """Append one decoded event"""
+        data = event.get("data", {})
+        row = len(self.timestamp)
+
+        self.timestamp.append(int(event.get("timestamp", 0)))
+        self.sample_weight.append(event_weight(event))
+        self.success.append(1 if data.get("success", False) else 0)
+        processing_time = parse_amount(data.get("processing_time_ms"))
+        self.processing_time_ms.append(np.nan if processing_time is None else processing_time)
+        xp_gained = parse_amount(data.get("xp_gained"))
+        self.xp_gained.append(xp_gained or 0.0)
+
+        for column in DICT_COLUMNS:
+            self.codes[column].append(self._encode(column, data.get(column)))
+
+        rewards = data.get("rewards", {})
+        if isinstance(rewards, dict):
+            for token, amount in rewards.items():
+                value = parse_amount(amount)
+                if value is not None:
+                    self.reward_row.append(row)
+                    self.reward_token.append(self._encode("reward_token", token))
+                    self.reward_amount.append(value)
+
+    def build(self) -> ColumnBatch:
+        """Freeze the buffers into NumPy arrays"""
+        columns = {
+            "timestamp": np.frombuffer(self.timestamp, dtype=np.int64),
+            "sample_weight": np.frombuffer(self.sample_weight, dtype=np.float64),
+            "success": np.frombuffer(self.success, dtype=np.int8),
+            "processing_time_ms": np.frombuffer(self.processing_time_ms, dtype=np.float64),
+            "xp_gained": np.frombuffer(self.xp_gained, dtype=np.float64),
+            "reward_row": np.frombuffer(self.reward_row, dtype=np.int32),
+            "reward_token": np.frombuffer(self.reward_token, dtype=np.int32),
+            "reward_amount": np.frombuffer(self.reward_amount, dtype=np.float64),
+        }
+        for column in DICT_COLUMNS:
+            columns[column] = np.frombuffer(self.codes[column], dtype=np.int32)
+        for column, vocab in self.vocabs.items():
+            # Vocabularies are built in code order, so list order is code order
+            columns[f"{column}.vocab"] = np.array(list(vocab), dtype=str)
+        return ColumnBatch(columns)
+
+
+class ColumnarStore:
+    """Reads and writes compacted segments as memory-mapped ``.npy`` columns"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _segment_dir(self, event_type: str, seq: int) -> str:
+        return f"{self.root}/{event_type}/{seq:08d}"
+
+    def has_segment(self, event_type: str, seq: int) -> bool:
+        return os.path.exists(f"{self._segment_dir(event_type, seq)}/meta.json")
+
+    def segment_meta(self, event_type: str, seq: int) -> Dict[str, Any]:
+        with open(f"{self._segment_dir(event_type, seq)}/meta.json", "r") as f:
+            return json.load(f)
+
+    def write_segment(self, event_type: str, seq: int, batch: ColumnBatch):
+        """Write a batch as a compacted segment; meta.json marks it complete"""
+        segment_dir = self._segment_dir(event_type, seq)
+        tmp_dir = f"{segment_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        for name, values in batch.columns.items():
+            np.save(f"{tmp_dir}/{name}.npy", values, allow_pickle=False)
+
+        timestamps = batch["timestamp"]
+        meta = {
+            "rows": len(batch),
+            "min_timestamp": int(timestamps.min()) if len(timestamps) else 0,
+            "max_timestamp": int(timestamps.max()) if len(timestamps) else 0,
+        }
+        with open(f"{tmp_dir}/meta.json", "w") as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(segment_dir, ignore_errors=True)
+        os.replace(tmp_dir, segment_dir)
+
+    def remove_segment(self, event_type: str, seq: int):
+        shutil.rmtree(self._segment_dir(event_type, seq), ignore_errors=True)
+
+    def load_segment(self, event_type: str, seq: int) -> ColumnBatch:
+        """Memory-map every column of a compacted segment"""
+        segment_dir = self._segment_dir(event_type, seq)
+        columns = {}
+        for filename in os.listdir(segment_dir):
+            if filename.endswith(".npy"):
+                columns[filename[:-4]] = np.load(f"{segment_dir}/{filename}", mmap_mode="r",
+                                                 allow_pickle=False)
+        return ColumnBatch(columns)
+
+
+def _count_codes(batch: ColumnBatch, column: str, mask: np.ndarray, out: Dict[str, int]):
+    """Add per-value counts of a dictionary column into `out`"""
+    codes = batch.present_codes(column)[mask]
+    vocab = batch[f"{column}.vocab"]
+    counts = np.bincount(codes[codes >= 0], minlength=len(vocab))
+    for code in np.nonzero(counts)[0]:
+        out[str(vocab[code])] += int(counts[code])
+
+
+def _sum_rewards(batch: ColumnBatch, mask: np.ndarray, out: Dict[str, float]):
+    """Add per-token reward totals of the selected rows into `out`"""
+    reward_mask = batch.reward_mask(mask)
+    tokens = batch["reward_token"][reward_mask]
+    vocab = batch["reward_token.vocab"]
+    totals = np.bincount(tokens, weights=batch["reward_amount"][reward_mask],
+                         minlength=len(vocab))
+    for code in np.nonzero(np.bincount(tokens, minlength=len(vocab)))[0]:
+        out[str(vocab[code])] += float(totals[code])
+
+
+def _average_duration(start_ids: np.ndarray, start_times: np.ndarray,
+                      complete_ids: np.ndarray, complete_times: np.ndarray) -> float:
+    """Pair completions with the latest start of the same quest_id"""
+    if not len(start_ids) or not len(complete_ids):
+        return 0
+    order = np.argsort(start_times, kind="stable")
+    ids, times = start_ids[order][::-1], start_times[order][::-1]
+    # np.unique returns first occurrences, i.e. the latest start of each quest
+    unique_ids, first = np.unique(ids, return_index=True)
+    latest_start = times[first]
+
+    positions = np.searchsorted(unique_ids, complete_ids)
+    positions[positions >= len(unique_ids)] = 0
+    matched = unique_ids[positions] == complete_ids
+    durations = complete_times[matched] - latest_start[positions[matched]]
+    durations = durations[durations > 0]
+    return float(durations.mean()) if len(durations) else 0
+
+
+class GameMetricsAggregator:
+    """
+    Incremental counterpart of AnalyticsService.calculate_game_metrics
+
+    Accepts compacted column batches and individually decoded events of the
+    three quest streams in any interleaving. Counts and reward totals are
+    folded immediately; only quest ids and timestamps are kept for pairing.
+    """
+
+    def __init__(self, game_id: str):
+        self.game_id = game_id
+        self.started_type = f"{game_id}_quest_started"
+        self.completed_type = f"{game_id}_quest_completed"
+        self.rewards_type = f"{game_id}_rewards_collected"
+        self.event_types = (self.started_type, self.completed_type, self.rewards_type)
+
+        self.total_quests = 0
+        self.completed_quests = 0
+        self.quest_types = defaultdict(int)
+        self.total_rewards = defaultdict(float)
+        self._start_ids: List[np.ndarray] = []
+        self._start_times: List[np.ndarray] = []
+        self._complete_ids: List[np.ndarray] = []
+        self._complete_times: List[np.ndarray] = []
+        self._raw_start_ids, self._raw_start_times = [], array("q")
+        self._raw_complete_ids, self._raw_complete_times = [], array("q")
+
+    def add_batch(self, event_type: str, batch: ColumnBatch, mask: np.ndarray):
+        """Fold the selected rows of a column batch"""
+        if event_type == self.rewards_type:
+            _sum_rewards(batch, mask, self.total_rewards)
+            return
+
+        has_id = mask & (batch["quest_id"] >= 0)
+        if event_type == self.started_type:
+            self.total_quests += int(mask.sum())
+            _count_codes(batch, "quest_type", mask, self.quest_types)
+            self._start_ids.append(batch.strings("quest_id", has_id))
+            self._start_times.append(batch["timestamp"][has_id])
+        elif event_type == self.completed_type:
+            self.completed_quests += int(mask.sum())
+            self._complete_ids.append(batch.strings("quest_id", has_id))
+            self._complete_times.append(batch["timestamp"][has_id])
+
+    def add_event(self, event_type: str, event: Dict[str, Any]):
+        """Fold one decoded event"""
+        data = event.get("data", {})
+        if event_type == self.rewards_type:
+            rewards = data.get("rewards", {})
+            if isinstance(rewards, dict):
+                for token, amount in rewards.items():
+                    value = parse_amount(amount)
+                    if value is not None:
+                        self.total_rewards[token] += value
+            return
+
+        quest_id = data.get("quest_id")
+        if event_type == self.started_type:
+            self.total_quests += 1
+            if data.get("quest_type"):
+                self.quest_types[str(data["quest_type"])] += 1
+            if quest_id is not None:
+                self._raw_start_ids.append(str(quest_id))
+                self._raw_start_times.append(int(event.get("timestamp", 0)))
+        elif event_type == self.completed_type:
+            self.completed_quests += 1
+            if quest_id is not None:
+                self._raw_complete_ids.append(str(quest_id))
+                self._raw_complete_times.append(int(event.get("timestamp", 0)))
+
+    def spawn(self) -> "GameMetricsAggregator":
+        """Empty aggregator with the same configuration, for partial aggregation"""
+        return GameMetricsAggregator(self.game_id)
+
+    def _pairing_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Concatenated (start ids, start times, completion ids, completion times)"""
+        return (
+            np.concatenate(self._start_ids + [np.array(self._raw_start_ids, dtype=str)]),
+            np.concatenate(self._start_times + [np.frombuffer(self._raw_start_times, dtype=np.int64)]),
+            np.concatenate(self._complete_ids + [np.array(self._raw_complete_ids, dtype=str)]),
+            np.concatenate(self._complete_times + [np.frombuffer(self._raw_complete_times, dtype=np.int64)]),
+        )
+
+    def merge(self, other: "GameMetricsAggregator"):
+        """Fold a partial aggregate computed over another partition"""
+        self.total_quests += other.total_quests
+        self.completed_quests += other.completed_quests
+        for quest_type, count in other.quest_types.items():
+            self.quest_types[quest_type] += count
+        for token, amount in other.total_rewards.items():
+            self.total_rewards[token] += amount
+        start_ids, start_times, complete_ids, complete_times = other._pairing_arrays()
+        self._start_ids.append(start_ids)
+        self._start_times.append(start_times)
+        self._complete_ids.append(complete_ids)
+        self._complete_times.append(complete_times)
+
+    def result(self) -> Dict[str, Any]:
+        avg_duration = _average_duration(*self._pairing_arrays())
+
+        return {
+            "total_quests": self.total_quests,
+            "completed_quests": self.completed_quests,
+            "completion_rate": self.completed_quests / self.total_quests if self.total_quests > 0 else 0,
+            "avg_quest_duration_seconds": avg_duration,
+            "quest_type_distribution": dict(self.quest_types),
+            "total_rewards": dict(self.total_rewards)
+        }
+
+
+def user_performance(user_id: str, completed_quests: Iterable[ColumnBatch],
+                     ai_decisions: Iterable[ColumnBatch]) -> Dict[str, Any]:
+    """Vectorized counterpart of AnalyticsService.calculate_user_performance"""
+    now = datetime.now()
+    # Local-midnight edges of the last 7 days, oldest first
+    days = [(now - timedelta(days=i)).replace(hour=0, minute=0, second=0, microsecond=0)
+            for i in range(6, -1, -1)]
+    edges = [int(day.timestamp()) for day in days] + [int((days[-1] + timedelta(days=1)).timestamp())]
+    daily_counts = np.zeros(7, dtype=np.int64)
+
+    quest_count = 0
+    total_xp = 0.0
+    rewards = defaultdict(float)
+    for batch in completed_quests:
+        code = batch.code_of("user_id", user_id)
+        if code < 0:
+            continue
+        mask = batch["user_id"] == code
+        quest_count += int(mask.sum())
+        total_xp += float(batch["xp_gained"][mask].sum())
+        _sum_rewards(batch, mask, rewards)
+        daily_counts += np.histogram(batch["timestamp"][mask], bins=edges)[0]
+
+    total_decisions = 0
+    successful_decisions = 0
+    for batch in ai_decisions:
+        code = batch.code_of("user_id", user_id)
+        if code < 0:
+            continue
+        mask = batch["user_id"] == code
+        weights = batch.weights()[mask]
+        total_decisions += float(weights.sum())
+        successful_decisions += float((weights * batch["success"][mask]).sum())
+
+    return {
+        "total_quests_completed": quest_count,
+        "total_rewards": dict(rewards),
+        "total_xp_gained": total_xp,
+        "rewards_per_quest": {
+            token: amount / quest_count if quest_count > 0 else 0
+            for token, amount in rewards.items()
+        },
+        "ai_success_rate": successful_decisions / total_decisions if total_decisions > 0 else 0,
+        "daily_activity": [
+            {"date": day.strftime("%Y-%m-%d"), "quests_completed": int(count)}
+            for day, count in zip(days, daily_counts)
+        ]
+    }
+
+
+class AIPerformanceAggregator:
+    """Incremental counterpart of AnalyticsService.get_ai_performance_metrics"""
+
+    event_types = ("ai_decision",)
+
+    def __init__(self):
+        self.intent_buckets = defaultdict(new_intent_bucket)
+        self.intent_sketches = defaultdict(QuantileSketch)
+
+    def add_batch(self, event_type: str, batch: ColumnBatch, mask: np.ndarray):
+        """Fold the selected rows of a column batch"""
+        # Decisions without an intent are reported under "unknown"
+        codes = batch.present_codes("intent")
+        intents = np.where(codes >= 0, codes, len(batch["intent.vocab"]))[mask]
+        vocab = np.append(batch["intent.vocab"], "unknown")
+        weights = np.asarray(batch.weights()[mask], dtype=np.float64)
+        var_terms = weights * (weights - 1)
+        success = batch["success"][mask] != 0
+        times = batch["processing_time_ms"][mask]
+        has_time = ~np.isnan(times)
+        times = np.where(has_time, times, 0.0)
+
+        def weighted(values: np.ndarray) -> np.ndarray:
+            return np.bincount(intents, weights=values, minlength=len(vocab))
+
+        columns = {
+            "samples": np.bincount(intents, minlength=len(vocab)),
+            "total": weighted(weights),
+            "success": weighted(weights * success),
+            "processing_time_sum": weighted(weights * times),
+            "processing_time_count": weighted(weights * has_time),
+            "total_var": weighted(var_terms),
+            "success_var": weighted(var_terms * success),
+            "processing_time_count_var": weighted(var_terms * has_time),
+            "processing_time_sum_var": weighted(var_terms * times),
+            "processing_time_sq_var": weighted(var_terms * times * times),
+        }
+        for code in np.nonzero(columns["samples"])[0]:
+            bucket = self.intent_buckets[str(vocab[code])]
+            for key, values in columns.items():
+                bucket[key] += values[code].item()
+
+        for code in np.unique(intents[has_time]):
+            rows = has_time & (intents == code)
+            self.intent_sketches[str(vocab[code])].add_many(times[rows], weights[rows])
+
+    def spawn(self) -> "AIPerformanceAggregator":
+        """Empty aggregator with the same configuration, for partial aggregation"""
+        return AIPerformanceAggregator()
+
+    def merge(self, other: "AIPerformanceAggregator"):
+        """Fold a partial aggregate computed over another partition"""
+        for intent, bucket in other.intent_buckets.items():
+            merge_intent_buckets(self.intent_buckets[intent], bucket)
+        for intent, sketch in other.intent_sketches.items():
+            self.intent_sketches[intent].merge(sketch)
+
+    def add_event(self, event_type: str, event: Dict[str, Any]):
+        """Fold one decoded event"""
+        data = event.get("data", {})
+        intent = str(data.get("intent") or "unknown")
+        weight = event_weight(event)
+        processing_time = parse_amount(data.get("processing_time_ms"))
+        add_to_intent_bucket(self.intent_buckets[intent], weight, data.get("success", False), processing_time)
+        if processing_time is not None:
+            self.intent_sketches[intent].add(processing_time, weight)
+
+    def result(self) -> Dict[str, Any]:
+        overall_sketch = QuantileSketch()
+        for sketch in self.intent_sketches.values():
+            overall_sketch.merge(sketch)
+
+        metrics = ai_estimates(self.intent_buckets)
+        for intent, intent_metrics in metrics["intent_metrics"].items():
+            intent_metrics["processing_time_percentiles_ms"] = percentile_summary(self.intent_sketches[intent])
+        metrics["processing_time_percentiles_ms"] = percentile_summary(overall_sketch)
+        return metrics
@@ -0,0 +1,149 @@
+"""
+In-memory buffer of recently tracked analytics events
+
+Each event type keeps its newest events in a bounded buffer ordered by
+timestamp, fed by AnalyticsService.track_event. A query whose start time
+lies inside the buffer's coverage is answered from memory with bisect; only
+older windows have to go to disk. Events are copied on the way in, and
+readers copy what they hand out (see copy_event), so neither the tracking
+caller nor a reader can change what others see.
+"""
+
+import time
+import bisect
+import threading
+from typing import Dict, Any, List, Optional
+
+from .analytics_sampling import event_weight
+
+
+_CONTAINERS = (dict, list, tuple)
+
+
+def copy_event(value: Any) -> Any:
+    """Copy the dicts and lists of an event; a fraction of the cost of copy.deepcopy"""
+    if isinstance(value, dict):
+        return {key: copy_event(item) if isinstance(item, _CONTAINERS) else item for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [copy_event(item) if isinstance(item, _CONTAINERS) else item for item in value]
+    return value
+
+
+class EventRingBuffer:
+    """
+    The newest ``capacity`` events of one type, ordered by timestamp
+
+    Storage is a list with a moving head that is compacted once the dead
+    prefix reaches ``capacity``, so appends are amortized O(1) and memory
+    stays within twice the capacity. Out-of-order timestamps are inserted
+    in place.
+    """
+
+    def __init__(self, capacity: int, complete_since: float):
+        self.capacity = capacity
+        self._timestamps: List[int] = []
+        self._events: List[Dict[str, Any]] = []
+        self._head = 0
+        # Every event of this type with timestamp >= complete_since is buffered
+        self.complete_since = complete_since
+        # Set once a sampled event arrives; counts then sum sample weights
+        self.weighted = False
+
+    def __len__(self) -> int:
+        return len(self._timestamps) - self._head
+
+    def append(self, timestamp: int, event: Dict[str, Any]):
+        if "sample_weight" in event:
+            self.weighted = True
+        if not self._timestamps or timestamp >= self._timestamps[-1]:
+            self._timestamps.append(timestamp)
+            self._events.append(event)
+        else:
+            index = bisect.bisect_right(self._timestamps, timestamp, self._head)
+            self._timestamps.insert(index, timestamp)
+            self._events.insert(index, event)
+
+        if len(self) > self.capacity:
+            # Evicting the oldest event limits coverage to what is still held
+            self.complete_since = max(self.complete_since, self._timestamps[self._head] + 1)
+            self._events[self._head] = None
+            self._head += 1
+            if self._head >= self.capacity:
+                del self._timestamps[:self._head]
+                del self._events[:self._head]
+                self._head = 0
+
+    def covers(self, start_time: Optional[int]) -> bool:
+        return start_time is not None and start_time >= self.complete_since
+
+    def _bounds(self, start_time: int, end_time: Optional[int]):
+        low = bisect.bisect_left(self._timestamps, start_time, self._head)
+        high = len(self._timestamps) if end_time is None else \
+            bisect.bisect_right(self._timestamps, end_time, self._head)
+        return low, high
+
+    def count(self, start_time: int, end_time: Optional[int] = None) -> float:
+        low, high = self._bounds(start_time, end_time)
+        if self.weighted:
+            return sum(event_weight(event) for event in self._events[low:high])
+        return max(0, high - low)
+
+    def events(self, start_time: int, end_time: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Buffered events in [start_time, end_time], most recent first"""
+        low, high = self._bounds(start_time, end_time)
+        return self._events[low:high][::-1]
+
+
+class RecentEvents:
+    """Per-event-type ring buffers of recently tracked events"""
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        # Events tracked before the buffers existed are only on disk
+        self.created_at = int(time.time())
+        self._buffers: Dict[str, EventRingBuffer] = {}
+        self._lock = threading.Lock()
+
+    def append(self, event_type: str, event: Dict[str, Any]):
+        event = copy_event(event)
+        with self._lock:
+            buffer = self._buffers.get(event_type)
+            if buffer is None:
+                buffer = self._buffers[event_type] = EventRingBuffer(self.capacity, self.created_at)
+            buffer.append(event.get("timestamp", 0), event)
+
+    def _covers(self, event_type: str, start_time: Optional[int]) -> bool:
+        if start_time is None or start_time < self.created_at:
+            return False
+        buffer = self._buffers.get(event_type)
+        # No buffer means nothing of this type was tracked since startup
+        return buffer is None or buffer.covers(start_time)
+
+    def events(self, event_type: str, start_time: Optional[int],
+               end_time: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Events in [start_time, end_time] most recent first, or None if not fully buffered
+
+        The events are the buffer's own; callers copy those they hand out,
+        as they are consumed, so taking the first few of a window stays cheap.
+        """
+        with self._lock:
+            if not self._covers(event_type, start_time):
+                return None
+            buffer = self._buffers.get(event_type)
+            return buffer.events(start_time, end_time) if buffer else []
+
+    def count(self, event_type: str, start_time: Optional[int],
+              end_time: Optional[int] = None) -> Optional[float]:
+        """Weighted number of events in [start_time, end_time], or None if not fully buffered"""
+        with self._lock:
+            if not self._covers(event_type, start_time):
+                return None
+            buffer = self._buffers.get(event_type)
+            return buffer.count(start_time, end_time) if buffer else 0
+
+    def horizon(self, event_type: str) -> int:
+        """Earliest start time the buffer of an event type can answer from"""
+        with self._lock:
+            buffer = self._buffers.get(event_type)
+            return int(buffer.complete_since) if buffer else self.created_at
@@ -0,0 +1,628 @@
+"""
+Incrementally maintained metric rollups for the analytics service
+
+Every tracked event updates per-game and per-intent counters bucketed by local
+calendar day, so game and AI metrics are answered by summing buckets instead
+of re-reading raw events. AI processing times additionally feed one quantile
+sketch per intent and day, merged over the requested window for percentiles.
+Per-user day buckets back the leaderboard and cohort queries. Events stored
+by a sampling policy count with their sample weight.
+
+Rollups are persisted incrementally: each flush appends one JSON line to a
+delta log holding only the days and keys changed since the previous flush,
+every entry overwriting the stored value. Replaying the base file and then
+the log is therefore idempotent, and the log is periodically folded into
+the base file by merging the two files, without touching the in-memory
+state. Per-user day buckets older than the longest named query period are
+folded into one archive bucket per user.
+"""
+
+import os
+import json
+import time
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Set, Tuple, List
+from collections import defaultdict
+
+from .analytics_columnar import parse_amount
+from .analytics_sampling import add_to_intent_bucket, ai_estimates, event_weight, new_intent_bucket
+from ..utils.quantile_sketch import QuantileSketch, percentile_summary
+
+GAME_EVENT_SUFFIXES = ("_quest_started", "_quest_completed", "_rewards_collected")
+
+# Quest starts that never complete are forgotten after this many seconds
+OPEN_START_MAX_AGE = 7 * 24 * 3600
+
+# Bumped when the persisted layout changes; older files are rebuilt from the events
+ROLLUP_VERSION = 4
+
+# Per-user day buckets older than this are folded into ARCHIVE_DAY; the longest
+# named period ("last_month") covers 30 days, so no period query needs them split
+USER_DAY_HORIZON = 31
+
+# Sorts before every real day, so only unbounded queries (start_day "") read it
+ARCHIVE_DAY = "0000-00-00"
+
+# The delta log is folded into the base file once it outgrows both
+LOG_COMPACT_MIN_BYTES = 4 * 1024 * 1024
+
+# Keyed state persisted as per-key deltas rather than per day; user_days
+# keys are "<day>:<user_id>", the day having a fixed width and no colon
+DELTA_MAPS = ("open_starts", "open_completions", "first_seen", "user_days")
+
+LEADERBOARD_METRICS = ("quests_completed", "xp_gained", "rewards", "ai_decisions", "ai_success_rate")
+
+
+def day_key(timestamp: int) -> str:
+    """Bucket key of a timestamp: its local calendar date"""
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d")
+
+
+def _new_game_bucket() -> Dict[str, Any]:
+    return {
+        "quests_started": 0,
+        "quests_completed": 0,
+        "quest_types": {},
+        "rewards": {},
+        "duration_sum": 0.0,
+        "duration_count": 0
+    }
+
+
+def _new_user_bucket() -> Dict[str, Any]:
+    return {
+        # game_id -> {"quests_completed", "xp_gained", "rewards"}
+        "games": {},
+        "ai_total": 0,
+        "ai_success": 0
+    }
+
+
+def _merge_user_bucket(target: Dict[str, Any], source: Dict[str, Any]):
+    target["ai_total"] += source["ai_total"]
+    target["ai_success"] += source["ai_success"]
+    for game_id, game in source["games"].items():
+        merged = target["games"].setdefault(game_id, {"quests_completed": 0, "xp_gained": 0.0, "rewards": {}})
+        merged["quests_completed"] += game["quests_completed"]
+        merged["xp_gained"] += game["xp_gained"]
+        for token, amount in game["rewards"].items():
+            merged["rewards"][token] = merged["rewards"].get(token, 0.0) + amount
+
+
+def _bucket_totals(bucket: Dict[str, Any], game_id: str = None) -> Dict[str, Any]:
+    """Quest and AI totals of a user bucket, quest totals optionally of one game"""
+    totals = {"quests_completed": 0, "xp_gained": 0.0, "rewards": defaultdict(float),
+              "ai_total": bucket["ai_total"], "ai_success": bucket["ai_success"]}
+    for bucket_game, game in bucket["games"].items():
+        if game_id and bucket_game != game_id:
+            continue
+        totals["quests_completed"] += game["quests_completed"]
+        totals["xp_gained"] += game["xp_gained"]
+        for token, amount in game["rewards"].items():
+            totals["rewards"][token] += amount
+    return totals
+
+
+def _apply_record(state: Dict[str, Any], record: Dict[str, Any]):
+    """Overlay one persisted record (base file or log line) onto plain loaded state"""
+    for day, content in record.get("days", {}).items():
+        if content:
+            state["days"][day] = content
+        else:
+            state["days"].pop(day, None)
+    for name in DELTA_MAPS:
+        for key, value in record.get(name, {}).items():
+            if value is None:
+                state[name].pop(key, None)
+            else:
+                state[name][key] = value
+    state["watermarks"].update(record.get("watermarks", {}))
+
+
+def _read_records(base_path: str, log_path: str) -> Optional[Dict[str, Any]]:
+    """Merge the base file and the delta log; None if either has another layout version"""
+    state = {"days": {}, "watermarks": {}, **{name: {} for name in DELTA_MAPS}}
+    if os.path.exists(base_path):
+        with open(base_path, "r") as f:
+            record = json.load(f)
+        if record.get("version", 1) != ROLLUP_VERSION:
+            return None
+        _apply_record(state, record)
+    if os.path.exists(log_path):
+        with open(log_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn final line
+                if record.get("version") != ROLLUP_VERSION:
+                    return None
+                _apply_record(state, record)
+    return state
+
+
+def cohort_key(timestamp: int, cohort_by: str) -> str:
+    """Cohort of a first-seen timestamp: its local day, ISO week start or month"""
+    date = datetime.fromtimestamp(timestamp)
+    if cohort_by == "day":
+        return date.strftime("%Y-%m-%d")
+    if cohort_by == "month":
+        return date.strftime("%Y-%m")
+    return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+
+
+def split_game_event_type(event_type: str) -> Optional[Tuple[str, str]]:
+    """Split '<game_id>_quest_started' style event types into (game_id, suffix)"""
+    for suffix in GAME_EVENT_SUFFIXES:
+        if event_type.endswith(suffix) and len(event_type) > len(suffix):
+            return event_type[:-len(suffix)], suffix
+    return None
+
+
+class MetricRollups:
+    """Per-day counters for game and AI metrics, persisted incrementally"""
+
+    def __init__(self, path: str, flush_interval: float = 30.0):
+        self.path = path
+        self.log_path = f"{path}.log"
+        self.flush_interval = flush_interval
+        self._last_flush = time.time()
+
+        # game_id -> day -> bucket
+        self.games: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        # day -> intent -> bucket
+        self.intents: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        # day -> intent -> processing_time_ms sketch, merged per query window
+        self.latency_sketches: Dict[str, Dict[str, QuantileSketch]] = defaultdict(dict)
+        # "<game_id>:<quest_id>" -> timestamp of a start (or completion) still
+        # waiting for its counterpart, for duration pairing in either order
+        self.open_starts: Dict[str, int] = {}
+        self.open_completions: Dict[str, int] = {}
+        # user_id -> day -> bucket
+        self.users: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        # day -> users with a bucket on that day
+        self._day_users: Dict[str, Set[str]] = defaultdict(set)
+        # user_id -> running total of all the user's day buckets, for unbounded queries
+        self.user_totals: Dict[str, Dict[str, Any]] = defaultdict(_new_user_bucket)
+        # user_id -> timestamp of the user's earliest event, for cohorts
+        self.first_seen: Dict[str, int] = {}
+        # event_type -> [segment seq, byte offset] of the last applied event
+        self.watermarks: Dict[str, list] = {}
+
+        # Changes not yet persisted
+        self._dirty_days: Set[str] = set()
+        self._dirty_keys: Dict[str, Set[str]] = {name: set() for name in DELTA_MAPS}
+        self._written_watermarks: Dict[str, list] = {}
+        self._archived_through = ""
+
+    def load(self) -> bool:
+        """
+        Load persisted rollups
+
+        Returns:
+            False when none exist yet or they have an older layout; older files
+            are removed so the rollups can be rebuilt from the events
+        """
+        if not os.path.exists(self.path) and not os.path.exists(self.log_path):
+            return False
+        state = _read_records(self.path, self.log_path)
+        if state is None:
+            self.remove_files()
+            return False
+
+        for day, content in state["days"].items():
+            for game_id, bucket in content.get("games", {}).items():
+                self.games[game_id][day] = bucket
+            if content.get("intents"):
+                self.intents[day] = content["intents"]
+            if content.get("latency_sketches"):
+                self.latency_sketches[day] = {
+                    intent: QuantileSketch.from_dict(sketch)
+                    for intent, sketch in content["latency_sketches"].items()
+                }
+        for key, bucket in state["user_days"].items():
+            day, _, user_id = key.partition(":")
+            self.users[user_id][day] = bucket
+            self._day_users[day].add(user_id)
+            _merge_user_bucket(self.user_totals[user_id], bucket)
+        self.open_starts = state["open_starts"]
+        self.open_completions = state["open_completions"]
+        self.first_seen = state["first_seen"]
+        self.watermarks = state["watermarks"]
+        self._written_watermarks = {key: list(value) for key, value in self.watermarks.items()}
+        return True
+
+    def remove_files(self):
+        """Delete the persisted base file and delta log"""
+        for path in (self.path, self.log_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _day_content(self, day: str) -> Dict[str, Any]:
+        content = {}
+        games = {game_id: days[day] for game_id, days in self.games.items() if day in days}
+        if games:
+            content["games"] = games
+        if self.intents.get(day):
+            content["intents"] = self.intents[day]
+        if self.latency_sketches.get(day):
+            content["latency_sketches"] = {
+                intent: sketch.to_dict() for intent, sketch in self.latency_sketches[day].items()
+            }
+        return content
+
+    def flush_due(self) -> bool:
+        return time.time() - self._last_flush >= self.flush_interval
+
+    def take_delta(self) -> Optional[str]:
+        """
+        Serialize the changes since the last take as one log line
+
+        Must run under the lock serializing apply(); only changed days and
+        keys are serialized, so the cost follows the write rate rather than
+        the size of the rollups. The returned line is written with
+        write_delta(), outside that lock.
+
+        Returns:
+            The log line, or None if nothing changed
+        """
+        self._prune_open_starts()
+        self._archive_user_days()
+        self._last_flush = time.time()
+        if not self._dirty_days and not any(self._dirty_keys.values()) \
+                and self.watermarks == self._written_watermarks:
+            return None
+
+        record = {
+            "version": ROLLUP_VERSION,
+            "days": {day: self._day_content(day) for day in sorted(self._dirty_days)},
+            "watermarks": self.watermarks,
+        }
+        for name in DELTA_MAPS:
+            record[name] = {key: self._delta_value(name, key) for key in self._dirty_keys[name]}
+        line = json.dumps(record) + "\n"
+
+        self._dirty_days = set()
+        self._dirty_keys = {name: set() for name in DELTA_MAPS}
+        self._written_watermarks = {key: list(value) for key, value in self.watermarks.items()}
+        return line
+
+    def requeue(self, line: str):
+        """Mark the changes of a delta that could not be written as unpersisted again (apply() lock held)"""
+        record = json.loads(line)
+        self._dirty_days.update(record["days"])
+        for name in DELTA_MAPS:
+            self._dirty_keys[name].update(record[name])
+        self._written_watermarks = {}
+
+    def write_delta(self, line: str):
+        """
+        Append a delta taken by take_delta() and fold the log into the base file when large
+
+        Callers serialize writes, in the order the deltas were taken.
+        """
+        with open(self.log_path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        log_size = os.path.getsize(self.log_path)
+        base_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if log_size >= max(LOG_COMPACT_MIN_BYTES, base_size):
+            self.compact_files()
+
+    def compact_files(self):
+        """Fold the delta log into the base file; a crash in between only replays the log again"""
+        state = _read_records(self.path, self.log_path)
+        if state is None:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": ROLLUP_VERSION, **state}, f)
+        os.replace(tmp_path, self.path)
+        open(self.log_path, "w").close()
+
+    def flush(self):
+        """Persist every pending change now (writer's lock held, no concurrent flush)"""
+        line = self.take_delta()
+        if line is not None:
+            self.write_delta(line)
+
+    def _delta_value(self, name: str, key: str) -> Any:
+        """Current value of a delta-persisted key, None if it was removed"""
+        if name == "user_days":
+            day, _, user_id = key.partition(":")
+            return self.users.get(user_id, {}).get(day)
+        return getattr(self, name).get(key)
+
+    def _set_open(self, name: str, key: str, timestamp: int):
+        getattr(self, name)[key] = timestamp
+        self._dirty_keys[name].add(key)
+
+    def _pop_open(self, name: str, key: str) -> Optional[int]:
+        value = getattr(self, name).pop(key, None)
+        if value is not None:
+            self._dirty_keys[name].add(key)
+        return value
+
+    def _prune_open_starts(self):
+        cutoff = time.time() - OPEN_START_MAX_AGE
+        for name in ("open_starts", "open_completions"):
+            values = getattr(self, name)
+            for key in [key for key, timestamp in values.items() if timestamp < cutoff]:
+                self._pop_open(name, key)
+
+    def _archive_user_days(self):
+        """Fold per-user day buckets past USER_DAY_HORIZON into each user's ARCHIVE_DAY bucket"""
+        cutoff = day_key(int(time.time()) - USER_DAY_HORIZON * 86400)
+        if cutoff == self._archived_through:
+            return
+        for day in [day for day in self._day_users if ARCHIVE_DAY < day < cutoff]:
+            for user_id in self._day_users.pop(day):
+                bucket = self.users[user_id].pop(day)
+                _merge_user_bucket(self._user_bucket(user_id, ARCHIVE_DAY), bucket)
+                self._dirty_keys["user_days"].add(f"{day}:{user_id}")
+        self._archived_through = cutoff
+
+    def _add_duration(self, game_id: str, started_at: int, completed_at: int):
+        """Credit a paired quest duration to the bucket of its completion day"""
+        if completed_at > started_at:
+            day = day_key(completed_at)
+            self._dirty_days.add(day)
+            bucket = self.games[game_id].setdefault(day, _new_game_bucket())
+            bucket["duration_sum"] += completed_at - started_at
+            bucket["duration_count"] += 1
+
+    def apply(self, event_type: str, event: Dict[str, Any], position: Tuple[int, int] = None):
+        """
+        Fold one stored event into the rollups
+
+        Args:
+            event_type: Type of the event
+            event: The stored event dictionary
+            position: (segment seq, byte offset) just past the event on disk
+        """
+        if position is not None:
+            self.watermarks[event_type] = list(position)
+
+        timestamp = event.get("timestamp", 0)
+        data = event.get("data", {})
+        day = day_key(timestamp)
+        self._dirty_days.add(day)
+        weight = event_weight(event)
+        self._apply_user(event_type, data, timestamp, day, weight)
+
+        if event_type == "ai_decision":
+            intent = data.get("intent") or "unknown"
+            bucket = self.intents[day].setdefault(intent, new_intent_bucket())
+            processing_time = parse_amount(data.get("processing_time_ms"))
+            add_to_intent_bucket(bucket, weight, data.get("success", False), processing_time)
+            if processing_time is not None:
+                if intent not in self.latency_sketches[day]:
+                    self.latency_sketches[day][intent] = QuantileSketch()
+                self.latency_sketches[day][intent].add(processing_time, weight)
+            return
+
+        game_event = split_game_event_type(event_type)
+        if game_event is None:
+            return
+        game_id, suffix = game_event
+        bucket = self.games[game_id].setdefault(day, _new_game_bucket())
+        quest_key = f"{game_id}:{data['quest_id']}" if data.get("quest_id") else None
+
+        if suffix == "_quest_started":
+            bucket["quests_started"] += 1
+            quest_type = data.get("quest_type")
+            if quest_type:
+                bucket["quest_types"][quest_type] = bucket["quest_types"].get(quest_type, 0) + 1
+            if quest_key:
+                completed_at = self._pop_open("open_completions", quest_key)
+                if completed_at is not None:
+                    self._add_duration(game_id, timestamp, completed_at)
+                else:
+                    self._set_open("open_starts", quest_key, timestamp)
+        elif suffix == "_quest_completed":
+            bucket["quests_completed"] += 1
+            if quest_key:
+                started_at = self._pop_open("open_starts", quest_key)
+                if started_at is not None:
+                    self._add_duration(game_id, started_at, timestamp)
+                else:
+                    # Replays read one event type at a time, so the start may come later
+                    self._set_open("open_completions", quest_key, timestamp)
+        else:
+            rewards = data.get("rewards", {})
+            if isinstance(rewards, dict):
+                for token, amount in rewards.items():
+                    value = parse_amount(amount)
+                    if value is not None:
+                        bucket["rewards"][token] = bucket["rewards"].get(token, 0.0) + value
+
+    def _apply_user(self, event_type: str, data: Dict[str, Any], timestamp: int, day: str,
+                    weight: float = 1):
+        """Fold an event into its user's day bucket, if it carries a user_id"""
+        if data.get("user_id") is None:
+            return
+        user_id = str(data["user_id"])
+        if user_id not in self.first_seen or timestamp < self.first_seen[user_id]:
+            self.first_seen[user_id] = timestamp
+            self._dirty_keys["first_seen"].add(user_id)
+
+        if event_type == "ai_decision":
+            for bucket in (self._user_bucket(user_id, day), self.user_totals[user_id]):
+                bucket["ai_total"] += weight
+                if data.get("success", False):
+                    bucket["ai_success"] += weight
+            return
+
+        game_event = split_game_event_type(event_type)
+        if game_event is None or game_event[1] != "_quest_completed":
+            return
+        xp_gained = parse_amount(data.get("xp_gained")) or 0.0
+        rewards = data.get("rewards", {})
+        rewards = {token: parse_amount(amount) for token, amount in rewards.items()} if isinstance(rewards, dict) else {}
+        for bucket in (self._user_bucket(user_id, day), self.user_totals[user_id]):
+            game = bucket["games"].setdefault(game_event[0], {"quests_completed": 0, "xp_gained": 0.0, "rewards": {}})
+            game["quests_completed"] += 1
+            game["xp_gained"] += xp_gained
+            for token, value in rewards.items():
+                if value is not None:
+                    game["rewards"][token] = game["rewards"].get(token, 0.0) + value
+
+    def _user_bucket(self, user_id: str, day: str) -> Dict[str, Any]:
+        """A user's bucket of a day, created if needed and marked as changed"""
+        bucket = self.users[user_id].get(day)
+        if bucket is None:
+            bucket = self.users[user_id][day] = _new_user_bucket()
+            self._day_users[day].add(user_id)
+        self._dirty_keys["user_days"].add(f"{day}:{user_id}")
+        return bucket
+
+    def _window_buckets(self, start_day: str = "") -> Dict[str, Dict[str, Any]]:
+        """
+        Each user's day buckets from start_day (inclusive) onwards, merged into one
+
+        Unbounded queries read the running totals; windows merge only the
+        buckets of the days they cover, so either costs nothing per user
+        without activity in the window.
+        """
+        if not start_day:
+            return self.user_totals
+        merged = defaultdict(_new_user_bucket)
+        for day, user_ids in self._day_users.items():
+            if day < start_day:
+                continue
+            for user_id in user_ids:
+                _merge_user_bucket(merged[user_id], self.users[user_id][day])
+        return merged
+
+    def leaderboard(self, metric: str, start_day: str = "", limit: int = 100, token: str = None,
+                    game_id: str = None, min_decisions: int = 1) -> List[Dict[str, Any]]:
+        """
+        Top users by a metric over the day buckets from start_day onwards
+
+        Only users with activity in the window are scored, from the running
+        totals or the window's day buckets, and selection keeps a heap of at
+        most ``limit`` entries.
+        """
+        if metric not in LEADERBOARD_METRICS:
+            raise ValueError(f"Unknown leaderboard metric: {metric}")
+        if metric == "rewards" and not token:
+            raise ValueError("The rewards leaderboard needs a token")
+
+        def scored_users():
+            for user_id, bucket in self._window_buckets(start_day).items():
+                totals = _bucket_totals(bucket, game_id)
+                if metric == "rewards":
+                    value = totals["rewards"].get(token, 0.0)
+                elif metric == "ai_decisions":
+                    value = totals["ai_total"]
+                elif metric == "ai_success_rate":
+                    if totals["ai_total"] < max(min_decisions, 1):
+                        continue
+                    value = totals["ai_success"] / totals["ai_total"]
+                else:
+                    value = totals[metric]
+                if value:
+                    yield value, user_id
+
+        top = heapq.nlargest(limit, scored_users(), key=lambda item: item[0])
+        return [
+            {"rank": rank, "user_id": user_id, "value": value}
+            for rank, (value, user_id) in enumerate(top, start=1)
+        ]
+
+    def cohort_metrics(self, start_day: str = "", cohort_by: str = "week",
+                       cohorts: Optional[Dict[str, List[str]]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        AI success and quest activity per user cohort
+
+        Users are grouped by the day, week or month they were first seen,
+        unless explicit ``cohorts`` (name -> user ids) are given.
+        """
+        if cohorts is None:
+            cohorts = defaultdict(list)
+            for user_id, first_seen in self.first_seen.items():
+                cohorts[cohort_key(first_seen, cohort_by)].append(user_id)
+
+        buckets = self._window_buckets(start_day)
+        results = {}
+        for cohort, user_ids in sorted(cohorts.items()):
+            active_users = 0
+            quests_completed = 0
+            ai_total = 0
+            ai_success = 0
+            for user_id in user_ids:
+                bucket = buckets.get(str(user_id))
+                if bucket is None:
+                    continue
+                totals = _bucket_totals(bucket)
+                if totals["ai_total"] or totals["quests_completed"]:
+                    active_users += 1
+                quests_completed += totals["quests_completed"]
+                ai_total += totals["ai_total"]
+                ai_success += totals["ai_success"]
+            results[cohort] = {
+                "users": len(user_ids),
+                "active_users": active_users,
+                "quests_completed": quests_completed,
+                "ai_decisions": ai_total,
+                "ai_success_rate": ai_success / ai_total if ai_total > 0 else 0
+            }
+        return results
+
+    def game_metrics(self, game_id: str, start_day: str = "") -> Dict[str, Any]:
+        """Sum the game buckets from start_day (inclusive) onwards"""
+        total_quests = 0
+        completed_quests = 0
+        duration_sum = 0.0
+        duration_count = 0
+        quest_types = defaultdict(int)
+        total_rewards = defaultdict(float)
+
+        for day, bucket in self.games.get(game_id, {}).items():
+            if day < start_day:
+                continue
+            total_quests += bucket["quests_started"]
+            completed_quests += bucket["quests_completed"]
+            duration_sum += bucket["duration_sum"]
+            duration_count += bucket["duration_count"]
+            for quest_type, count in bucket["quest_types"].items():
+                quest_types[quest_type] += count
+            for token, amount in bucket["rewards"].items():
+                total_rewards[token] += amount
+
+        return {
+            "total_quests": total_quests,
+            "completed_quests": completed_quests,
+            "completion_rate": completed_quests / total_quests if total_quests > 0 else 0,
+            "avg_quest_duration_seconds": duration_sum / duration_count if duration_count else 0,
+            "quest_type_distribution": dict(quest_types),
+            "total_rewards": dict(total_rewards)
+        }
+
+    def ai_metrics(self, start_day: str = "") -> Dict[str, Any]:
+        """Sum the intent buckets from start_day (inclusive) onwards"""
+        intent_totals = defaultdict(new_intent_bucket)
+        for day, intents in self.intents.items():
+            if day < start_day:
+                continue
+            for intent, bucket in intents.items():
+                totals = intent_totals[intent]
+                for key, value in bucket.items():
+                    totals[key] += value
+
+        overall_sketch = QuantileSketch()
+        intent_sketches = defaultdict(QuantileSketch)
+        for day, sketches in self.latency_sketches.items():
+            if day < start_day:
+                continue
+            for intent, sketch in sketches.items():
+                intent_sketches[intent].merge(sketch)
+                overall_sketch.merge(sketch)
+
+        metrics = ai_estimates(intent_totals)
+        for intent, intent_metrics in metrics["intent_metrics"].items():
+            intent_metrics["processing_time_percentiles_ms"] = percentile_summary(intent_sketches[intent])
+        metrics["processing_time_percentiles_ms"] = percentile_summary(overall_sketch)
+        return metrics
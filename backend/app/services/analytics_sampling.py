@@ -0,0 +1,236 @@
+"""
+Ingest-time sampling of analytics events and the matching weighted estimators
+
+A sampling policy decides which tracked events of one type are stored. Every
+stored event of a sampled type carries ``sample_weight``, the inverse of its
+inclusion probability, so sums of weights are unbiased (Horvitz-Thompson)
+estimates of what the full stream would have produced. Alongside the weighted
+sums, the AI intent buckets keep sums of ``w * (w - 1)`` terms, from which the
+variance of each estimate and a normal-approximation confidence interval are
+derived; for unsampled events the terms are zero and the intervals collapse
+onto the exact values.
+"""
+
+import math
+import time
+import random
+from typing import Dict, Any, List, Optional, Tuple
+
+# Event types whose metrics use the weighted estimators; quest streams are
+# counted and paired exactly, so they cannot be sampled
+SAMPLED_EVENT_TYPES = frozenset({"ai_decision"})
+
+# Two-sided 95% normal quantile
+CONFIDENCE_LEVEL = 0.95
+Z_SCORE = 1.959964
+
+
+def event_weight(event: Dict[str, Any]) -> float:
+    """Number of tracked events a stored event stands for"""
+    weight = event.get("sample_weight", 1)
+    return weight if isinstance(weight, (int, float)) and not isinstance(weight, bool) else 1
+
+
+class SamplingPolicy:
+    """Decides which tracked events of one type are stored"""
+
+    def offer(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Offer a tracked event
+
+        Returns:
+            Events to store now (possibly none, possibly earlier ones), with sample_weight set
+        """
+        raise NotImplementedError
+
+    def drain(self, force: bool = False) -> List[Dict[str, Any]]:
+        """Events held back by the policy that are due for storage (all of them if force)"""
+        return []
+
+
+class RateSampling(SamplingPolicy):
+    """Keep 1 in ``n`` events: each event is stored independently with probability 1/n"""
+
+    def __init__(self, n: int, seed: Optional[int] = None):
+        if n < 1:
+            raise ValueError("n must be at least 1")
+        self.n = n
+        self._random = random.Random(seed)
+
+    def offer(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if self.n == 1:
+            return [event]
+        if self._random.random() * self.n >= 1:
+            return []
+        event["sample_weight"] = self.n
+        return [event]
+
+
+class ReservoirSampling(SamplingPolicy):
+    """
+    Keep at most ``size`` events per time window, chosen uniformly at random
+
+    Events of the current window are held in memory and stored when the
+    window closes, each weighted by (events seen in the window) / (events
+    kept). Held events are not yet visible to queries and are lost if the
+    process dies before they are stored, so windows should stay short.
+    The variance terms treat the sample as if drawn independently, which
+    overstates the uncertainty of a fixed-size sample: intervals are
+    conservative.
+    """
+
+    def __init__(self, size: int, window_seconds: int = 60, seed: Optional[int] = None):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.window_seconds = window_seconds
+        self._random = random.Random(seed)
+        self._window: Optional[int] = None
+        self._seen = 0
+        self._reservoir: List[Dict[str, Any]] = []
+
+    def _window_of(self, now: float) -> int:
+        return int(now // self.window_seconds)
+
+    def offer(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        ready = self.drain()
+        self._window = self._window_of(time.time())
+        self._seen += 1
+        if len(self._reservoir) < self.size:
+            self._reservoir.append(event)
+        else:
+            # Algorithm R: the i-th event replaces a kept one with probability size / i
+            slot = self._random.randrange(self._seen)
+            if slot < self.size:
+                self._reservoir[slot] = event
+        return ready
+
+    def drain(self, force: bool = False) -> List[Dict[str, Any]]:
+        if self._window is None or (not force and self._window_of(time.time()) == self._window):
+            return []
+        sample, seen = self._reservoir, self._seen
+        self._window, self._seen, self._reservoir = None, 0, []
+        if len(sample) < seen:
+            weight = seen / len(sample)
+            for event in sample:
+                event["sample_weight"] = weight
+        return sorted(sample, key=lambda event: event.get("timestamp", 0))
+
+
+def new_intent_bucket() -> Dict[str, Any]:
+    return {
+        # Weighted sums: estimates of the unsampled totals
+        "total": 0,
+        "success": 0,
+        "processing_time_sum": 0.0,
+        "processing_time_count": 0,
+        # Stored events, and sums of w * (w - 1) terms for the variance estimates
+        "samples": 0,
+        "total_var": 0.0,
+        "success_var": 0.0,
+        "processing_time_count_var": 0.0,
+        "processing_time_sum_var": 0.0,
+        "processing_time_sq_var": 0.0
+    }
+
+
+def add_to_intent_bucket(bucket: Dict[str, Any], weight: float, success: bool,
+                         processing_time: Optional[float]):
+    """Fold one stored AI decision of the given sample weight into an intent bucket"""
+    var_term = weight * (weight - 1)
+    bucket["samples"] += 1
+    bucket["total"] += weight
+    bucket["total_var"] += var_term
+    if success:
+        bucket["success"] += weight
+        bucket["success_var"] += var_term
+    if processing_time is not None:
+        bucket["processing_time_sum"] += weight * processing_time
+        bucket["processing_time_count"] += weight
+        bucket["processing_time_count_var"] += var_term
+        bucket["processing_time_sum_var"] += var_term * processing_time
+        bucket["processing_time_sq_var"] += var_term * processing_time * processing_time
+
+
+def merge_intent_buckets(target: Dict[str, Any], source: Dict[str, Any]):
+    for key, value in source.items():
+        target[key] = target.get(key, 0) + value
+
+
+def _count(value: float):
+    """
+    Report a weighted count as an int when it is whole
+
+    Column batches sum weights as floats and single events as ints, so the
+    same events would otherwise come out as 3 or 3.0 depending on the path.
+    """
+    return int(value) if float(value).is_integer() else value
+
+
+def _interval(estimate: float, variance: float, low: float = 0.0,
+              high: float = math.inf) -> List[float]:
+    margin = Z_SCORE * math.sqrt(max(variance, 0.0))
+    return [max(low, estimate - margin), min(high, estimate + margin)]
+
+
+def _ratio(numerator: float, denominator: float, numerator_var: float, cross_var: float,
+           denominator_var: float) -> Tuple[float, float]:
+    """
+    Ratio estimate and its linearized variance
+
+    The variance of sum(w*y) / sum(w*x) is approximated by
+    sum(w*(w-1) * (y - r*x)^2) / sum(w*x)^2, expanded into the kept sums.
+    """
+    if not denominator:
+        return 0, 0.0
+    ratio = numerator / denominator
+    variance = (numerator_var - 2 * ratio * cross_var + ratio * ratio * denominator_var) / (denominator * denominator)
+    return ratio, variance
+
+
+def intent_estimates(bucket: Dict[str, Any]) -> Dict[str, Any]:
+    """Success rate estimate of one intent bucket with its confidence interval"""
+    # success is 0/1, so the cross and squared terms of the ratio coincide
+    rate, variance = _ratio(bucket["success"], bucket["total"], bucket["success_var"],
+                            bucket["success_var"], bucket["total_var"])
+    return {
+        "total_requests": _count(bucket["total"]),
+        "successful": _count(bucket["success"]),
+        "success_rate": rate,
+        "sampled_requests": _count(bucket["samples"]),
+        "success_rate_ci": _interval(rate, variance, 0.0, 1.0)
+    }
+
+
+def ai_estimates(buckets: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Weighted AI performance estimates over a set of intent buckets
+
+    Returns:
+        The overall totals, rates and averages with confidence intervals,
+        plus per-intent estimates keyed by intent
+    """
+    overall = new_intent_bucket()
+    for bucket in buckets.values():
+        merge_intent_buckets(overall, bucket)
+
+    success_rate, success_var = _ratio(overall["success"], overall["total"], overall["success_var"],
+                                       overall["success_var"], overall["total_var"])
+    avg_time, avg_time_var = _ratio(overall["processing_time_sum"], overall["processing_time_count"],
+                                    overall["processing_time_sq_var"], overall["processing_time_sum_var"],
+                                    overall["processing_time_count_var"])
+    return {
+        "total_decisions": _count(overall["total"]),
+        "successful_decisions": _count(overall["success"]),
+        "overall_success_rate": success_rate,
+        "avg_processing_time_ms": avg_time,
+        "sampled_decisions": _count(overall["samples"]),
+        "confidence_level": CONFIDENCE_LEVEL,
+        "confidence_intervals": {
+            # At least the stored decisions happened
+            "total_decisions": _interval(overall["total"], overall["total_var"], overall["samples"]),
+            "overall_success_rate": _interval(success_rate, success_var, 0.0, 1.0),
+            "avg_processing_time_ms": _interval(avg_time, avg_time_var)
+        },
+        "intent_metrics": {intent: intent_estimates(bucket) for intent, bucket in buckets.items()}
+    }
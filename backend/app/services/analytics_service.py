@@ -1,19 +1,156 @@
 import os
 import json
 import time
+import itertools
+import heapq
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from collections import defaultdict
+from typing import Dict, Any, List, Optional, Iterator, Iterable, Tuple
 
+from .analytics_columnar import (
+    BUILDER_FIELDS, ColumnBatch, ColumnBuilder, ColumnarStore, GameMetricsAggregator,
+    AIPerformanceAggregator
+)
+from .analytics_rollups import MetricRollups, GAME_EVENT_SUFFIXES, day_key
+from .analytics_user_index import UserEventIndex, unpack_position
+from .analytics_codec import JsonLinesCodec, BinaryRecordCodec
+from .analytics_recent import RecentEvents, copy_event
+from .analytics_sampling import SAMPLED_EVENT_TYPES, SamplingPolicy, event_weight
+from . import analytics_columnar
+from ..utils.block_file import (
+    COMPRESSED_SUFFIX, compress_file, is_compressed, open_segment, original_path, stored_size
+)
+from ..utils.query_cache import GenerationalCache
+from ..utils.rw_lock import ReadWriteLock
+from ..utils.event_fields import Condition, field_tree, matches, project
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Fields decoded when building column batches
+BUILDER_TREE = field_tree(BUILDER_FIELDS)
+TIMESTAMP_TREE = field_tree(["timestamp"])
+
+# Marks the highest segment seq removed by retention, per event type
+DROPPED_MARKER = "dropped_through"
+
+# Newest event timestamp of each closed segment, per event type; retention
+# expires by it because compressing or migrating a segment resets its mtime
+NEWEST_TIMESTAMPS = "newest_timestamps.json"
+
+# Splittable record sources are split into byte ranges of this size for parallel scans
+PARTITION_BYTES = 16 * 1024 * 1024
+
+
+def _aggregate_partition(aggregator, partition: Dict[str, Any],
+                         start_time: int = None, end_time: int = None):
+    """
+    Aggregate one scan partition in a worker process
+    
+    Args:
+        aggregator: Empty aggregator to fill (see AnalyticsService._scan)
+        partition: Partition description produced by AnalyticsService._plan_partitions
+        start_time: Optional unix timestamp for start of range
+        end_time: Optional unix timestamp for end of range
+        
+    Returns:
+        The filled aggregator, to be merged by the caller
+    """
+    event_type = partition["event_type"]
+    if partition["kind"] == "columnar":
+        batch = ColumnarStore(partition["root"]).load_segment(event_type, partition["seq"])
+        aggregator.add_batch(event_type, batch, batch.time_mask(start_time, end_time))
+        return aggregator
+        
+    codec = partition["codec"]
+    with open_segment(partition["path"]) as f:
+        for _, _, event in codec.scan(f, partition["start"], partition["end"], start_time, end_time):
+            aggregator.add_event(event_type, event)
+    return aggregator
+
+
 class AnalyticsService:
-    def __init__(self):
-        """Initialize the analytics service"""
+    def __init__(self, max_workers: int = None, parallel_min_bytes: int = 64 * 1024 * 1024,
+                 codec: str = "jsonl", cache_size: int = 256, recent_capacity: int = 10000,
+                 sampling: Optional[Dict[str, SamplingPolicy]] = None):
+        """
+        Initialize the analytics service
+        
+        Args:
+            max_workers: Worker processes for large ad-hoc scans (default: CPU count, 1 disables)
+            parallel_min_bytes: Scans over less stored data than this stay in-process
+            codec: Storage format for new events, "jsonl" or "binary"
+            cache_size: Maximum number of cached metric query results
+            recent_capacity: Newest events kept in memory per event type for short-window queries
+            sampling: Per-event-type policies deciding which tracked events are stored
+                (only event types in SAMPLED_EVENT_TYPES)
+            
+        Raises:
+            ValueError: If a sampling policy is given for an event type whose metrics are not weighted
+        """
+        unweighted = sorted(set(sampling or ()) - SAMPLED_EVENT_TYPES)
+        if unweighted:
+            raise ValueError(f"Sampling is not supported for event types {unweighted}")
+            
         self.analytics_dir = "./data/analytics"
+        self.segments_dir = f"{self.analytics_dir}/segments"
         os.makedirs(self.analytics_dir, exist_ok=True)
+        os.makedirs(self.segments_dir, exist_ok=True)
+        
+        # Serializes appends against sealing of the active files
+        self._write_lock = threading.Lock()
+        # Serializes rollup delta writes, which happen outside the write lock
+        self._rollup_flush_lock = threading.Lock()
+        # Held shared while listing and reading event files and exclusively while
+        # one is sealed, replaced or removed; taken before the write lock. Readers
+        # holding the write lock need not take it, as every such move holds both.
+        # Startup seals foreign active files without it, before any reader exists.
+        self._segment_lock = ReadWriteLock()
+        
+        # Files are read with the codec matching their extension; new events use self.codec
+        self.codecs = {
+            codec_impl.extension: codec_impl
+            for codec_impl in (JsonLinesCodec(), BinaryRecordCodec(f"{self.analytics_dir}/fields.names"))
+        }
+        self.codec = self._codec_by_name(codec)
+        
+        # Closed segments are compacted into memory-mapped columns
+        self.columnar_store = ColumnarStore(f"{self.analytics_dir}/columnar")
+        
+        # Logical segment seq of each active file, so offsets stay valid after sealing
+        self._active_seqs: Dict[str, int] = {}
+        
+        # Active files left in another format by a codec switch become closed segments
+        self._seal_foreign_active_files()
+        
+        # Per-day metric rollups, caught up with anything tracked since the last flush
+        self.rollups = MetricRollups(f"{self.analytics_dir}/rollups.json")
+        self._load_rollups()
+        
+        # user_id -> (segment, offset) postings; events are only stored once
+        self.user_index = UserEventIndex(f"{self.analytics_dir}/user_index.bin")
+        self._load_user_index()
+        
+        # Newest events per type, so short windows are answered without disk reads
+        self.recent_events = RecentEvents(recent_capacity)
+        
+        # Event types without a policy store every event
+        self.sampling: Dict[str, SamplingPolicy] = sampling or {}
+        
+        # Metric query results, valid until an event of a type they read is appended.
+        # Generations come from one counter, so a type that disappears and comes
+        # back never repeats an old value.
+        self.query_cache = GenerationalCache(cache_size)
+        self._generation_counter = itertools.count(1)
+        self._generations: Dict[str, int] = {}
+        self._global_generation = 0
+        
+        # Process pool for partitioned scans, created on first use
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.parallel_min_bytes = parallel_min_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
         
     def track_event(self, event_type: str, event_data: Dict[str, Any]) -> bool:
         """
@@ -34,29 +171,233 @@ class AnalyticsService:
                 "data": event_data
             }
             
-            # Store event by type
-            event_file = f"{self.analytics_dir}/{event_type}.jsonl"
-            with open(event_file, "a") as f:
-                f.write(json.dumps(event) + "\n")
-                
-            # If user_id is available, store user-specific event
-            if "user_id" in event_data:
-                user_dir = f"{self.analytics_dir}/users/{event_data['user_id']}"
-                os.makedirs(user_dir, exist_ok=True)
-                
-                user_event_file = f"{user_dir}/{event_type}.jsonl"
-                with open(user_event_file, "a") as f:
-                    f.write(json.dumps(event) + "\n")
+            # Store event by type; a sampling policy may drop it or hold it back
+            with self._write_lock:
+                policy = self.sampling.get(event_type)
+                for stored in policy.offer(event) if policy else [event]:
+                    self._store_event(event_type, stored)
+            self._flush_rollups()
             
             return True
         except Exception as e:
             logger.error(f"Failed to track event: {str(e)}")
             return False
     
+    def _store_event(self, event_type: str, event: Dict[str, Any]):
+        """Append an event to the active file and update every derived structure (write lock held)"""
+        seq = self._active_seq(event_type)
+        with open(self._active_file(event_type), "ab") as f:
+            offset = f.tell()
+            f.write(self.codec.encode(event))
+            end_offset = f.tell()
+            
+        self.rollups.apply(event_type, event, (seq, end_offset))
+        self.recent_events.append(event_type, event)
+        self._bump_generation(event_type)
+        
+        # If user_id is available, index the event's position for the user
+        if "user_id" in event["data"]:
+            self.user_index.add(str(event["data"]["user_id"]), event_type, seq, offset)
+        self.user_index.advance(event_type, seq, end_offset)
+    
+    def flush_samples(self, force: bool = False) -> int:
+        """
+        Store the events held back by sampling policies whose window has closed
+        
+        Args:
+            force: Store every held event, even of windows still open
+            
+        Returns:
+            Number of events stored
+        """
+        stored = 0
+        try:
+            with self._write_lock:
+                for event_type, policy in self.sampling.items():
+                    for event in policy.drain(force):
+                        self._store_event(event_type, event)
+                        stored += 1
+            self._flush_rollups()
+        except Exception as e:
+            logger.error(f"Failed to flush sampled events: {str(e)}")
+        return stored
+    
+    def _flush_rollups(self):
+        """
+        Persist rollup changes once the flush interval has elapsed
+        
+        The delta is serialized under the write lock but written outside it,
+        so appends are only held up for the changed days and keys. A flush
+        already running in another thread makes this a no-op.
+        """
+        if not self.rollups.flush_due():
+            return
+        with self._write_lock:
+            if not self._rollup_flush_lock.acquire(blocking=False):
+                return
+            rollups = self.rollups
+            try:
+                line = rollups.take_delta()
+                user_index, through = self.user_index, dict(self.user_index.through)
+            except Exception:
+                self._rollup_flush_lock.release()
+                raise
+        try:
+            user_index.save_through(through)
+        except Exception as e:
+            logger.error(f"Failed to persist user index position: {str(e)}")
+        try:
+            if line is not None:
+                rollups.write_delta(line)
+        except Exception as e:
+            logger.error(f"Failed to persist metric rollups: {str(e)}")
+            self._rollup_flush_lock.release()
+            with self._write_lock:
+                rollups.requeue(line)
+            return
+        self._rollup_flush_lock.release()
+    
+    def _flush_rollups_locked(self):
+        """Persist every rollup change now (write lock held)"""
+        with self._rollup_flush_lock:
+            self.rollups.flush()
+    
+    def iter_events(self, event_type: str, start_time: int = None, end_time: int = None,
+                    where: Optional[Dict[str, Condition]] = None,
+                    fields: Optional[Iterable[str]] = None,
+                    newest_first: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield the events of a specific type, with filters pushed down
+        
+        Events are decoded one at a time, so memory stays constant however
+        many events are consumed. The time range is checked before decoding
+        where the storage format allows it, and only the fields named in
+        ``fields`` and ``where`` are materialized (binary records skip the
+        rest unread; JSON lines are decoded and then projected). Newest-first
+        windows that start within the in-memory buffer of recent events are
+        served from memory without touching disk.
+        
+        Args:
+            event_type: Type of events to retrieve
+            start_time: Optional unix timestamp for start of range
+            end_time: Optional unix timestamp for end of range
+            where: Optional dotted field path -> required value or predicate
+            fields: Optional dotted field paths to return (default: whole events)
+            newest_first: Read backwards from the newest event (default) or forwards
+            
+        Yields:
+            Event dictionaries, in storage order
+        """
+        buffered = self.recent_events.events(event_type, start_time, end_time) if newest_first else None
+        if buffered is not None:
+            output_tree = field_tree(fields) if fields else None
+            for event in buffered:
+                if matches(event, where):
+                    yield copy_event(project(event, output_tree))
+            return
+            
+        decode_tree = field_tree(set(fields) | set(where or ())) if fields else None
+        output_tree = field_tree(fields) if fields and where else None
+        
+        if newest_first:
+            events = (
+                codec.decode_in_range(record, start_time, end_time, decode_tree)
+                for codec, record in self._iter_records_newest_first(event_type)
+            )
+        else:
+            events = self._iter_events_forward(event_type, start_time, end_time, decode_tree)
+            
+        for event in events:
+            if event is not None and matches(event, where):
+                yield project(event, output_tree)
+    
+    def _iter_events_forward(self, event_type: str, start_time: int = None, end_time: int = None,
+                             fields=None) -> Iterator[Dict[str, Any]]:
+        with self._segment_lock.shared():
+            for _, path in self._sources(event_type):
+                codec = self._codec_for(path)
+                with open_segment(path) as f:
+                    for _, _, event in codec.scan(f, start_time=start_time, end_time=end_time, fields=fields):
+                        yield event
+    
+    def iter_user_events(self, user_id: str, event_type: Optional[str] = None,
+                         start_time: int = None, end_time: int = None,
+                         where: Optional[Dict[str, Condition]] = None,
+                         fields: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield a user's events through the user index, with filters pushed down
+        
+        Without an event type, the per-type streams (each read newest first)
+        are combined with a k-way heap merge, so taking the first N events
+        reads about N records regardless of the user's history.
+        
+        Args:
+            user_id: ID of the user
+            event_type: Optional event type filter
+            start_time: Optional unix timestamp for start of range
+            end_time: Optional unix timestamp for end of range
+            where: Optional dotted field path -> required value or predicate
+            fields: Optional dotted field paths to return (default: whole events)
+            
+        Yields:
+            Event dictionaries, most recent first
+        """
+        user_id = str(user_id)
+        event_types = [event_type] if event_type else self.user_index.event_types(user_id)
+        # The merge orders by timestamp, so it is decoded even if not requested
+        merge_fields = {"timestamp"} if len(event_types) > 1 else set()
+        decode_tree = field_tree(set(fields) | set(where or ()) | merge_fields) if fields else None
+        output_tree = field_tree(fields) if fields and (where or merge_fields) else None
+        
+        streams = [
+            self._iter_user_events_newest_first(user_id, user_event_type, start_time, end_time, decode_tree)
+            for user_event_type in event_types
+        ]
+        events = streams[0] if len(streams) == 1 else heapq.merge(
+            *streams, key=lambda event: event.get("timestamp", 0), reverse=True
+        )
+        for event in events:
+            if matches(event, where):
+                yield project(event, output_tree)
+    
+    def count_events(self, event_type: str, start_time: int = None, end_time: int = None) -> float:
+        """
+        Count the events of a specific type in a time range
+        
+        Windows within the in-memory buffer of recent events are counted
+        with two binary searches; older windows are counted from disk. For
+        sampled event types the count is the sum of the sample weights, an
+        estimate of the number of tracked events.
+        
+        Args:
+            event_type: Type of events to count
+            start_time: Optional unix timestamp for start of range
+            end_time: Optional unix timestamp for end of range
+            
+        Returns:
+            Number of matching events
+        """
+        try:
+            count = self.recent_events.count(event_type, start_time, end_time)
+            if count is None:
+                count = sum(
+                    event_weight(event)
+                    for event in self.iter_events(event_type, start_time, end_time,
+                                                  fields=["timestamp", "sample_weight"])
+                )
+            return count
+        except Exception as e:
+            logger.error(f"Failed to count events: {str(e)}")
+            return 0
+    
     def get_events(self, event_type: str, start_time: int = None, 
                   end_time: int = None, limit: int = 100) -> List[Dict[str, Any]]:
         """
-        Get events of a specific type with optional time filtering
+        Get the most recent events of a specific type with optional time filtering
+        
+        The active file and then the closed segments are read backwards from
+        EOF, so only the newest ``limit`` matching events are decoded (see
+        iter_events).
         
         Args:
             event_type: Type of events to retrieve
@@ -65,28 +406,10 @@ class AnalyticsService:
             limit: Maximum number of events to return
             
         Returns:
-            List of event dictionaries
+            List of event dictionaries, most recent first
         """
-        events = []
         try:
-            event_file = f"{self.analytics_dir}/{event_type}.jsonl"
-            if not os.path.exists(event_file):
-                return events
-                
-            with open(event_file, "r") as f:
-                for line in f:
-                    event = json.loads(line)
-                    event_time = event.get("timestamp", 0)
-                    
-                    # Apply time filters if provided
-                    if start_time and event_time < start_time:
-                        continue
-                    if end_time and event_time > end_time:
-                        continue
-                        
-                    events.append(event)
-                    if len(events) >= limit:
-                        break
+            events = list(itertools.islice(self.iter_events(event_type, start_time, end_time), limit))
             
             # Sort by timestamp descending (most recent first)
             events.sort(key=lambda x: x.get("timestamp", 0), reverse=True)
@@ -106,124 +429,713 @@ class AnalyticsService:
             limit: Maximum number of events to return
             
         Returns:
-            List of event dictionaries
+            List of event dictionaries, most recent first
         """
-        events = []
         try:
-            user_dir = f"{self.analytics_dir}/users/{user_id}"
-            if not os.path.exists(user_dir):
-                return events
-                
-            if event_type:
-                # Get events of specific type
-                event_file = f"{user_dir}/{event_type}.jsonl"
-                if os.path.exists(event_file):
-                    with open(event_file, "r") as f:
-                        for line in f:
-                            events.append(json.loads(line))
-                            if len(events) >= limit:
-                                break
-            else:
-                # Get all event types
-                for filename in os.listdir(user_dir):
-                    if filename.endswith(".jsonl"):
-                        with open(f"{user_dir}/{filename}", "r") as f:
-                            for line in f:
-                                events.append(json.loads(line))
-                                
-                # Sort and limit
-                events.sort(key=lambda x: x.get("timestamp", 0), reverse=True)
-                events = events[:limit]
-            
-            return events
+            # Without an event type the per-type streams are heap-merged, so
+            # only about `limit` records are read
+            return list(itertools.islice(self.iter_user_events(user_id, event_type), limit))
         except Exception as e:
             logger.error(f"Failed to get user events: {str(e)}")
             return []
     
-    def calculate_game_metrics(self, game_id: str, 
-                              time_period: str = "last_week") -> Dict[str, Any]:
+    def _codec_by_name(self, name: str):
+        for codec in self.codecs.values():
+            if codec.name == name:
+                return codec
+        raise ValueError(f"Unknown analytics codec: {name}")
+    
+    def _codec_for(self, path: str):
+        """Codec of a stored file, chosen by its extension"""
+        return self.codecs[os.path.splitext(original_path(path))[1]]
+    
+    def _active_file(self, event_type: str) -> str:
+        return f"{self.analytics_dir}/{event_type}{self.codec.extension}"
+    
+    def _segment_paths(self, event_type: str) -> List[Tuple[int, str]]:
+        """List the closed segments of an event type as (seq, path), oldest first"""
+        segment_dir = f"{self.segments_dir}/{event_type}"
+        if not os.path.exists(segment_dir):
+            return []
+        segments = {}
+        for filename in sorted(os.listdir(segment_dir)):
+            # A segment may briefly exist both plain and compressed while it is compressed
+            if os.path.splitext(original_path(filename))[1] in self.codecs:
+                segments.setdefault(int(filename.split(".")[0]), f"{segment_dir}/{filename}")
+        return sorted(segments.items())
+    
+    def _sources(self, event_type: str) -> List[Tuple[int, str]]:
+        """Closed segments followed by the active file (if any) as (seq, path)"""
+        sources = self._segment_paths(event_type)
+        event_file = self._active_file(event_type)
+        if os.path.exists(event_file):
+            sources.append((self._active_seq(event_type), event_file))
+        return sources
+    
+    def _event_types(self) -> List[str]:
+        """List every event type that has an active file or closed segments"""
+        event_types = {
+            os.path.splitext(filename)[0] for filename in os.listdir(self.analytics_dir)
+            if os.path.splitext(filename)[1] in self.codecs
+        }
+        event_types.update(os.listdir(self.segments_dir))
+        return sorted(event_types)
+    
+    def list_event_types(self) -> List[str]:
         """
-        Calculate metrics for a specific game
+        List every event type with stored events
+        
+        Returns:
+            Sorted list of event type names
+        """
+        return self._event_types()
+    
+    def _iter_records_newest_first(self, event_type: str) -> Iterator[Tuple[Any, bytes]]:
+        """Yield (codec, raw record) of the active file and closed segments, newest first"""
+        with self._segment_lock.shared():
+            for _, path in reversed(self._sources(event_type)):
+                codec = self._codec_for(path)
+                for record in codec.iter_records_reverse(path):
+                    yield codec, record
+    
+    def _active_seq(self, event_type: str) -> int:
+        """Sequence number the active file will get when it is sealed"""
+        if event_type not in self._active_seqs:
+            segments = self._segment_paths(event_type)
+            next_seq = segments[-1][0] + 1 if segments else 0
+            # Never reuse the seq of a dropped segment: index postings may still name it
+            self._active_seqs[event_type] = max(next_seq, self._dropped_through(event_type) + 1)
+        return self._active_seqs[event_type]
+    
+    def _dropped_through(self, event_type: str) -> int:
+        """Highest segment seq removed by retention, or -1"""
+        marker = f"{self.segments_dir}/{event_type}/{DROPPED_MARKER}"
+        if not os.path.exists(marker):
+            return -1
+        with open(marker, "r") as f:
+            return int(f.read().strip() or -1)
+    
+    def _segment_file(self, event_type: str, seq: int) -> str:
+        """Path of a segment by seq; the active file holds the current seq"""
+        if seq == self._active_seq(event_type):
+            return self._active_file(event_type)
+        for extension in self.codecs:
+            path = f"{self.segments_dir}/{event_type}/{seq:08d}{extension}"
+            for candidate in (path, path + COMPRESSED_SUFFIX):
+                if os.path.exists(candidate):
+                    return candidate
+        raise FileNotFoundError(f"No segment {seq} for {event_type}")
+    
+    def _iter_events_from(self, event_type: str, seq: int = 0,
+                          offset: int = 0) -> Iterator[Tuple[Dict[str, Any], int, int, int]]:
+        """
+        Yield (event, seq, start offset, end offset) oldest first, starting at a
+        (segment seq, offset) position
+        
+        The active file is treated as the segment after the last closed one.
+        Callers hold the write lock, which keeps segments from being replaced.
+        """
+        for source_seq, path in self._sources(event_type):
+            if source_seq < seq:
+                continue
+            codec = self._codec_for(path)
+            with open_segment(path) as f:
+                for start, end, event in codec.scan(f, offset if source_seq == seq else 0):
+                    yield event, source_seq, start, end
+    
+    def _load_rollups(self):
+        """Load persisted rollups and replay events stored after their watermarks"""
+        try:
+            self.rollups.load()
+            for event_type in self._event_types():
+                seq, offset = self.rollups.watermarks.get(event_type, (0, 0))
+                for event, event_seq, _, end_offset in self._iter_events_from(event_type, seq, offset):
+                    self.rollups.apply(event_type, event, (event_seq, end_offset))
+            self._flush_rollups_locked()
+        except Exception as e:
+            logger.error(f"Failed to load metric rollups: {str(e)}")
+    
+    def _load_user_index(self):
+        """Load the user index and index the events stored after its indexed-through position"""
+        try:
+            self.user_index.load()
+            for event_type in self._event_types():
+                # The saved position may lag the postings after a crash; those events are skipped
+                last_indexed = self.user_index.last_position(event_type)
+                seq, offset = self.user_index.through.get(event_type, (0, 0))
+                for event, event_seq, start, end in self._iter_events_from(event_type, seq, offset):
+                    user_id = event.get("data", {}).get("user_id")
+                    if user_id is not None and (event_seq, start) > last_indexed:
+                        self.user_index.add(str(user_id), event_type, event_seq, start)
+                    self.user_index.advance(event_type, event_seq, end)
+            self.user_index.save_through()
+        except Exception as e:
+            logger.error(f"Failed to load user event index: {str(e)}")
+    
+    def rebuild_user_index(self) -> bool:
+        """
+        Discard the user event index and rebuild it from every stored event
+        
+        Returns:
+            bool: Success status
+        """
+        with self._write_lock:
+            self.user_index.reset()
+            self._load_user_index()
+            self._bump_generation()
+        return True
+    
+    def remove_legacy_user_files(self) -> bool:
+        """
+        Delete the per-user event copies written by earlier versions
+        
+        They duplicate events already stored in the per-type files and are no
+        longer read; run once after the user index has been built.
+        
+        Returns:
+            bool: Success status
+        """
+        try:
+            shutil.rmtree(f"{self.analytics_dir}/users", ignore_errors=True)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to remove legacy user files: {str(e)}")
+            return False
+    
+    def _iter_user_events_newest_first(self, user_id: str, event_type: str, start_time: int = None,
+                                       end_time: int = None, fields=None) -> Iterator[Dict[str, Any]]:
+        """Yield a user's in-range events of one type newest first, seeking to each posting"""
+        handles = {}
+        with self._segment_lock.shared():
+            dropped_through = self._dropped_through(event_type)
+            try:
+                for position in reversed(self.user_index.positions(user_id, event_type)):
+                    seq, offset = unpack_position(position)
+                    if seq <= dropped_through:
+                        break  # older events were removed by retention
+                    if seq not in handles:
+                        path = self._segment_file(event_type, seq)
+                        handles[seq] = (self._codec_for(path), open_segment(path))
+                    codec, handle = handles[seq]
+                    event = codec.decode_in_range(codec.read_record_at(handle, offset), start_time, end_time, fields)
+                    if event is not None:
+                        yield event
+            finally:
+                for _, handle in handles.values():
+                    handle.close()
+    
+    def rebuild_rollups(self) -> bool:
+        """
+        Discard the metric rollups and rebuild them from every stored event
+        
+        Returns:
+            bool: Success status
+        """
+        with self._write_lock:
+            with self._rollup_flush_lock:
+                self.rollups.remove_files()
+                self.rollups = MetricRollups(self.rollups.path, self.rollups.flush_interval)
+            self._load_rollups()
+            self._bump_generation()
+        return True
+    
+    def seal_segment(self, event_type: str) -> Optional[int]:
+        """
+        Close the active file of an event type so it can be compacted
         
         Args:
-            game_id: Identifier for the game (e.g., 'defi_kingdoms')
-            time_period: Time period for analysis ('today', 'last_week', 'last_month')
+            event_type: Type of events whose active file should be closed
             
         Returns:
-            Dictionary of metrics
+            Sequence number of the new closed segment, or None if there was nothing to close
+        """
+        with self._segment_lock.exclusive(), self._write_lock:
+            return self._seal_file(event_type, self._active_file(event_type))
+    
+    def _seal_file(self, event_type: str, event_file: str) -> Optional[int]:
+        """Move an active file to the next closed segment, keeping its format"""
+        if not os.path.exists(event_file) or os.path.getsize(event_file) == 0:
+            return None
+            
+        seq = self._active_seq(event_type)
+        os.makedirs(f"{self.segments_dir}/{event_type}", exist_ok=True)
+        extension = os.path.splitext(event_file)[1]
+        os.replace(event_file, f"{self.segments_dir}/{event_type}/{seq:08d}{extension}")
+        self._active_seqs[event_type] = seq + 1
+        return seq
+    
+    def _seal_foreign_active_files(self):
+        for filename in sorted(os.listdir(self.analytics_dir)):
+            event_type, extension = os.path.splitext(filename)
+            if extension in self.codecs and extension != self.codec.extension:
+                self._seal_file(event_type, f"{self.analytics_dir}/{filename}")
+    
+    def migrate_codec(self, codec_name: str) -> bool:
+        """
+        Rewrite every stored segment and active file in another codec
+        
+        Segment sequence numbers are preserved, so compacted columns stay
+        valid; the user index is rebuilt against the new offsets and the
+        rollups (whose counters do not change) are re-pointed at the new
+        end of each active file. Appends are blocked while migrating.
+        
+        Args:
+            codec_name: Target storage format, "jsonl" or "binary"
+            
+        Returns:
+            bool: Success status
         """
         try:
-            # Determine time range
-            now = int(time.time())
-            if time_period == "today":
-                start_time = int(datetime.now().replace(hour=0, minute=0, second=0).timestamp())
-            elif time_period == "last_week":
-                start_time = int((datetime.now() - timedelta(days=7)).timestamp())
-            elif time_period == "last_month":
-                start_time = int((datetime.now() - timedelta(days=30)).timestamp())
-            else:
-                start_time = 0
+            target = self._codec_by_name(codec_name)
+            with self._segment_lock.exclusive(), self._write_lock:
+                for event_type in self._event_types():
+                    for seq, path in self._sources(event_type):
+                        codec = self._codec_for(path)
+                        if codec is target:
+                            continue
+                        new_path = os.path.splitext(original_path(path))[0] + target.extension
+                        tmp_path = f"{new_path}.tmp"
+                        with open_segment(path) as src, open(tmp_path, "wb") as dst:
+                            for _, _, event in codec.scan(src):
+                                dst.write(target.encode(event))
+                        os.replace(tmp_path, new_path)
+                        os.remove(path)
+                self.codec = target
                 
-            # Get relevant events
-            quest_starts = self.get_events(f"{game_id}_quest_started", start_time=start_time, limit=1000)
-            quest_completes = self.get_events(f"{game_id}_quest_completed", start_time=start_time, limit=1000)
-            rewards_collected = self.get_events(f"{game_id}_rewards_collected", start_time=start_time, limit=1000)
-            
-            # Calculate metrics
-            total_quests = len(quest_starts)
-            completed_quests = len(quest_completes)
-            completion_rate = completed_quests / total_quests if total_quests > 0 else 0
+                self.user_index.reset()
+                self._load_user_index()
+                for event_type in self._event_types():
+                    event_file = self._active_file(event_type)
+                    size = os.path.getsize(event_file) if os.path.exists(event_file) else 0
+                    self.rollups.watermarks[event_type] = [self._active_seq(event_type), size]
+                self._flush_rollups_locked()
+                self._bump_generation()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to migrate analytics storage to {codec_name}: {str(e)}")
+            return False
+    
+    def active_file_info(self, event_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Describe the active file of an event type for rollover decisions
+        
+        Args:
+            event_type: Type of events
             
-            # Aggregate rewards
-            total_rewards = defaultdict(float)
-            for event in rewards_collected:
-                rewards = event.get("data", {}).get("rewards", {})
-                for token, amount in rewards.items():
-                    # Convert to float to handle numeric rewards
-                    if isinstance(amount, (int, float, str)):
-                        try:
-                            total_rewards[token] += float(amount)
-                        except (ValueError, TypeError):
-                            pass
+        Returns:
+            Dict with size_bytes and first_timestamp, or None if there is no active file
+        """
+        event_file = self._active_file(event_type)
+        if not os.path.exists(event_file) or os.path.getsize(event_file) == 0:
+            return None
+        with open(event_file, "rb") as f:
+            first = next(self.codec.iter_records(f), None)
+        return {
+            "size_bytes": os.path.getsize(event_file),
+            "first_timestamp": self.codec.decode(first[2]).get("timestamp", 0) if first else 0
+        }
+    
+    def closed_segments(self, event_type: str) -> List[Dict[str, Any]]:
+        """
+        List the closed segments of an event type, oldest first
+        
+        The newest event timestamp of a segment is read once, the first time
+        it is listed, and recorded next to the segments; compressing or
+        migrating a segment leaves its events, and so the record, unchanged.
+        
+        Args:
+            event_type: Type of events
             
-            # Calculate quest type distribution
-            quest_types = defaultdict(int)
-            for event in quest_starts:
-                quest_type = event.get("data", {}).get("quest_type")
-                if quest_type:
-                    quest_types[quest_type] += 1
+        Returns:
+            List of dicts with seq, path, compressed and newest_timestamp (of its events)
+        """
+        with self._segment_lock.shared():
+            segments = [(seq, path, is_compressed(path)) for seq, path in self._segment_paths(event_type)]
+            newest = self._newest_timestamps(event_type)
+            missing = {seq: self._newest_timestamp_in(path) for seq, path, _ in segments if seq not in newest}
+        if missing:
+            with self._write_lock:
+                recorded = self._newest_timestamps(event_type)
+                dropped_through = self._dropped_through(event_type)
+                recorded.update({seq: timestamp for seq, timestamp in missing.items() if seq > dropped_through})
+                self._write_newest_timestamps(event_type, recorded)
+            newest.update(missing)
+        return [
+            {
+                "seq": seq,
+                "path": path,
+                "compressed": compressed,
+                "newest_timestamp": newest[seq]
+            }
+            for seq, path, compressed in segments
+        ]
+    
+    def _newest_timestamps(self, event_type: str) -> Dict[int, int]:
+        """Recorded newest event timestamp per closed segment seq"""
+        path = f"{self.segments_dir}/{event_type}/{NEWEST_TIMESTAMPS}"
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r") as f:
+            return {int(seq): timestamp for seq, timestamp in json.load(f).items()}
+    
+    def _write_newest_timestamps(self, event_type: str, timestamps: Dict[int, int]):
+        """Replace the recorded newest event timestamps (write lock held)"""
+        path = f"{self.segments_dir}/{event_type}/{NEWEST_TIMESTAMPS}"
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({str(seq): timestamp for seq, timestamp in sorted(timestamps.items())}, f)
+        os.replace(f"{path}.tmp", path)
+    
+    def _newest_timestamp_in(self, path: str) -> int:
+        """Newest event timestamp of a stored file, 0 if it holds no events"""
+        codec = self._codec_for(path)
+        with open_segment(path) as f:
+            return max((event.get("timestamp", 0) for _, _, event in codec.scan(f, fields=TIMESTAMP_TREE)),
+                       default=0)
+    
+    def compress_segment(self, event_type: str, seq: int) -> bool:
+        """
+        Compress a closed segment into seekable blocks
+        
+        Offsets into the segment stay valid, so the user index, rollup
+        watermarks and scans read the compressed file transparently. Readers
+        keep using the plain file while it is compressed; it is removed
+        under the segment lock.
+        
+        Args:
+            event_type: Type of events
+            seq: Sequence number of a closed segment
             
-# Calculate average quest duration
-            quest_durations = []
-            quest_start_times = {}
+        Returns:
+            bool: True if the segment was compressed by this call
+        """
+        try:
+            if seq >= self._active_seq(event_type):
+                return False
+            path = self._segment_file(event_type, seq)
+            if is_compressed(path):
+                return False
+            compress_file(path, path + COMPRESSED_SUFFIX)
+            with self._segment_lock.exclusive(), self._write_lock:
+                if not os.path.exists(path):
+                    # Migrated or dropped meanwhile; the copy would duplicate its events
+                    os.remove(path + COMPRESSED_SUFFIX)
+                    return False
+                os.remove(path)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to compress {event_type} segment {seq}: {str(e)}")
+            return False
+    
+    def drop_segments(self, event_type: str, through_seq: int, archive_dir: str = None) -> int:
+        """
+        Remove the closed segments of an event type up to and including a seq
+        
+        Rollups are unaffected, so named-period metrics keep their history;
+        raw event reads and ad-hoc scans no longer see the dropped events.
+        
+        Args:
+            event_type: Type of events
+            through_seq: Highest segment seq to remove
+            archive_dir: If given, segments are moved there (compressed) instead of deleted
             
-            # Map start times by quest_id
-            for event in quest_starts:
-                quest_id = event.get("data", {}).get("quest_id")
-                if quest_id:
-                    quest_start_times[quest_id] = event.get("timestamp", 0)
+        Returns:
+            Number of segments removed
+        """
+        dropped = 0
+        try:
+            with self._segment_lock.exclusive(), self._write_lock:
+                through_seq = min(through_seq, self._active_seq(event_type) - 1)
+                for seq, path in self._segment_paths(event_type):
+                    if seq > through_seq:
+                        break
+                    if archive_dir:
+                        target_dir = f"{archive_dir}/{event_type}"
+                        os.makedirs(target_dir, exist_ok=True)
+                        target = f"{target_dir}/{os.path.basename(original_path(path))}{COMPRESSED_SUFFIX}"
+                        if is_compressed(path):
+                            os.replace(path, target)
+                        else:
+                            compress_file(path, target)
+                    if os.path.exists(path):
+                        os.remove(path)
+                    self.columnar_store.remove_segment(event_type, seq)
+                    dropped += 1
+                    
+                if through_seq > self._dropped_through(event_type):
+                    marker = f"{self.segments_dir}/{event_type}/{DROPPED_MARKER}"
+                    os.makedirs(os.path.dirname(marker), exist_ok=True)
+                    with open(f"{marker}.tmp", "w") as f:
+                        f.write(str(through_seq))
+                    os.replace(f"{marker}.tmp", marker)
+                    self.user_index.prune(event_type, through_seq + 1)
+                    newest = self._newest_timestamps(event_type)
+                    if any(seq <= through_seq for seq in newest):
+                        self._write_newest_timestamps(
+                            event_type, {seq: timestamp for seq, timestamp in newest.items() if seq > through_seq})
+                if dropped:
+                    self._bump_generation(event_type)
+        except Exception as e:
+            logger.error(f"Failed to drop {event_type} segments: {str(e)}")
+        return dropped
+    
+    def compact_event_type(self, event_type: str) -> int:
+        """
+        Seal the active file and convert closed segments into columnar arrays
+        
+        Intended to be run periodically; metrics keep reading uncompacted
+        segments and the active file directly, so compaction never changes results.
+        
+        Args:
+            event_type: Type of events to compact
             
-            # Calculate duration for completed quests
-            for event in quest_completes:
-                quest_id = event.get("data", {}).get("quest_id")
-                if quest_id and quest_id in quest_start_times:
-                    start_time = quest_start_times[quest_id]
-                    end_time = event.get("timestamp", 0)
-                    if end_time > start_time:
-                        duration = end_time - start_time
-                        quest_durations.append(duration)
+        Returns:
+            Number of segments compacted
+        """
+        compacted = 0
+        try:
+            self.seal_segment(event_type)
+            with self._segment_lock.shared():
+                for seq, segment_file in self._segment_paths(event_type):
+                    if self.columnar_store.has_segment(event_type, seq):
+                        continue
+                    self.columnar_store.write_segment(event_type, seq, self._build_columns(segment_file))
+                    compacted += 1
+        except Exception as e:
+            logger.error(f"Failed to compact {event_type} events: {str(e)}")
+        return compacted
+    
+    def _build_columns(self, event_file: str, start_time: int = None) -> ColumnBatch:
+        """Decode an event file into a column batch, skipping events before start_time"""
+        builder = ColumnBuilder()
+        codec = self._codec_for(event_file)
+        with open_segment(event_file) as f:
+            for _, _, event in codec.scan(f, start_time=start_time, fields=BUILDER_TREE):
+                builder.add(event)
+        return builder.build()
+    
+    def _user_column_batch(self, user_id: str, event_types: List[str]) -> ColumnBatch:
+        """Fetch a user's events of the given types through the index as one column batch"""
+        builder = ColumnBuilder()
+        for event_type in event_types:
+            for event in self._iter_user_events_newest_first(user_id, event_type, fields=BUILDER_TREE):
+                builder.add(event)
+        return builder.build()
+    
+    @staticmethod
+    def _iter_stream(event_type: str, event_file: str, codec, start_time: int = None,
+                     end_time: int = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (event_type, event) for the in-range records of an event file, oldest first"""
+        with open_segment(event_file) as f:
+            for _, _, event in codec.scan(f, start_time=start_time, end_time=end_time):
+                yield event_type, event
+    
+    def _plan_partitions(self, event_types: Tuple[str, ...], start_time: int = None,
+                         end_time: int = None) -> List[Dict[str, Any]]:
+        """
+        Describe every stored source of the given event types as a scan partition
+        
+        Compacted segments outside [start_time, end_time] are pruned using their
+        metadata. Each partition records its size in bytes for scheduling.
+        """
+        partitions = []
+        for event_type in event_types:
+            for seq, segment_file in self._sources(event_type):
+                size = stored_size(segment_file)
+                if not self.columnar_store.has_segment(event_type, seq):
+                    partitions.append({"kind": "records", "event_type": event_type,
+                                       "codec": self._codec_for(segment_file),
+                                       "path": segment_file, "start": 0, "end": size})
+                    continue
+                meta = self.columnar_store.segment_meta(event_type, seq)
+                if start_time and meta["max_timestamp"] < start_time:
+                    continue
+                if end_time and meta["min_timestamp"] > end_time:
+                    continue
+                partitions.append({"kind": "columnar", "event_type": event_type,
+                                   "root": self.columnar_store.root, "seq": seq, "size": size})
+        return partitions
+    
+    @staticmethod
+    def _partition_size(partition: Dict[str, Any]) -> int:
+        if partition["kind"] == "columnar":
+            return partition["size"]
+        return partition["end"] - partition["start"]
+    
+    def _scan(self, aggregator, start_time: int = None, end_time: int = None):
+        """
+        Feed every stored event of the aggregator's event types in one pass
+        
+        Compacted segments are handed over as memory-mapped column batches.
+        The record files of all streams are then read together in a single
+        timestamp-merged pass: records outside the time range are rejected
+        from their raw bytes, and the rest are decoded once and dispatched to
+        the aggregator, without building per-stream event lists. Large scans
+        are partitioned across the process pool instead (see _scan_parallel).
+        
+        Args:
+            aggregator: Object with event_types, add_batch(), add_event(), spawn() and merge()
+            start_time: Optional unix timestamp for start of range
+            end_time: Optional unix timestamp for end of range
+        """
+        with self._segment_lock.shared():
+            self._scan_sources(aggregator, start_time, end_time)
+    
+    def _scan_sources(self, aggregator, start_time: int = None, end_time: int = None):
+        """Body of _scan (segment lock held shared)"""
+        partitions = self._plan_partitions(aggregator.event_types, start_time, end_time)
+        total_bytes = sum(self._partition_size(p) for p in partitions)
+        if self.max_workers > 1 and total_bytes >= self.parallel_min_bytes:
+            self._scan_parallel(aggregator, partitions, start_time, end_time)
+            return
             
-            avg_duration = sum(quest_durations) / len(quest_durations) if quest_durations else 0
+        raw_streams = []
+        for partition in partitions:
+            if partition["kind"] == "columnar":
+                _aggregate_partition(aggregator, partition, start_time, end_time)
+            else:
+                raw_streams.append(self._iter_stream(partition["event_type"], partition["path"],
+                                                     partition["codec"], start_time, end_time))
+                
+        for event_type, event in heapq.merge(*raw_streams, key=lambda item: item[1].get("timestamp", 0)):
+            aggregator.add_event(event_type, event)
+    
+    def _scan_parallel(self, aggregator, partitions: List[Dict[str, Any]],
+                       start_time: int = None, end_time: int = None):
+        """Aggregate partitions in worker processes and merge the partial results"""
+        tasks = []
+        for partition in partitions:
+            if partition["kind"] == "columnar" or not partition["codec"].splittable:
+                tasks.append(partition)
+                continue
+            # Split large JSONL sources into byte ranges on line boundaries
+            for start in range(partition["start"], partition["end"], PARTITION_BYTES):
+                tasks.append({**partition, "start": start,
+                              "end": min(start + PARTITION_BYTES, partition["end"])})
+                
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        futures = [
+            self._executor.submit(_aggregate_partition, aggregator.spawn(), task, start_time, end_time)
+            for task in tasks
+        ]
+        for future in futures:
+            aggregator.merge(future.result())
+    
+    def close(self):
+        """Store events held by sampling policies, shut down the scan worker pool and persist the rollups"""
+        self.flush_samples(force=True)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        with self._write_lock:
+            self._flush_rollups_locked()
+            self.user_index.save_through()
+    
+    @staticmethod
+    def _period_start(time_period: str) -> int:
+        """
+        Translate a named time period into a unix start timestamp (0 = unbounded)
+        
+        Periods are aligned to local midnight so they match the per-day rollup
+        buckets: 'last_week' covers today and the 6 days before it.
+        """
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        if time_period == "today":
+            return int(today.timestamp())
+        elif time_period == "last_week":
+            return int((today - timedelta(days=6)).timestamp())
+        elif time_period == "last_month":
+            return int((today - timedelta(days=29)).timestamp())
+        return 0
+    
+    def _bump_generation(self, event_type: str = None):
+        """Invalidate cached results that read event_type (every result if None)"""
+        generation = next(self._generation_counter)
+        self._global_generation = generation
+        if event_type is None:
+            self.query_cache.clear()
+        else:
+            self._generations[event_type] = generation
+    
+    def _cached(self, key: Tuple, event_types: Optional[List[str]], compute) -> Dict[str, Any]:
+        """
+        Return a cached query result, or compute and cache it
+        
+        Args:
+            key: Method name and arguments
+            event_types: Event types the result is computed from (None = all types)
+            compute: Callable producing the result on a miss
+        """
+        # Closed sampling windows are stored first, so they count towards the result
+        if self.sampling:
+            self.flush_samples()
+        # Snapshot generations before computing, so a concurrent append invalidates the entry
+        if event_types is None:
+            generation = self._global_generation
+        else:
+            generation = tuple(sorted((t, self._generations.get(t, 0)) for t in set(event_types)))
+        # Named periods and daily activity move with the calendar day
+        key = key + (day_key(int(time.time())),)
+        
+        result = self.query_cache.get(key, generation)
+        if result is None:
+            result = compute()
+            if "error" not in result:
+                self.query_cache.put(key, generation, result)
+        return result
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss statistics of the query result cache
+        
+        Returns:
+            Dictionary of cache statistics
+        """
+        return self.query_cache.stats()
+    
+    def _period_start_day(self, time_period: str) -> str:
+        """First rollup bucket of a named time period ('' = every bucket)"""
+        start_time = self._period_start(time_period)
+        return day_key(start_time) if start_time else ""
+    
+    def calculate_game_metrics(self, game_id: str, 
+                              time_period: str = "last_week",
+                              start_time: int = None,
+                              end_time: int = None) -> Dict[str, Any]:
+        """
+        Calculate metrics for a specific game
+        
+        Named periods are answered from the per-day rollups; an explicit
+        start_time/end_time range is computed from the stored events.
+        
+        Args:
+            game_id: Identifier for the game (e.g., 'defi_kingdoms')
+            time_period: Time period for analysis ('today', 'last_week', 'last_month')
+            start_time: Optional unix timestamp starting an ad-hoc range
+            end_time: Optional unix timestamp ending an ad-hoc range
             
-            return {
-                "time_period": time_period,
-                "total_quests": total_quests,
-                "completed_quests": completed_quests,
-                "completion_rate": completion_rate,
-                "avg_quest_duration_seconds": avg_duration,
-                "quest_type_distribution": dict(quest_types),
-                "total_rewards": dict(total_rewards)
-            }
+        Returns:
+            Dictionary of metrics
+        """
+        return self._cached(
+            ("calculate_game_metrics", game_id, time_period, start_time, end_time),
+            [f"{game_id}{suffix}" for suffix in GAME_EVENT_SUFFIXES],
+            lambda: self._calculate_game_metrics(game_id, time_period, start_time, end_time)
+        )
+    
+    def _calculate_game_metrics(self, game_id: str, 
+                               time_period: str = "last_week",
+                               start_time: int = None,
+                               end_time: int = None) -> Dict[str, Any]:
+        """Uncached body of calculate_game_metrics"""
+        try:
+            if start_time is None and end_time is None:
+                metrics = self.rollups.game_metrics(game_id, self._period_start_day(time_period))
+            else:
+                aggregator = GameMetricsAggregator(game_id)
+                self._scan(aggregator, start_time, end_time)
+                metrics = aggregator.result()
+            return {"time_period": time_period, **metrics}
         except Exception as e:
             logger.error(f"Failed to calculate game metrics: {str(e)}")
             return {"error": str(e)}
@@ -240,145 +1152,141 @@ class AnalyticsService:
         Returns:
             Dictionary of performance metrics
         """
+        user_id = str(user_id)
+        if game_id:
+            event_types = [f"{game_id}_quest_completed", "ai_decision"]
+        else:
+            event_types = [t for t in self.user_index.event_types(user_id) if t.endswith("_quest_completed")]
+            event_types.append("ai_decision")
+        return self._cached(
+            ("calculate_user_performance", user_id, game_id),
+            event_types,
+            lambda: self._calculate_user_performance(user_id, game_id)
+        )
+    
+    def _calculate_user_performance(self, user_id: str, 
+                                   game_id: str = None) -> Dict[str, Any]:
+        """Uncached body of calculate_user_performance"""
         try:
-            # Get all user quest events
-            quest_filter = f"{game_id}_quest_completed" if game_id else None
-            completed_quests = self.get_user_events(user_id, event_type=quest_filter, limit=500)
-            
-            # Calculate total rewards
-            rewards = defaultdict(float)
-            total_xp = 0
-            
-            for event in completed_quests:
-                # Extract rewards from each completed quest
-                quest_rewards = event.get("data", {}).get("rewards", {})
-                for token, amount in quest_rewards.items():
-                    try:
-                        # Handle different reward formats
-                        if isinstance(amount, (int, float)):
-                            rewards[token] += amount
-                        elif isinstance(amount, str) and amount.replace('.', '', 1).isdigit():
-                            rewards[token] += float(amount)
-                    except (ValueError, TypeError):
-                        pass
+            user_id = str(user_id)
+            if game_id:
+                quest_types = [f"{game_id}_quest_completed"]
+            else:
+                quest_types = [
+                    t for t in self.user_index.event_types(user_id) if t.endswith("_quest_completed")
+                ]
                 
-                # Track XP gains
-                xp_gain = event.get("data", {}).get("xp_gained", 0)
-                if xp_gain:
-                    total_xp += xp_gain
-            
-            # Calculate efficiency (rewards per quest)
-            quest_count = len(completed_quests)
-            efficiency = {
-                token: amount / quest_count if quest_count > 0 else 0 
-                for token, amount in rewards.items()
-            }
-            
-            # Get AI success rate
-            ai_decisions = self.get_user_events(user_id, event_type="ai_decision", limit=1000)
-            total_decisions = len(ai_decisions)
-            successful_decisions = sum(1 for d in ai_decisions if d.get("data", {}).get("success", False))
-            ai_success_rate = successful_decisions / total_decisions if total_decisions > 0 else 0
-            
-            # Calculate activity trends (quests per day for last 7 days)
-            now = datetime.now()
-            daily_activity = defaultdict(int)
-            
-            for quest in completed_quests:
-                timestamp = quest.get("timestamp", 0)
-                quest_date = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d")
-                daily_activity[quest_date] += 1
+            metrics = analytics_columnar.user_performance(
+                user_id,
+                [self._user_column_batch(user_id, quest_types)],
+                [self._user_column_batch(user_id, ["ai_decision"])]
+            )
+            return {"user_id": user_id, "game_id": game_id, **metrics}
+        except Exception as e:
+            logger.error(f"Failed to calculate user performance: {str(e)}")
+            return {"error": str(e)}
+    
+    def get_leaderboard(self, metric: str = "quests_completed", time_period: str = "last_week",
+                        limit: int = 100, token: str = None, game_id: str = None,
+                        min_decisions: int = 1) -> Dict[str, Any]:
+        """
+        Rank users by a performance metric over a named period
+        
+        Answered from the per-user rollups, so no raw events are read.
+        
+        Args:
+            metric: 'quests_completed', 'xp_gained', 'rewards', 'ai_decisions' or 'ai_success_rate'
+            time_period: Time period for analysis ('today', 'last_week', 'last_month', or all time)
+            limit: Number of users to return
+            token: Reward token to rank by, required for the 'rewards' metric
+            game_id: Optional game identifier to restrict quest metrics to
+            min_decisions: Minimum AI decisions for a user to be ranked by success rate
             
-            # Ensure we have entries for all days in the last week
-            activity_trend = []
-            for i in range(7):
-                date = (now - timedelta(days=i)).strftime("%Y-%m-%d")
-                activity_trend.append({
-                    "date": date,
-                    "quests_completed": daily_activity.get(date, 0)
-                })
+        Returns:
+            Dictionary with the ranked entries, best first
+        """
+        return self._cached(
+            ("get_leaderboard", metric, time_period, limit, token, game_id, min_decisions),
+            None,
+            lambda: self._get_leaderboard(metric, time_period, limit, token, game_id, min_decisions)
+        )
+    
+    def _get_leaderboard(self, metric: str = "quests_completed", time_period: str = "last_week",
+                         limit: int = 100, token: str = None, game_id: str = None,
+                         min_decisions: int = 1) -> Dict[str, Any]:
+        """Uncached body of get_leaderboard"""
+        try:
+            entries = self.rollups.leaderboard(metric, self._period_start_day(time_period), limit,
+                                               token, game_id, min_decisions)
+            return {"metric": metric, "token": token, "game_id": game_id,
+                    "time_period": time_period, "entries": entries}
+        except Exception as e:
+            logger.error(f"Failed to get leaderboard: {str(e)}")
+            return {"error": str(e)}
+    
+    def get_cohort_metrics(self, time_period: str = "last_week", cohort_by: str = "week",
+                           cohorts: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+        """
+        Get AI success rate and quest activity per user cohort
+        
+        Args:
+            time_period: Time period for analysis ('today', 'last_week', 'last_month', or all time)
+            cohort_by: Group users by first-seen 'day', 'week' or 'month'
+            cohorts: Optional explicit cohorts as name -> list of user ids
             
-            return {
-                "user_id": user_id,
-                "game_id": game_id,
-                "total_quests_completed": quest_count,
-                "total_rewards": dict(rewards),
-                "total_xp_gained": total_xp,
-                "rewards_per_quest": efficiency,
-                "ai_success_rate": ai_success_rate,
-                "daily_activity": sorted(activity_trend, key=lambda x: x["date"])
-            }
+        Returns:
+            Dictionary of metrics per cohort
+        """
+        cohorts_key = tuple(sorted((name, tuple(users)) for name, users in cohorts.items())) if cohorts else None
+        return self._cached(
+            ("get_cohort_metrics", time_period, cohort_by, cohorts_key),
+            None,
+            lambda: self._get_cohort_metrics(time_period, cohort_by, cohorts)
+        )
+    
+    def _get_cohort_metrics(self, time_period: str = "last_week", cohort_by: str = "week",
+                            cohorts: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+        """Uncached body of get_cohort_metrics"""
+        try:
+            metrics = self.rollups.cohort_metrics(self._period_start_day(time_period), cohort_by, cohorts)
+            return {"time_period": time_period, "cohort_by": cohort_by if cohorts is None else None,
+                    "cohorts": metrics}
         except Exception as e:
-            logger.error(f"Failed to calculate user performance: {str(e)}")
+            logger.error(f"Failed to get cohort metrics: {str(e)}")
             return {"error": str(e)}
     
-    def get_ai_performance_metrics(self, time_period: str = "last_week") -> Dict[str, Any]:
+    def get_ai_performance_metrics(self, time_period: str = "last_week",
+                                   start_time: int = None,
+                                   end_time: int = None) -> Dict[str, Any]:
         """
         Get metrics on AI agent performance
         
         Args:
             time_period: Time period for analysis ('today', 'last_week', 'last_month')
+            start_time: Optional unix timestamp starting an ad-hoc range
+            end_time: Optional unix timestamp ending an ad-hoc range
             
         Returns:
             Dictionary of AI performance metrics
         """
+        return self._cached(
+            ("get_ai_performance_metrics", time_period, start_time, end_time),
+            ["ai_decision"],
+            lambda: self._get_ai_performance_metrics(time_period, start_time, end_time)
+        )
+    
+    def _get_ai_performance_metrics(self, time_period: str = "last_week",
+                                    start_time: int = None,
+                                    end_time: int = None) -> Dict[str, Any]:
+        """Uncached body of get_ai_performance_metrics"""
         try:
-            # Determine time range
-            now = int(time.time())
-            if time_period == "today":
-                start_time = int(datetime.now().replace(hour=0, minute=0, second=0).timestamp())
-            elif time_period == "last_week":
-                start_time = int((datetime.now() - timedelta(days=7)).timestamp())
-            elif time_period == "last_month":
-                start_time = int((datetime.now() - timedelta(days=30)).timestamp())
+            if start_time is None and end_time is None:
+                metrics = self.rollups.ai_metrics(self._period_start_day(time_period))
             else:
-                start_time = 0
-            
-            # Get AI decision events
-            decisions = self.get_events("ai_decision", start_time=start_time, limit=10000)
-            
-            # Calculate success rate
-            total_decisions = len(decisions)
-            successful_decisions = sum(1 for d in decisions if d.get("data", {}).get("success", False))
-            
-            # Group by intent type
-            intent_success = defaultdict(lambda: {"total": 0, "success": 0})
-            
-            for decision in decisions:
-                intent = decision.get("data", {}).get("intent", "unknown")
-                is_success = decision.get("data", {}).get("success", False)
-                
-                intent_success[intent]["total"] += 1
-                if is_success:
-                    intent_success[intent]["success"] += 1
-            
-            # Calculate success rate by intent
-            intent_metrics = {}
-            for intent, counts in intent_success.items():
-                success_rate = counts["success"] / counts["total"] if counts["total"] > 0 else 0
-                intent_metrics[intent] = {
-                    "total_requests": counts["total"],
-                    "successful": counts["success"],
-                    "success_rate": success_rate
-                }
-            
-            # Calculate average processing time
-            processing_times = [
-                d.get("data", {}).get("processing_time_ms", 0) 
-                for d in decisions
-                if "processing_time_ms" in d.get("data", {})
-            ]
-            
-            avg_processing_time = sum(processing_times) / len(processing_times) if processing_times else 0
-            
-            return {
-                "time_period": time_period,
-                "total_decisions": total_decisions,
-                "successful_decisions": successful_decisions,
-                "overall_success_rate": successful_decisions / total_decisions if total_decisions > 0 else 0,
-                "intent_metrics": intent_metrics,
-                "avg_processing_time_ms": avg_processing_time
-            }
+                aggregator = AIPerformanceAggregator()
+                self._scan(aggregator, start_time, end_time)
+                metrics = aggregator.result()
+            return {"time_period": time_period, **metrics}
         except Exception as e:
             logger.error(f"Failed to get AI performance metrics: {str(e)}")
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
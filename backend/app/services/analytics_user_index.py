@@ -0,0 +1,153 @@
+"""
+User event index for the analytics service
+
+Events are stored once, in the per-type segment files. This index maps each
+user_id to posting lists of (segment seq, byte offset) positions per event
+type, so a user's events are fetched with direct seeks instead of being kept
+in duplicated per-user files. A per-type "indexed through" position, just
+past the last event looked at (with or without a user), is saved next to the
+index so startup only reads events stored after it.
+"""
+
+import os
+import json
+import struct
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# user code, event type code, segment seq, byte offset
+RECORD = struct.Struct("<IHIQ")
+
+OFFSET_BITS = 40
+OFFSET_MASK = (1 << OFFSET_BITS) - 1
+
+
+def pack_position(seq: int, offset: int) -> int:
+    return (seq << OFFSET_BITS) | offset
+
+
+def unpack_position(position: int) -> Tuple[int, int]:
+    return position >> OFFSET_BITS, position & OFFSET_MASK
+
+
+class UserEventIndex:
+    """Append-only user_id -> event type -> positions index"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.names_path = f"{path}.names"
+        self.through_path = f"{path}.through"
+        self._user_codes: Dict[str, int] = {}
+        self._type_codes: Dict[str, int] = {}
+        self._users: List[str] = []
+        self._types: List[str] = []
+        # user_id -> event_type -> packed positions in append order
+        self.postings: Dict[str, Dict[str, array]] = {}
+        # event type -> [segment seq, offset] just past the last event looked at
+        self.through: Dict[str, List[int]] = {}
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Load the name tables and posting lists from disk"""
+        if os.path.exists(self.names_path):
+            with open(self.names_path, "r") as f:
+                for line in f:
+                    kind, name = json.loads(line)
+                    if kind == "user":
+                        self._user_codes[name] = len(self._users)
+                        self._users.append(name)
+                    else:
+                        self._type_codes[name] = len(self._types)
+                        self._types.append(name)
+
+        if os.path.exists(self.through_path):
+            try:
+                with open(self.through_path, "r") as f:
+                    self.through = json.load(f)
+            except ValueError:
+                self.through = {}  # torn write; events are re-read from the start
+
+        if not os.path.exists(self.path):
+            self.through = {}  # postings lost; index everything again
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        # Ignore a torn trailing record left by an interrupted append
+        usable = len(data) - len(data) % RECORD.size
+        for user_code, type_code, seq, offset in RECORD.iter_unpack(data[:usable]):
+            self._add_posting(self._users[user_code], self._types[type_code], seq, offset)
+
+    def reset(self):
+        """Drop every posting, in memory and on disk"""
+        for path in (self.path, self.names_path, self.through_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.__init__(self.path)
+
+    def _code(self, kind: str, name: str) -> int:
+        codes, names = (self._user_codes, self._users) if kind == "user" else (self._type_codes, self._types)
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+            with open(self.names_path, "a") as f:
+                f.write(json.dumps([kind, name]) + "\n")
+        return code
+
+    def _add_posting(self, user_id: str, event_type: str, seq: int, offset: int):
+        user_postings = self.postings.setdefault(user_id, {})
+        if event_type not in user_postings:
+            user_postings[event_type] = array("Q")
+        user_postings[event_type].append(pack_position(seq, offset))
+
+    def add(self, user_id: str, event_type: str, seq: int, offset: int):
+        """Record that an event of user_id starts at (seq, offset)"""
+        record = RECORD.pack(self._code("user", user_id), self._code("type", event_type), seq, offset)
+        with open(self.path, "ab") as f:
+            f.write(record)
+        self._add_posting(user_id, event_type, seq, offset)
+
+    def advance(self, event_type: str, seq: int, offset: int):
+        """Record that every event of event_type before (seq, offset) has been looked at"""
+        self.through[event_type] = [seq, offset]
+
+    def save_through(self, through: Optional[Dict[str, List[int]]] = None):
+        """Persist the indexed-through positions (a snapshot of them, if given)"""
+        tmp_path = f"{self.through_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.through if through is None else through, f)
+        os.replace(tmp_path, self.through_path)
+
+    def prune(self, event_type: str, min_seq: int):
+        """Drop the postings of an event type in segments before min_seq and rewrite the file"""
+        floor = pack_position(min_seq, 0)
+        for user_postings in self.postings.values():
+            positions = user_postings.get(event_type)
+            if positions and positions[0] < floor:
+                user_postings[event_type] = array("Q", (p for p in positions if p >= floor))
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for user_id, user_postings in self.postings.items():
+                for posting_type, positions in user_postings.items():
+                    codes = (self._user_codes[user_id], self._type_codes[posting_type])
+                    for position in positions:
+                        f.write(RECORD.pack(*codes, *unpack_position(position)))
+        os.replace(tmp_path, self.path)
+
+    def last_position(self, event_type: str) -> Tuple[int, int]:
+        """Highest indexed (seq, offset) of an event type, or (-1, -1)"""
+        last = -1
+        for user_postings in self.postings.values():
+            positions = user_postings.get(event_type)
+            if positions:
+                last = max(last, positions[-1])
+        return unpack_position(last) if last >= 0 else (-1, -1)
+
+    def event_types(self, user_id: str) -> List[str]:
+        return list(self.postings.get(user_id, {}))
+
+    def positions(self, user_id: str, event_type: str) -> array:
+        return self.postings.get(user_id, {}).get(event_type, array("Q"))
@@ -0,0 +1,214 @@
+"""
+Balance Snapshot Service for QuestMind AI Agent
+Keeps AVAX and token balances of managed wallets fresh in memory
+"""
+
+import time
+import threading
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+from web3 import Web3
+
+from ..utils.erc20 import balance_of_call, decode_uint
+from ..utils.multicall import Multicall
+from ..utils.rpc_batch import RPCError, batch_request, to_int
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BalanceSnapshotService:
+    def __init__(self, w3: Web3, token_addresses: Optional[List[str]] = None,
+                 max_blocks_behind: int = 2, max_age_seconds: float = 30.0,
+                 multicall: Optional[Multicall] = None):
+        """
+        Initialize the balance snapshot service
+
+        Every refresh reads the native and token balances of all watched
+        wallets with Multicall3 aggregates pinned to one block, so a refresh
+        is one round trip per batch of calls however many wallets are
+        managed (without Multicall3, native balances come from one JSON-RPC
+        batch of eth_getBalance at that block). Readers get the in-memory
+        snapshot without any RPC, and a
+        snapshot that lags the newest seen block or is too old is treated
+        as missing.
+
+        Args:
+            w3: Connected Web3 instance
+            token_addresses: ERC20 tokens to snapshot next to the native balance
+            max_blocks_behind: Newest seen blocks a snapshot may lag before it is stale
+            max_age_seconds: Seconds after which a snapshot is stale regardless of blocks
+            multicall: Multicall client (default: one on w3)
+        """
+        self.w3 = w3
+        self.multicall = multicall or Multicall(w3)
+        self.token_addresses = list(token_addresses or [])
+        self.max_blocks_behind = max_blocks_behind
+        self.max_age_seconds = max_age_seconds
+
+        # Watched addresses, in insertion order
+        self._addresses: Dict[str, None] = {}
+        # address -> {"native_wei", "tokens", "block_number", "updated_at"}
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self.latest_block: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, addresses: List[str]):
+        """Add wallets to the refreshed set"""
+        with self._lock:
+            for address in addresses:
+                self._addresses.setdefault(address)
+
+    def unwatch(self, address: str):
+        with self._lock:
+            self._addresses.pop(address, None)
+            self._snapshots.pop(address, None)
+
+    def refresh(self, block_number: Optional[int] = None) -> int:
+        """
+        Re-read every watched balance at one block
+
+        Args:
+            block_number: Block to read at (default: the current head)
+
+        Returns:
+            Number of wallets refreshed
+        """
+        try:
+            if block_number is None:
+                block_number = self.w3.eth.block_number
+            with self._lock:
+                addresses = list(self._addresses)
+                tokens = list(self.token_addresses)
+            if not addresses:
+                self._advance(block_number)
+                return 0
+
+            use_multicall = self.multicall.is_deployed()
+            calls = []
+            for address in addresses:
+                if use_multicall:
+                    calls.append(self.multicall.eth_balance_call(address))
+                calls.extend((token, balance_of_call(address)) for token in tokens)
+            results = iter(self.multicall.aggregate(calls, block_number))
+            if not use_multicall:
+                native_balances = iter(batch_request(self.w3, [
+                    ("eth_getBalance", [address, hex(block_number)]) for address in addresses
+                ]))
+
+            now = time.time()
+            snapshots = {}
+            for address in addresses:
+                if use_multicall:
+                    success, data = next(results)
+                    native_wei = decode_uint(data) if success else None
+                else:
+                    native = next(native_balances)
+                    native_wei = None if isinstance(native, RPCError) else to_int(native)
+                token_balances = {}
+                for token in tokens:
+                    success, data = next(results)
+                    if success and len(data) >= 32:
+                        token_balances[token] = decode_uint(data)
+                snapshots[address] = {
+                    "native_wei": native_wei,
+                    "tokens": token_balances,
+                    "block_number": block_number,
+                    "updated_at": now
+                }
+
+            with self._lock:
+                for address, snapshot in snapshots.items():
+                    current = self._snapshots.get(address)
+                    # A slower refresh of an older block never overwrites a newer one
+                    if current is None or current["block_number"] <= block_number:
+                        if address in self._addresses:
+                            self._snapshots[address] = snapshot
+            self._advance(block_number)
+            return len(snapshots)
+        except Exception as e:
+            logger.error(f"Failed to refresh balance snapshots: {str(e)}")
+            return 0
+
+    def _advance(self, block_number: int):
+        with self._lock:
+            if self.latest_block is None or block_number > self.latest_block:
+                self.latest_block = block_number
+
+    def _is_fresh(self, snapshot: Dict[str, Any]) -> bool:
+        if time.time() - snapshot["updated_at"] > self.max_age_seconds:
+            return False
+        return self.latest_block is None or self.latest_block - snapshot["block_number"] <= self.max_blocks_behind
+
+    def get_snapshot(self, address: str) -> Optional[Dict[str, Any]]:
+        """
+        Snapshot of a wallet with staleness metadata, without any RPC
+
+        Returns:
+            Dict with native_wei, tokens (token address -> raw balance),
+            block_number, blocks_behind, age_seconds and stale; None if never refreshed
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(address)
+            if snapshot is None:
+                return None
+            return {
+                **snapshot,
+                "tokens": dict(snapshot["tokens"]),
+                "blocks_behind": (self.latest_block - snapshot["block_number"]) if self.latest_block is not None else 0,
+                "age_seconds": time.time() - snapshot["updated_at"],
+                "stale": not self._is_fresh(snapshot)
+            }
+
+    def native_balance(self, address: str) -> Optional[int]:
+        """Fresh native balance in wei, or None if there is no fresh snapshot"""
+        with self._lock:
+            snapshot = self._snapshots.get(address)
+            if snapshot is None or not self._is_fresh(snapshot):
+                return None
+            return snapshot["native_wei"]
+
+    def start(self, poll_interval: float = 1.0, refresh_interval: Optional[float] = None):
+        """
+        Refresh on a background thread
+
+        Args:
+            poll_interval: Seconds between head checks; a refresh runs once per new block
+            refresh_interval: If set, refresh on this fixed period instead of per block
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                if refresh_interval is not None:
+                    self.refresh()
+                    self._stop.wait(refresh_interval)
+                    continue
+                try:
+                    head = self.w3.eth.block_number
+                    if self.latest_block is None or head > self.latest_block:
+                        self.refresh(head)
+                except Exception as e:
+                    logger.error(f"Failed to poll block number: {str(e)}")
+                self._stop.wait(poll_interval)
+
+        self._thread = threading.Thread(target=loop, name="balance-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread started by start()"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+@lru_cache()
+def get_balance_snapshots(provider_uri: str) -> BalanceSnapshotService:
+    """Process-wide snapshots per RPC endpoint, started and stopped with the app"""
+    return BalanceSnapshotService(Web3(Web3.HTTPProvider(provider_uri)))
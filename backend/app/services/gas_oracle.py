@@ -0,0 +1,221 @@
+"""
+Gas Oracle Service for QuestMind AI Agent
+Suggests EIP-1559 fees per urgency tier from recent eth_feeHistory data
+"""
+
+import time
+import threading
+from collections import deque
+from functools import lru_cache
+from statistics import median
+from typing import Deque, Dict, List, Optional, Tuple
+
+from web3 import Web3
+
+from ..utils.logger import get_logger
+from ..utils.rpc_batch import batch_request, to_int
+
+logger = get_logger(__name__)
+
+# tier -> (priority fee reward percentile, base fee multiplier)
+# The base fee can rise 12.5% per block, so the multiplier bounds how many
+# full blocks of growth maxFeePerGas absorbs: ~1 for slow, ~2 for standard
+# and ~6 for fast. A type-2 transaction only pays the actual base fee plus
+# its tip, so the headroom costs nothing unless it is used.
+FEE_TIERS: Dict[str, Tuple[float, float]] = {
+    "slow": (10, 1.125),
+    "standard": (50, 1.25),
+    "fast": (90, 2.0),
+}
+
+
+class GasOracle:
+    def __init__(self, w3: Web3, block_count: int = 20,
+                 tiers: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_blocks_behind: int = 2, max_age_seconds: float = 30.0,
+                 refresh_interval: float = 2.0):
+        """
+        Initialize the gas oracle
+
+        The oracle keeps the priority fee percentiles of the last
+        ``block_count`` blocks and the next block's base fee, read with
+        eth_feeHistory. Each new block costs one eth_feeHistory call for just
+        that block, and fee suggestions are then answered from memory. While
+        no background thread runs, a lookup older than ``refresh_interval``
+        first checks for new blocks.
+
+        Args:
+            w3: Connected Web3 instance
+            block_count: Blocks of history the percentiles are taken over
+            tiers: Urgency tier -> (reward percentile, base fee multiplier)
+            max_blocks_behind: Newest seen blocks the fee data may lag before it is stale
+            max_age_seconds: Seconds after which the fee data is stale regardless of blocks
+            refresh_interval: Minimum seconds between on-demand refreshes
+        """
+        self.w3 = w3
+        self.block_count = block_count
+        self.tiers = dict(tiers or FEE_TIERS)
+        self.percentiles = sorted({percentile for percentile, _ in self.tiers.values()})
+        self.max_blocks_behind = max_blocks_behind
+        self.max_age_seconds = max_age_seconds
+        self.refresh_interval = refresh_interval
+
+        # (block number, gas used ratio, rewards aligned with self.percentiles)
+        self._blocks: Deque[Tuple[int, float, List[int]]] = deque(maxlen=block_count)
+        self.next_base_fee: Optional[int] = None
+        self.block_number: Optional[int] = None
+        self.latest_block: Optional[int] = None
+        self.updated_at: Optional[float] = None
+        self._checked_at = 0.0
+        self._suggestions: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self, block_number: Optional[int] = None) -> bool:
+        """
+        Read fee history up to a block and recompute the suggestions
+
+        Only blocks newer than the last refresh are fetched.
+
+        Args:
+            block_number: Newest block to include (default: the current head)
+
+        Returns:
+            True if the suggestions were updated
+        """
+        with self._refresh_lock:
+            try:
+                if block_number is None:
+                    block_number = self.w3.eth.block_number
+                self._checked_at = time.monotonic()
+                with self._lock:
+                    if self.latest_block is None or block_number > self.latest_block:
+                        self.latest_block = block_number
+                    if self.block_number is not None and block_number <= self.block_number:
+                        return False
+                    new_blocks = self.block_count if self.block_number is None else min(
+                        block_number - self.block_number, self.block_count)
+
+                history = self.w3.eth.fee_history(new_blocks, block_number, self.percentiles)
+                oldest = history["oldestBlock"]
+                rewards = history.get("reward") or [[0] * len(self.percentiles)] * len(history["gasUsedRatio"])
+                with self._lock:
+                    for offset, (ratio, reward) in enumerate(zip(history["gasUsedRatio"], rewards)):
+                        self._blocks.append((oldest + offset, ratio, list(reward)))
+                    # baseFeePerGas has one entry more than blocks: the next block's base fee
+                    self.next_base_fee = history["baseFeePerGas"][-1]
+                    self.block_number = block_number
+                    self.updated_at = time.time()
+                    self._suggestions = self._compute()
+                return True
+            except Exception as e:
+                logger.error(f"Failed to refresh fee history: {str(e)}")
+                return False
+
+    def _compute(self) -> Dict[str, Dict[str, int]]:
+        # Empty blocks report zero rewards, which would drag every tier to zero
+        busy = [reward for _, ratio, reward in self._blocks if ratio > 0] or [reward for _, _, reward in self._blocks]
+        suggestions = {}
+        for tier, (percentile, base_fee_multiplier) in self.tiers.items():
+            column = self.percentiles.index(percentile)
+            priority_fee = int(median(reward[column] for reward in busy)) if busy else 0
+            suggestions[tier] = {
+                "maxPriorityFeePerGas": priority_fee,
+                "maxFeePerGas": int(self.next_base_fee * base_fee_multiplier) + priority_fee,
+                "baseFeePerGas": self.next_base_fee,
+                "block_number": self.block_number,
+            }
+        return suggestions
+
+    def _is_fresh(self) -> bool:
+        if self.updated_at is None or time.time() - self.updated_at > self.max_age_seconds:
+            return False
+        return self.latest_block - self.block_number <= self.max_blocks_behind
+
+    def cached(self, tier: str = "standard") -> Optional[Dict[str, int]]:
+        """Fresh suggestion for a tier from memory, or None"""
+        if tier not in self.tiers:
+            raise ValueError(f"Unknown fee tier: {tier}")
+        with self._lock:
+            if not self._is_fresh():
+                return None
+            return dict(self._suggestions[tier])
+
+    def suggest(self, tier: str = "standard") -> Dict[str, int]:
+        """
+        EIP-1559 fee suggestion for an urgency tier
+
+        Args:
+            tier: One of the configured tiers, e.g. "slow", "standard", "fast"
+
+        Returns:
+            Dict with maxFeePerGas, maxPriorityFeePerGas, baseFeePerGas and block_number
+        """
+        if self._thread is None and time.monotonic() - self._checked_at >= self.refresh_interval:
+            self.refresh()
+        suggestion = self.cached(tier)
+        if suggestion is not None:
+            return suggestion
+        return self._fallback(tier)
+
+    def _fallback(self, tier: str) -> Dict[str, int]:
+        """Suggestion from the latest block and the node's tip estimate, for nodes without fee history"""
+        _, base_fee_multiplier = self.tiers[tier]
+        block, priority_fee = batch_request(self.w3, [
+            ("eth_getBlockByNumber", ["latest", False]),
+            ("eth_maxPriorityFeePerGas", [])
+        ])
+        for result in (block, priority_fee):
+            if isinstance(result, Exception):
+                raise result
+        base_fee, priority_fee = to_int(block["baseFeePerGas"]), to_int(priority_fee)
+        return {
+            "maxPriorityFeePerGas": priority_fee,
+            "maxFeePerGas": int(base_fee * base_fee_multiplier) + priority_fee,
+            "baseFeePerGas": base_fee,
+            "block_number": to_int(block["number"]),
+        }
+
+    def gas_price(self, tier: str = "standard") -> int:
+        """Legacy (type-0) gas price for a tier: expected base fee plus the tier's tip"""
+        suggestion = self.suggest(tier)
+        return suggestion["baseFeePerGas"] + suggestion["maxPriorityFeePerGas"]
+
+    def start(self, poll_interval: float = 1.0):
+        """
+        Refresh on a background thread, once per new block
+
+        Args:
+            poll_interval: Seconds between head checks
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                self.refresh()
+                self._stop.wait(poll_interval)
+
+        self._thread = threading.Thread(target=loop, name="gas-oracle", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread started by start()"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+@lru_cache()
+def get_gas_oracle(provider_uri: str) -> GasOracle:
+    """
+    Process-wide oracle per RPC endpoint, shared by the transaction manager and blockchain utilities
+
+    The oracle refreshes on demand; the app starts and stops its background
+    thread for the configured endpoint.
+    """
+    return GasOracle(Web3(Web3.HTTPProvider(provider_uri)))
@@ -0,0 +1,191 @@
+"""
+Nonce Manager for QuestMind AI Agent
+Allocates transaction nonces per wallet locally so transactions can be pipelined
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Set
+
+from web3 import Web3
+
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Node error fragments meaning the local nonce view is behind the chain
+NONCE_TOO_LOW_ERRORS = ("nonce too low", "replacement transaction underpriced")
+
+
+def is_nonce_too_low(error: Exception) -> bool:
+    """Whether a send error means the nonce was already used"""
+    message = str(error).lower()
+    return any(fragment in message for fragment in NONCE_TOO_LOW_ERRORS)
+
+
+class _WalletNonces:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.next_nonce: Optional[int] = None
+        # Allocated but not yet broadcast
+        self.reserved: Set[int] = set()
+        # Broadcast and not yet seen below the node's pending count: nonce -> tx hash
+        self.sent: Dict[int, str] = {}
+        # Allocated, then released without being broadcast; reused lowest first
+        self.gaps: Set[int] = set()
+
+
+class NonceManager:
+    def __init__(self, w3: Web3):
+        """
+        Initialize the nonce manager
+
+        Each wallet's nonce is read once from the node's pending transaction
+        count and handed out locally afterwards, under a per-wallet lock, so
+        dozens of transactions can be in flight from one wallet without a
+        count RPC each or two of them getting the same nonce. Nonces that are
+        released unbroadcast are reused before new ones, and the wallet is
+        resynced from the node when a send reports the nonce as used or
+        reconcile() finds broadcast transactions dropped from the pool.
+
+        Args:
+            w3: Connected Web3 instance
+        """
+        self.w3 = w3
+        self._wallets: Dict[str, _WalletNonces] = {}
+
+    def _state(self, address: str) -> _WalletNonces:
+        state = self._wallets.get(address)
+        if state is None:
+            state = self._wallets[address] = _WalletNonces()
+        return state
+
+    async def _pending_count(self, address: str) -> int:
+        return await asyncio.to_thread(self.w3.eth.get_transaction_count, address, "pending")
+
+    async def allocate(self, address: str) -> int:
+        """
+        Reserve the next nonce of a wallet
+
+        Args:
+            address: Sending wallet address
+
+        Returns:
+            Nonce to build the transaction with
+        """
+        return (await self.allocate_many(address, 1))[0]
+
+    def is_synced(self, address: str) -> bool:
+        """Whether allocating for a wallet is answered locally, without a count RPC"""
+        state = self._wallets.get(address)
+        return state is not None and state.next_nonce is not None
+
+    async def allocate_many(self, address: str, count: int, pending_count: Optional[int] = None) -> List[int]:
+        """
+        Reserve several nonces of a wallet at once, in sending order
+
+        Args:
+            address: Sending wallet address
+            count: Number of nonces
+            pending_count: Node's pending count, if the caller already fetched it,
+                used instead of a count RPC when the wallet is not synced yet
+
+        Returns:
+            Nonces to build the transactions with
+        """
+        state = self._state(address)
+        async with state.lock:
+            if state.next_nonce is None:
+                state.next_nonce = pending_count if pending_count is not None else await self._pending_count(address)
+            nonces = []
+            for _ in range(count):
+                if state.gaps:
+                    nonce = min(state.gaps)
+                    state.gaps.discard(nonce)
+                else:
+                    # Builds still holding nonces from before a resync keep them
+                    while state.next_nonce in state.reserved:
+                        state.next_nonce += 1
+                    nonce = state.next_nonce
+                    state.next_nonce += 1
+                state.reserved.add(nonce)
+                nonces.append(nonce)
+            return nonces
+
+    async def release(self, address: str, nonce: int):
+        """Return a nonce whose transaction was never broadcast"""
+        state = self._state(address)
+        async with state.lock:
+            if nonce not in state.reserved:
+                return
+            state.reserved.discard(nonce)
+            if state.next_nonce is not None and nonce == state.next_nonce - 1:
+                state.next_nonce -= 1
+                # Trailing gaps collapse back into the counter
+                while state.next_nonce - 1 in state.gaps:
+                    state.next_nonce -= 1
+                    state.gaps.discard(state.next_nonce)
+            elif state.next_nonce is not None and nonce < state.next_nonce:
+                state.gaps.add(nonce)
+
+    async def mark_sent(self, address: str, nonce: int, tx_hash: str):
+        """Record that the transaction using a nonce was broadcast"""
+        state = self._state(address)
+        async with state.lock:
+            state.reserved.discard(nonce)
+            state.sent[nonce] = tx_hash
+
+    async def resync(self, address: str) -> int:
+        """
+        Reset a wallet to the node's pending transaction count
+
+        Used when the node reports a nonce as already used, e.g. after the
+        wallet sent transactions this manager did not allocate.
+
+        Returns:
+            The next nonce that will be allocated
+        """
+        state = self._state(address)
+        async with state.lock:
+            pending = await self._pending_count(address)
+            if state.next_nonce is not None and pending != state.next_nonce:
+                logger.warning(f"Resyncing nonce of {address}: local {state.next_nonce}, node {pending}")
+            state.next_nonce = pending
+            state.gaps = set()
+            # Reservations below the node's count are used already and can only fail
+            state.reserved = {nonce for nonce in state.reserved if nonce >= pending}
+            state.sent = {nonce: tx_hash for nonce, tx_hash in state.sent.items() if nonce < pending}
+            return pending
+
+    async def reconcile(self, address: str) -> List[str]:
+        """
+        Compare local nonces with the node and resync on a gap
+
+        A broadcast transaction whose nonce is at or above the node's pending
+        count has been dropped from the pool, and every later transaction of
+        the wallet is stuck behind it. In that case the wallet is resynced so
+        the next allocation refills the gap.
+
+        Returns:
+            Hashes of the dropped transactions, in nonce order
+        """
+        state = self._state(address)
+        async with state.lock:
+            pending = await self._pending_count(address)
+            dropped = sorted(nonce for nonce in state.sent if nonce >= pending)
+            # Everything below the pending count is in the pool or mined
+            state.sent = {nonce: tx_hash for nonce, tx_hash in state.sent.items() if nonce >= pending}
+            if state.next_nonce is None or pending > state.next_nonce:
+                state.next_nonce = pending
+            elif dropped and pending < state.next_nonce:
+                logger.warning(f"Nonce gap for {address}: node at {pending}, local at {state.next_nonce}; "
+                               f"{len(dropped)} transactions dropped")
+                hashes = [state.sent[nonce] for nonce in dropped]
+                state.next_nonce = pending
+                state.gaps = set()
+                state.sent = {}
+                return hashes
+            return []
+
+    def forget(self, address: str):
+        """Drop local state of a wallet; the next allocation resyncs it"""
+        self._wallets.pop(address, None)
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import shutil
+import threading
+from typing import Dict, Any, List, Optional
+
+from .analytics_service import AnalyticsService
+from ..utils.block_file import (
+    COMPRESSED_SUFFIX, compress_file, is_compressed, original_path
+)
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DAY_SECONDS = 24 * 3600
+
+
+class RetentionPolicy:
+    def __init__(self, max_active_bytes: int = 64 * 1024 * 1024,
+                 max_active_age: int = DAY_SECONDS,
+                 retention_seconds: Optional[int] = 90 * DAY_SECONDS,
+                 archive: bool = False, compress: bool = True):
+        """
+        Retention rules for one stream of events
+
+        Args:
+            max_active_bytes: Roll the active file over once it reaches this size
+            max_active_age: Roll the active file over once its oldest event is this old (seconds)
+            retention_seconds: Remove closed segments whose newest event is older than this (None keeps everything)
+            archive: Move expired segments to the archive directory instead of deleting them
+            compress: Compress closed segments into seekable blocks
+        """
+        self.max_active_bytes = max_active_bytes
+        self.max_active_age = max_active_age
+        self.retention_seconds = retention_seconds
+        self.archive = archive
+        self.compress = compress
+
+
+class RetentionManager:
+    def __init__(self, analytics_service: AnalyticsService,
+                 policies: Optional[Dict[str, RetentionPolicy]] = None,
+                 default_policy: Optional[RetentionPolicy] = None,
+                 activity_policy: Optional[RetentionPolicy] = None,
+                 activity_logs_dir: str = "./data/activity_logs",
+                 archive_dir: str = "./data/archive"):
+        """
+        Initialize the retention manager
+
+        Args:
+            analytics_service: Service owning the analytics event files
+            policies: Per-event-type policies for analytics events
+            default_policy: Policy for event types without their own
+            activity_policy: Policy for the per-user activity logs
+            activity_logs_dir: Directory of the activity logs written by UserService
+            archive_dir: Root directory for archived segments
+        """
+        self.analytics = analytics_service
+        self.policies = policies or {}
+        self.default_policy = default_policy or RetentionPolicy()
+        self.activity_policy = activity_policy or RetentionPolicy(max_active_bytes=4 * 1024 * 1024,
+                                                                  max_active_age=7 * DAY_SECONDS)
+        self.activity_logs_dir = activity_logs_dir
+        self.archive_dir = archive_dir
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def policy_for(self, event_type: str) -> RetentionPolicy:
+        return self.policies.get(event_type, self.default_policy)
+
+    @staticmethod
+    def _needs_rollover(policy: RetentionPolicy, size_bytes: int, first_timestamp: int, now: float) -> bool:
+        if size_bytes == 0:
+            return False
+        if policy.max_active_bytes and size_bytes >= policy.max_active_bytes:
+            return True
+        return bool(policy.max_active_age) and now - first_timestamp >= policy.max_active_age
+
+    def run(self) -> Dict[str, int]:
+        """
+        Apply every policy once: roll over, compress and expire
+
+        Returns:
+            Counts of rolled_over, compressed, dropped and archived files
+        """
+        stats = {"rolled_over": 0, "compressed": 0, "dropped": 0, "archived": 0}
+        now = time.time()
+
+        for event_type in self.analytics.list_event_types():
+            try:
+                self._apply_analytics(event_type, self.policy_for(event_type), now, stats)
+            except Exception as e:
+                logger.error(f"Failed to apply retention to {event_type} events: {str(e)}")
+
+        if os.path.exists(self.activity_logs_dir):
+            for filename in os.listdir(self.activity_logs_dir):
+                if not filename.endswith(".jsonl"):
+                    continue
+                try:
+                    self._apply_activity_log(filename[:-len(".jsonl")], self.activity_policy, now, stats)
+                except Exception as e:
+                    logger.error(f"Failed to apply retention to activity log {filename}: {str(e)}")
+            for user_id in self._activity_segment_users():
+                if not os.path.exists(f"{self.activity_logs_dir}/{user_id}.jsonl"):
+                    self._expire_activity_segments(user_id, self.activity_policy, now, stats)
+
+        logger.info(f"Retention run finished: {stats}")
+        return stats
+
+    def _apply_analytics(self, event_type: str, policy: RetentionPolicy, now: float, stats: Dict[str, int]):
+        info = self.analytics.active_file_info(event_type)
+        if info and self._needs_rollover(policy, info["size_bytes"], info["first_timestamp"], now):
+            if self.analytics.seal_segment(event_type) is not None:
+                stats["rolled_over"] += 1
+
+        segments = self.analytics.closed_segments(event_type)
+        if policy.retention_seconds is not None:
+            cutoff = now - policy.retention_seconds
+            # Segments are dropped oldest first, so expiry stops at the first
+            # one still holding an event newer than the cutoff
+            expired = []
+            for segment in segments:
+                if segment["newest_timestamp"] >= cutoff:
+                    break
+                expired.append(segment)
+            if expired:
+                through_seq = expired[-1]["seq"]
+                archive_dir = f"{self.archive_dir}/analytics" if policy.archive else None
+                dropped = self.analytics.drop_segments(event_type, through_seq, archive_dir)
+                stats["archived" if policy.archive else "dropped"] += dropped
+                segments = [segment for segment in segments if segment["seq"] > through_seq]
+
+        if policy.compress:
+            for segment in segments:
+                if not segment["compressed"] and self.analytics.compress_segment(event_type, segment["seq"]):
+                    stats["compressed"] += 1
+
+    def _activity_segment_dir(self, user_id: str) -> str:
+        return f"{self.activity_logs_dir}/segments/{user_id}"
+
+    def _activity_segment_users(self) -> List[str]:
+        segments_root = f"{self.activity_logs_dir}/segments"
+        return os.listdir(segments_root) if os.path.exists(segments_root) else []
+
+    def _activity_segments(self, user_id: str) -> List[str]:
+        segment_dir = self._activity_segment_dir(user_id)
+        if not os.path.exists(segment_dir):
+            return []
+        return [f"{segment_dir}/{filename}" for filename in sorted(os.listdir(segment_dir))
+                if original_path(filename).endswith(".jsonl")]
+
+    def _apply_activity_log(self, user_id: str, policy: RetentionPolicy, now: float, stats: Dict[str, int]):
+        log_file = f"{self.activity_logs_dir}/{user_id}.jsonl"
+        size_bytes = os.path.getsize(log_file)
+        first_timestamp = 0
+        if size_bytes:
+            with open(log_file, "rb") as f:
+                first_line = f.readline()
+            if first_line.strip():
+                first_timestamp = json.loads(first_line).get("timestamp", 0)
+
+        if self._needs_rollover(policy, size_bytes, first_timestamp, now):
+            segment_dir = self._activity_segment_dir(user_id)
+            os.makedirs(segment_dir, exist_ok=True)
+            segments = self._activity_segments(user_id)
+            seq = int(os.path.basename(segments[-1]).split(".")[0]) + 1 if segments else 0
+            os.replace(log_file, f"{segment_dir}/{seq:08d}.jsonl")
+            stats["rolled_over"] += 1
+
+        self._expire_activity_segments(user_id, policy, now, stats)
+
+    def _expire_activity_segments(self, user_id: str, policy: RetentionPolicy, now: float, stats: Dict[str, int]):
+        for path in self._activity_segments(user_id):
+            if policy.retention_seconds is not None and os.path.getmtime(path) < now - policy.retention_seconds:
+                if policy.archive:
+                    target_dir = f"{self.archive_dir}/activity_logs/{user_id}"
+                    os.makedirs(target_dir, exist_ok=True)
+                    target = f"{target_dir}/{os.path.basename(original_path(path))}{COMPRESSED_SUFFIX}"
+                    if is_compressed(path):
+                        os.replace(path, target)
+                    else:
+                        compress_file(path, target)
+                        os.remove(path)
+                    stats["archived"] += 1
+                else:
+                    os.remove(path)
+                    stats["dropped"] += 1
+            elif policy.compress and not is_compressed(path):
+                compress_file(path, path + COMPRESSED_SUFFIX)
+                # Activity segments expire by mtime, which must stay the time of the last append
+                shutil.copystat(path, path + COMPRESSED_SUFFIX)
+                os.remove(path)
+                stats["compressed"] += 1
+
+        segment_dir = self._activity_segment_dir(user_id)
+        if os.path.exists(segment_dir) and not os.listdir(segment_dir):
+            os.rmdir(segment_dir)
+
+    def start(self, interval: float = 3600):
+        """Run the policies every `interval` seconds on a background thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                self.run()
+
+        self._thread = threading.Thread(target=loop, name="retention-manager", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread started by start()"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
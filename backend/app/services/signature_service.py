@@ -0,0 +1,185 @@
+"""
+Signature Verification Service for QuestMind AI Agent
+Recovers signers of personal_sign messages off the event loop
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# (message text, signature)
+SignedMessage = Tuple[str, str]
+
+
+def _recover_batch(items: List[SignedMessage]) -> List[Optional[str]]:
+    """
+    Recover the signer of each message in a worker
+
+    Args:
+        items: (message, signature) pairs
+
+    Returns:
+        Checksummed signer addresses, None where a signature is malformed
+    """
+    addresses = []
+    for message, signature in items:
+        try:
+            addresses.append(Account.recover_message(encode_defunct(text=message), signature=signature))
+        except Exception:
+            addresses.append(None)
+    return addresses
+
+
+class SignatureService:
+    def __init__(self, max_workers: int = None, use_processes: bool = True,
+                 max_batch: int = 64, batch_delay: float = 0.002, memo_size: int = 10000):
+        """
+        Initialize the signature verification service
+
+        secp256k1 public-key recovery is CPU-bound, so it runs in a worker
+        pool instead of on the event loop. Requests arriving within
+        ``batch_delay`` of each other are sent to a worker together, so a
+        login storm costs one task hand-off per batch, and identical
+        (message, signature) pairs share one recovery while in flight and
+        are answered from a memo afterwards.
+
+        Args:
+            max_workers: Worker count (default: CPU count)
+            use_processes: Recover in processes, which scale with cores whatever the secp256k1 backend
+            max_batch: Flush a batch once it holds this many requests
+            batch_delay: Seconds to wait for more requests before flushing a batch
+            memo_size: Recent (message, signature) -> signer results kept
+        """
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.memo_size = memo_size
+
+        self._memo: "OrderedDict[SignedMessage, Optional[str]]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self._in_flight: Dict[SignedMessage, asyncio.Future] = {}
+        self._pending: List[SignedMessage] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.max_workers)
+        return self._executor
+
+    def _discard_executor(self, executor: Executor):
+        """Drop a broken or shut down pool so the next batch starts a new one"""
+        if self._executor is executor:
+            self._executor = None
+        try:
+            executor.shutdown(wait=False)
+        except Exception:
+            pass
+
+    def _memo_get(self, key: SignedMessage) -> Tuple[bool, Optional[str]]:
+        with self._memo_lock:
+            if key not in self._memo:
+                return False, None
+            self._memo.move_to_end(key)
+            return True, self._memo[key]
+
+    def _memo_put(self, key: SignedMessage, address: Optional[str]):
+        with self._memo_lock:
+            self._memo[key] = address
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    async def recover(self, message: str, signature: str) -> Optional[str]:
+        """
+        Recover the address that signed a text message
+
+        Args:
+            message: Signed text (personal_sign / EIP-191)
+            signature: Signature hex
+
+        Returns:
+            Checksummed signer address, or None if the signature is malformed
+        """
+        key = (message, signature)
+        found, address = self._memo_get(key)
+        if found:
+            return address
+
+        future = self._in_flight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._in_flight[key] = loop.create_future()
+            self._pending.append(key)
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.batch_delay, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        """Hand the pending requests to a worker as one batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        def finish(addresses: List[Optional[str]], memoize: bool):
+            for key, address in zip(batch, addresses):
+                if memoize:
+                    self._memo_put(key, address)
+                future = self._in_flight.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_result(address)
+
+        def resolve(task: asyncio.Future):
+            error = task.exception()
+            if error is None:
+                finish(task.result(), True)
+                return
+            logger.error(f"Signature recovery batch failed: {str(error)}")
+            if isinstance(error, BrokenExecutor):
+                self._discard_executor(executor)
+            finish([None] * len(batch), False)
+
+        executor = self._get_executor()
+        try:
+            task = asyncio.get_running_loop().run_in_executor(executor, _recover_batch, batch)
+        except Exception as e:
+            # A dead or shut down pool refuses the batch; waiters must not hang on it
+            logger.error(f"Failed to submit signature recovery batch: {str(e)}")
+            self._discard_executor(executor)
+            finish([None] * len(batch), False)
+            return
+        task.add_done_callback(resolve)
+
+    async def verify(self, address: str, message: str, signature: str) -> bool:
+        """Check that a text message was signed by the given address"""
+        recovered = await self.recover(message, signature)
+        return recovered is not None and recovered.lower() == address.lower()
+
+    def close(self):
+        """Shut down the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+@lru_cache()
+def get_signature_service() -> SignatureService:
+    """Process-wide verification service shared by the auth endpoint and wallet utilities"""
+    return SignatureService()
@@ -5,7 +5,8 @@ Handles blockchain transactions, gas estimation, and transaction monitoring
 
 import asyncio
 import time
-from typing import Dict, Any, Optional, List
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
 
 from web3 import Web3
 from eth_account.account import Account
@@ -13,68 +14,249 @@ from eth_account.signers.local import LocalAccount
 
 from ..models.transaction import Transaction
 from ..models.wallet import Wallet
+from .balance_snapshot import BalanceSnapshotService, get_balance_snapshots
+from .gas_oracle import GasOracle, get_gas_oracle
+from .nonce_manager import NonceManager, is_nonce_too_low
 from ..utils.logger import get_logger
+from ..utils.rpc_batch import batch_request, to_int
 
 logger = get_logger(__name__)
 
 class TransactionManager:
-    def __init__(self, web3_provider: str, chain_id: int = 43114):
+    def __init__(self, web3_provider: str, chain_id: int = 43114,
+                 balance_snapshots: Optional[BalanceSnapshotService] = None,
+                 nonce_manager: Optional[NonceManager] = None,
+                 gas_oracle: Optional[GasOracle] = None, gas_estimate_ttl: float = 15.0):
         """Initialize the transaction manager with Web3 provider"""
         self.w3 = Web3(Web3.HTTPProvider(web3_provider))
         self.chain_id = chain_id
         self.pending_transactions: Dict[str, Transaction] = {}
+        # Fresh in-memory balances make the funds check free of RPCs;
+        # shared with WalletService and refreshed per block
+        self.balance_snapshots = balance_snapshots or get_balance_snapshots(web3_provider)
+        # Nonces are allocated locally so one wallet can pipeline transactions
+        self.nonces = nonce_manager or NonceManager(self.w3)
+        # Fee suggestions come from the oracle shared with BlockchainUtils
+        self.gas_oracle = gas_oracle or get_gas_oracle(web3_provider)
+        # Short-lived cache of gas estimates shared by back-to-back transactions
+        self.gas_estimate_ttl = gas_estimate_ttl
+        self._gas_estimates: "OrderedDict[Tuple[str, str, int], Tuple[int, float]]" = OrderedDict()
         
+    def _cached_gas_estimate(self, key: Tuple[str, str, int]) -> Optional[int]:
+        entry = self._gas_estimates.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+    
+    def _store_gas_estimate(self, key: Tuple[str, str, int], gas_limit: int):
+        self._gas_estimates[key] = (gas_limit, time.monotonic() + self.gas_estimate_ttl)
+        self._gas_estimates.move_to_end(key)
+        while len(self._gas_estimates) > 1024:
+            self._gas_estimates.popitem(last=False)
+    
     async def estimate_gas(self, to_address: str, data: str, value: int = 0) -> int:
-        """Estimate gas for a transaction"""
+        """Estimate gas for a transaction, reusing a recent estimate of the same call"""
+        key = (to_address, data, value)
+        cached = self._cached_gas_estimate(key)
+        if cached is not None:
+            return cached
         try:
-            gas_estimate = self.w3.eth.estimate_gas({
+            gas_estimate = await asyncio.to_thread(self.w3.eth.estimate_gas, {
                 'to': to_address,
                 'data': data,
                 'value': value
             })
             # Add 20% buffer for safety
-            return int(gas_estimate * 1.2)
+            gas_limit = int(gas_estimate * 1.2)
+            self._store_gas_estimate(key, gas_limit)
+            return gas_limit
         except Exception as e:
             logger.error(f"Gas estimation failed: {str(e)}")
             # Default gas limit for Avalanche C-Chain
             return 500000
     
-    def get_gas_price(self) -> int:
-        """Get current gas price with dynamic adjustments based on network congestion"""
+    def get_gas_price(self, urgency: str = "standard") -> int:
+        """Get current legacy gas price for an urgency tier from the gas oracle"""
         try:
-            base_fee = self.w3.eth.get_block('latest').baseFeePerGas
-            # Add priority fee (tip) - adjust based on urgency
-            priority_fee = self.w3.eth.max_priority_fee
-            return base_fee + priority_fee
+            return self.gas_oracle.gas_price(urgency)
         except Exception as e:
             logger.error(f"Failed to get gas price: {str(e)}")
             # Fallback to standard gas price
             return self.w3.eth.gas_price
     
+    async def get_fees(self, urgency: str = "standard") -> Dict[str, int]:
+        """
+        Fee fields for a transaction of an urgency tier
+        
+        Returns:
+            maxFeePerGas and maxPriorityFeePerGas from the gas oracle (read
+            from memory while it is fresh), or gasPrice if no suggestion is available
+        """
+        suggestion = self.gas_oracle.cached(urgency)
+        if suggestion is None:
+            try:
+                suggestion = await asyncio.to_thread(self.gas_oracle.suggest, urgency)
+            except Exception as e:
+                logger.error(f"Failed to get fee suggestion: {str(e)}")
+                return {'gasPrice': await asyncio.to_thread(lambda: self.w3.eth.gas_price)}
+        return {
+            'maxFeePerGas': suggestion["maxFeePerGas"],
+            'maxPriorityFeePerGas': suggestion["maxPriorityFeePerGas"],
+        }
+    
+    def _snapshot_balance(self, address: str) -> Optional[int]:
+        """Fresh snapshot balance of a sending wallet, watching it so later builds have one"""
+        self.balance_snapshots.watch([address])
+        return self.balance_snapshots.native_balance(address)
+    
+    async def _get_balance(self, address: str) -> int:
+        balance = self._snapshot_balance(address)
+        if balance is None:
+            balance = await asyncio.to_thread(self.w3.eth.get_balance, address)
+        return balance
+    
+    @staticmethod
+    def _max_cost(tx: Dict[str, Any]) -> int:
+        """Most a transaction can cost: gas limit at the fee cap, plus value"""
+        return tx['gas'] * tx.get('maxFeePerGas', tx.get('gasPrice', 0)) + tx['value']
+    
+    def _check_funds(self, balance: int, tx_cost: int):
+        if balance < tx_cost:
+            raise ValueError(f"Insufficient funds. Need {self.w3.from_wei(tx_cost, 'ether')} AVAX, but have {self.w3.from_wei(balance, 'ether')} AVAX")
+    
     async def build_transaction(self, wallet: Wallet, to_address: str, 
-                               data: str, value: int = 0) -> Dict[str, Any]:
-        """Build a transaction object ready for signing"""
-        nonce = self.w3.eth.get_transaction_count(wallet.address)
-        gas_price = self.get_gas_price()
-        gas_limit = await self.estimate_gas(to_address, data, value)
+                               data: str, value: int = 0, urgency: str = "standard") -> Dict[str, Any]:
+        """
+        Build a transaction object ready for signing
         
-        tx = {
+        Nonce, fees, gas estimate and balance are independent, so they are
+        looked up concurrently, and each comes from a local or cached source
+        when one is fresh. Fees are EIP-1559 (type-2) suggestions for the
+        urgency tier ("slow", "standard" or "fast"). The nonce is reserved for the wallet; if
+        the transaction is not sent, hand it back with ``self.nonces.release``
+        so it is reused.
+        """
+        nonce, fees, gas_limit, balance = await asyncio.gather(
+            self.nonces.allocate(wallet.address),
+            self.get_fees(urgency),
+            self.estimate_gas(to_address, data, value),
+            self._get_balance(wallet.address),
+            return_exceptions=True
+        )
+        if isinstance(nonce, Exception):
+            raise nonce
+        try:
+            for result in (fees, gas_limit, balance):
+                if isinstance(result, Exception):
+                    raise result
+            
+            tx = {
+                'chainId': self.chain_id,
+                'nonce': nonce,
+                'to': to_address,
+                'value': value,
+                'gas': gas_limit,
+                'data': data,
+                **fees,
+            }
+            
+            # Check if user has enough balance
+            self._check_funds(balance, self._max_cost(tx))
+        except Exception:
+            await self.nonces.release(wallet.address, nonce)
+            raise
+            
+        return tx
+    
+    async def build_transactions(self, wallet: Wallet, requests: List[Dict[str, Any]],
+                                 urgency: str = "standard") -> List[Dict[str, Any]]:
+        """
+        Build several transactions of one wallet with one batched round trip
+        
+        Every input that is not cached (gas estimates, balance, the wallet's
+        nonce) is fetched in a single JSON-RPC batch, next to the fee lookup,
+        and the transactions get consecutive nonces in request order.
+        
+        Args:
+            wallet: Sending wallet
+            requests: Dicts with 'to', optional 'data' (default '0x') and 'value' (default 0)
+            urgency: Fee tier for all transactions
+            
+        Returns:
+            Transaction objects ready for signing, in request order
+            
+        Raises:
+            ValueError: If the balance does not cover all transactions together
+        """
+        if not requests:
+            return []
+        calls = []
+        slots: Dict[Any, int] = {}
+        
+        keys = [(request['to'], request.get('data', '0x'), request.get('value', 0)) for request in requests]
+        gas_limits: Dict[Tuple[str, str, int], int] = {}
+        for key in keys:
+            if key in gas_limits or key in slots:
+                continue
+            cached = self._cached_gas_estimate(key)
+            if cached is not None:
+                gas_limits[key] = cached
+            else:
+                to_address, data, value = key
+                slots[key] = len(calls)
+                calls.append(("eth_estimateGas", [{"to": to_address, "data": data, "value": hex(value)}]))
+        
+        balance = self._snapshot_balance(wallet.address)
+        if balance is None:
+            slots["balance"] = len(calls)
+            calls.append(("eth_getBalance", [wallet.address, "latest"]))
+        if not self.nonces.is_synced(wallet.address):
+            slots["nonce"] = len(calls)
+            calls.append(("eth_getTransactionCount", [wallet.address, "pending"]))
+        
+        async def fetch():
+            return await asyncio.to_thread(batch_request, self.w3, calls) if calls else []
+        
+        results, fees = await asyncio.gather(fetch(), self.get_fees(urgency))
+        for key, slot in slots.items():
+            if not isinstance(key, tuple):
+                continue
+            result = results[slot]
+            if isinstance(result, Exception):
+                logger.error(f"Gas estimation failed: {str(result)}")
+                # Default gas limit for Avalanche C-Chain
+                gas_limits[key] = 500000
+            else:
+                # Add 20% buffer for safety
+                gas_limits[key] = int(to_int(result) * 1.2)
+                self._store_gas_estimate(key, gas_limits[key])
+        if balance is None:
+            result = results[slots["balance"]]
+            if isinstance(result, Exception):
+                raise result
+            balance = to_int(result)
+        pending_count = None
+        if "nonce" in slots and not isinstance(results[slots["nonce"]], Exception):
+            pending_count = to_int(results[slots["nonce"]])
+        
+        nonces = await self.nonces.allocate_many(wallet.address, len(requests), pending_count)
+        txs = [{
             'chainId': self.chain_id,
             'nonce': nonce,
             'to': to_address,
             'value': value,
-            'gas': gas_limit,
-            'gasPrice': gas_price,
+            'gas': gas_limits[(to_address, data, value)],
             'data': data,
-        }
+            **fees,
+        } for nonce, (to_address, data, value) in zip(nonces, keys)]
         
-        # Check if user has enough balance
-        balance = self.w3.eth.get_balance(wallet.address)
-        tx_cost = gas_limit * gas_price + value
-        if balance < tx_cost:
-            raise ValueError(f"Insufficient funds. Need {self.w3.from_wei(tx_cost, 'ether')} AVAX, but have {self.w3.from_wei(balance, 'ether')} AVAX")
-            
-        return tx
+        try:
+            self._check_funds(balance, sum(self._max_cost(tx) for tx in txs))
+        except Exception:
+            for nonce in reversed(nonces):
+                await self.nonces.release(wallet.address, nonce)
+            raise
+        return txs
     
     def sign_transaction(self, private_key: str, transaction: Dict[str, Any]) -> str:
         """Sign a transaction with the provided private key"""
@@ -131,7 +313,8 @@ class TransactionManager:
         return {"success": False, "status": "pending", "error": "Transaction mining timeout"}
     
     async def execute_transaction(self, wallet: Wallet, to_address: str, 
-                                 data: str, value: int = 0, wait_for_receipt: bool = True) -> Dict[str, Any]:
+                                 data: str, value: int = 0, wait_for_receipt: bool = True,
+                                 urgency: str = "standard") -> Dict[str, Any]:
         """
         End-to-end transaction execution:
         1. Build transaction
@@ -140,21 +323,42 @@ class TransactionManager:
         4. Optionally wait for receipt
         """
         try:
-            tx = await self.build_transaction(wallet, to_address, data, value)
-            signed_tx = self.sign_transaction(wallet.private_key, tx)
-            tx_hash = await self.send_transaction(signed_tx)
+            tx_hash = await self._build_and_send(wallet, to_address, data, value, urgency)
             
             result = {"tx_hash": tx_hash, "status": "sent"}
             
             if wait_for_receipt:
                 receipt_result = await self.monitor_transaction(tx_hash)
                 result.update(receipt_result)
+                if receipt_result.get("status") == "pending":
+                    # Not mined in time: resync the wallet if the node dropped it
+                    dropped = await self.nonces.reconcile(wallet.address)
+                    if tx_hash in dropped:
+                        result["status"] = "dropped"
             
             return result
         except Exception as e:
             logger.error(f"Transaction execution failed: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def _build_and_send(self, wallet: Wallet, to_address: str, data: str, value: int = 0,
+                              urgency: str = "standard") -> str:
+        """Build, sign and send with a locally allocated nonce, resyncing once if the node rejects it"""
+        for attempt in range(2):
+            tx = await self.build_transaction(wallet, to_address, data, value, urgency)
+            try:
+                signed_tx = self.sign_transaction(wallet.private_key, tx)
+                tx_hash = await self.send_transaction(signed_tx)
+            except Exception as e:
+                if attempt == 0 and is_nonce_too_low(e):
+                    logger.warning(f"Nonce {tx['nonce']} of {wallet.address} already used, resyncing")
+                    await self.nonces.resync(wallet.address)
+                    continue
+                await self.nonces.release(wallet.address, tx['nonce'])
+                raise
+            await self.nonces.mark_sent(wallet.address, tx['nonce'], tx_hash)
+            return tx_hash
+    
     async def get_transaction_history(self, address: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get transaction history for an address"""
         # This would typically use an explorer API like SnowTrace (Avalanche's Etherscan)
@@ -2,10 +2,13 @@ import os
 import uuid
 import json
 import time
-from typing import Dict, Any, Optional, List
+import itertools
+from typing import Dict, Any, Optional, List, Iterable, Iterator
 
 from ..models.user import User
 from ..models.preferences import UserPreferences
+from ..utils.file_reader import read_lines_reverse
+from ..utils.event_fields import Condition, field_tree, matches, project
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -208,17 +211,46 @@ class UserService:
             logger.error(f"Failed to track user activity: {str(e)}")
             return False
     
+    def _activity_log_files(self, user_id: str) -> List[str]:
+        """Activity log files of a user, newest first: the active log, then rolled-over segments"""
+        log_files = []
+        log_file = f"./data/activity_logs/{user_id}.jsonl"
+        if os.path.exists(log_file):
+            log_files.append(log_file)
+        segment_dir = f"./data/activity_logs/segments/{user_id}"
+        if os.path.exists(segment_dir):
+            segments = {}
+            for filename in sorted(os.listdir(segment_dir)):
+                # A segment may briefly exist both plain and compressed while it is compressed
+                if not filename.endswith(".tmp"):
+                    segments.setdefault(filename.split(".")[0], f"{segment_dir}/{filename}")
+            log_files.extend(segments[seq] for seq in sorted(segments, reverse=True))
+        return log_files
+    
+    def iter_user_activity(self, user_id: str, activity_type: Optional[str] = None,
+                           start_time: int = None, end_time: int = None,
+                           where: Optional[Dict[str, Condition]] = None,
+                           fields: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily yield a user's activity newest first, filtered as it is read"""
+        output_tree = field_tree(fields) if fields else None
+        # Read newest first; rolled-over segments may be block-compressed
+        for log_file in self._activity_log_files(user_id):
+            for line in read_lines_reverse(log_file):
+                activity = json.loads(line)
+                if activity_type and activity.get("activity_type") != activity_type:
+                    continue
+                activity_time = activity.get("timestamp", 0)
+                if start_time and activity_time < start_time:
+                    continue
+                if end_time and activity_time > end_time:
+                    continue
+                if matches(activity, where):
+                    yield project(activity, output_tree)
+    
     def get_user_activity(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         """Get user activity history"""
-        activities = []
         try:
-            log_file = f"./data/activity_logs/{user_id}.jsonl"
-            if os.path.exists(log_file):
-                with open(log_file, "r") as f:
-                    for line in f:
-                        activities.append(json.loads(line))
-                        if len(activities) >= limit:
-                            break
+            activities = list(itertools.islice(self.iter_user_activity(user_id), limit))
                             
             # Return most recent first
             return sorted(activities, key=lambda x: x["timestamp"], reverse=True)
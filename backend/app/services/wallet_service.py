@@ -1,21 +1,92 @@
 import os
 import json
+import asyncio
 import secrets
-from typing import Dict, Any, Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Any, Optional, List, Iterable, Iterator, Tuple
 from eth_account import Account
 from eth_account.messages import encode_defunct
 from web3 import Web3
 
 from ..models.wallet import Wallet
 from ..utils.encryption import encrypt_data, decrypt_data
+from ..utils.erc20 import balance_of_call, decode_uint
+from ..utils.keystore import EncryptedKeystore, KeyCache
+from ..utils.multicall import Multicall, Call
+from ..utils.token_registry import TokenRegistry, get_token_registry
+from .signature_service import SignatureService, get_signature_service
+from .balance_snapshot import BalanceSnapshotService, get_balance_snapshots
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# (address, private key hex, encrypted record or None)
+DerivedWallet = Tuple[str, str, Optional[str]]
+
+
+def _derive_wallets(private_keys: List[Optional[str]], encryption_key: Optional[str] = None) -> List[DerivedWallet]:
+    """
+    Create or import a chunk of wallets in a worker process
+    
+    Args:
+        private_keys: Keys to import; None entries create a new wallet
+        encryption_key: If given, also encrypt each wallet's storage record
+        
+    Returns:
+        One (address, private_key, encrypted record) tuple per input, in order
+    """
+    derived = []
+    for private_key in private_keys:
+        if private_key is None:
+            account = Account.create()
+            private_key = account.key.hex()
+        else:
+            if not private_key.startswith('0x'):
+                private_key = '0x' + private_key
+            account = Account.from_key(private_key)
+        encrypted = None
+        if encryption_key:
+            wallet_data = {"address": account.address, "private_key": private_key}
+            encrypted = encrypt_data(json.dumps(wallet_data), encryption_key)
+        derived.append((account.address, private_key, encrypted))
+    return derived
+
+
 class WalletService:
-    def __init__(self, web3_provider: str, encryption_key: str = None):
-        """Initialize the wallet service"""
+    def __init__(self, web3_provider: str, encryption_key: str = None,
+                 token_registry: Optional[TokenRegistry] = None,
+                 keystore_path: str = "./secure_storage/keystore.bin",
+                 key_cache_size: int = 128, key_ttl_seconds: float = 300.0,
+                 unstored_key_limit: int = 10000, unstored_key_ttl_seconds: float = 24 * 3600.0,
+                 signature_service: Optional[SignatureService] = None,
+                 balance_snapshots: Optional[BalanceSnapshotService] = None,
+                 max_workers: int = None):
+        """
+        Initialize the wallet service
+        
+        Args:
+            web3_provider: JSON-RPC endpoint
+            encryption_key: Key for the stored wallet records (default: ENCRYPTION_KEY env var)
+            token_registry: Token metadata registry (default: the shared one)
+            keystore_path: Container file of the encrypted wallet records
+            key_cache_size: Decrypted private keys kept in memory at most
+            key_ttl_seconds: How long a decrypted private key may stay in memory
+            unstored_key_limit: Keys of created or imported but unstored wallets kept at most
+            unstored_key_ttl_seconds: How long the key of an unstored wallet stays retrievable
+            signature_service: Signer recovery pool (default: the shared one)
+            balance_snapshots: In-memory balances of the managed wallets (default: the shared ones)
+            max_workers: Worker processes for bulk wallet creation and import (default: CPU count)
+        """
         self.w3 = Web3(Web3.HTTPProvider(web3_provider))
+        self.multicall = Multicall(self.w3)
+        # decimals/symbol per token, read once and shared with BlockchainUtils
+        self.token_registry = token_registry or get_token_registry()
+        # Signature recovery runs off the event loop, batched and memoized
+        self.signature_service = signature_service or get_signature_service()
+        # Managed wallets are watched so their balances are kept fresh in memory
+        self.balance_snapshots = balance_snapshots or get_balance_snapshots(web3_provider)
         self.encryption_key = encryption_key or os.environ.get('ENCRYPTION_KEY')
         if not self.encryption_key:
             # Generate a random encryption key if none provided
@@ -23,8 +94,22 @@ class WalletService:
             self.encryption_key = secrets.token_hex(32)
             logger.warning("No encryption key provided, generated temporary key")
         
-        # In-memory storage - in production use a secure database
-        self._wallets: Dict[str, Wallet] = {}
+        # Encrypted wallet records with an offset index, one decryption per lookup
+        self.keystore = EncryptedKeystore(keystore_path)
+        # address -> storage key of its newest stored record
+        self._storage_keys: Dict[str, str] = {
+            storage_key.rsplit(":", 1)[-1]: storage_key for storage_key in self.keystore.keys()
+        }
+        self.balance_snapshots.watch(list(self._storage_keys))
+        # Recently decrypted keys of stored wallets; wiped on eviction or expiry
+        self.key_cache = KeyCache(key_cache_size, key_ttl_seconds)
+        # Keys of wallets created or imported but never stored, which have no
+        # keystore record to decrypt again; wiped once stored, evicted or expired
+        self._unstored = KeyCache(unstored_key_limit, unstored_key_ttl_seconds)
+        
+        # Process pool for bulk key generation, created on first use
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
     
     def create_wallet(self) -> Wallet:
         """Create a new wallet"""
@@ -34,7 +119,8 @@ class WalletService:
             private_key=account.key.hex(),
             public_key=account.address
         )
-        self._wallets[wallet.address] = wallet
+        self._remember_unstored(wallet.address, account.key)
+        self.balance_snapshots.watch([wallet.address])
         return wallet
     
     def import_wallet(self, private_key: str) -> Wallet:
@@ -48,12 +134,163 @@ class WalletService:
             private_key=private_key,
             public_key=account.address
         )
-        self._wallets[wallet.address] = wallet
+        self._remember_unstored(wallet.address, account.key)
+        self.balance_snapshots.watch([wallet.address])
         return wallet
     
+    def _remember_unstored(self, address: str, private_key: bytes):
+        """Keep the key of a wallet without a keystore record until it is stored or evicted"""
+        if address not in self._storage_keys:
+            self._unstored.put(address, private_key)
+    
+    def _derive_chunks(self, private_keys: Iterable[Optional[str]], user_id: Optional[str],
+                       chunk_size: int) -> Iterator[List[Tuple[Wallet, Optional[Tuple[str, str]]]]]:
+        """
+        Derive wallets chunk by chunk across the process pool, in input order
+        
+        At most two chunks per worker are in flight, so memory stays bounded
+        however long the input is. An input that fits in one short chunk is
+        derived in-process, where a pool would cost more than it saves.
+        
+        Yields:
+            Lists of (wallet, (storage key, encrypted record) or None)
+        """
+        encryption_key = self.encryption_key if user_id is not None else None
+        keys = iter(private_keys)
+        in_flight = deque()
+        
+        def collect(derived: List[DerivedWallet]):
+            chunk = []
+            for address, private_key, encrypted in derived:
+                if encrypted is None:
+                    self._remember_unstored(address, Web3.to_bytes(hexstr=private_key))
+                wallet = Wallet(address=address, private_key=private_key, public_key=address)
+                record = (f"wallet:{user_id}:{address}", encrypted) if encrypted is not None else None
+                chunk.append((wallet, record))
+            self.balance_snapshots.watch([wallet.address for wallet, _ in chunk])
+            return chunk
+        
+        first = True
+        while True:
+            chunk = list(islice(keys, chunk_size))
+            if not chunk:
+                break
+            if first and len(chunk) < chunk_size:
+                yield collect(_derive_wallets(chunk, encryption_key))
+                return
+            first = False
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            in_flight.append(self._executor.submit(_derive_wallets, chunk, encryption_key))
+            if len(in_flight) >= 2 * self.max_workers:
+                yield collect(in_flight.popleft().result())
+        while in_flight:
+            yield collect(in_flight.popleft().result())
+    
+    def _store_records(self, records: List[Tuple[str, str]]):
+        """Append encrypted wallet records to the keystore in one write"""
+        if not records:
+            return
+        self.keystore.put_many(records)
+        for storage_key, _ in records:
+            address = storage_key.rsplit(":", 1)[-1]
+            self._storage_keys[address] = storage_key
+            self._unstored.discard(address)
+        self.balance_snapshots.watch([storage_key.rsplit(":", 1)[-1] for storage_key, _ in records])
+    
+    def _bulk(self, private_keys: Iterable[Optional[str]], user_id: Optional[str],
+              chunk_size: int) -> List[Wallet]:
+        wallets, records = [], []
+        for chunk in self._derive_chunks(private_keys, user_id, chunk_size):
+            for wallet, record in chunk:
+                wallets.append(wallet)
+                if record is not None:
+                    records.append(record)
+        self._store_records(records)
+        return wallets
+    
+    def _bulk_stream(self, private_keys: Iterable[Optional[str]], user_id: Optional[str],
+                     chunk_size: int) -> Iterator[Wallet]:
+        for chunk in self._derive_chunks(private_keys, user_id, chunk_size):
+            self._store_records([record for _, record in chunk if record is not None])
+            for wallet, _ in chunk:
+                yield wallet
+    
+    def create_wallets(self, count: int, user_id: Optional[str] = None,
+                       chunk_size: int = 256) -> List[Wallet]:
+        """
+        Create many wallets, spreading key generation across worker processes
+        
+        Args:
+            count: Number of wallets to create
+            user_id: If given, store every wallet for this user in one keystore write
+            chunk_size: Wallets per worker task
+            
+        Returns:
+            The new wallets, in creation order
+        """
+        return self._bulk((None for _ in range(count)), user_id, chunk_size)
+    
+    def import_wallets(self, private_keys: Iterable[str], user_id: Optional[str] = None,
+                       chunk_size: int = 256) -> List[Wallet]:
+        """
+        Import many wallets, deriving their addresses across worker processes
+        
+        Args:
+            private_keys: Private keys, with or without 0x prefix
+            user_id: If given, store every wallet for this user in one keystore write
+            chunk_size: Wallets per worker task
+            
+        Returns:
+            The imported wallets, in input order
+        """
+        return self._bulk(private_keys, user_id, chunk_size)
+    
+    def iter_create_wallets(self, count: int, user_id: Optional[str] = None,
+                            chunk_size: int = 256) -> Iterator[Wallet]:
+        """Streaming create_wallets: wallets are yielded, and stored one chunk per write, as chunks finish"""
+        return self._bulk_stream((None for _ in range(count)), user_id, chunk_size)
+    
+    def iter_import_wallets(self, private_keys: Iterable[str], user_id: Optional[str] = None,
+                            chunk_size: int = 256) -> Iterator[Wallet]:
+        """Streaming import_wallets: wallets are yielded, and stored one chunk per write, as chunks finish"""
+        return self._bulk_stream(private_keys, user_id, chunk_size)
+    
+    def store_encrypted_wallets(self, wallets: List[Wallet], user_id: str) -> List[str]:
+        """Securely store many wallets with one keystore write"""
+        records = [
+            (f"wallet:{user_id}:{wallet.address}",
+             encrypt_data(json.dumps({"address": wallet.address, "private_key": wallet.private_key}),
+                          self.encryption_key))
+            for wallet in wallets
+        ]
+        self._store_records(records)
+        return [storage_key for storage_key, _ in records]
+    
+    def close(self):
+        """Shut down the bulk worker pool and wipe every private key held in memory"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.key_cache.clear()
+        self._unstored.clear()
+    
+    def _private_key(self, address: str) -> Optional[bytes]:
+        """Private key of a wallet from the key cache or unstored wallets, decrypting its stored record on a miss"""
+        key = self.key_cache.get(address)
+        if key is None:
+            key = self._unstored.get(address)
+        if key is None and address in self._storage_keys:
+            wallet = self.load_encrypted_wallet(self._storage_keys[address])
+            key = self.key_cache.get(address) if wallet else None
+        return key
+    
     def get_wallet(self, address: str) -> Optional[Wallet]:
         """Get a wallet by address"""
-        return self._wallets.get(address)
+        key = self._private_key(address)
+        if key is None:
+            return None
+        return Wallet(address=address, private_key="0x" + key.hex(), public_key=address)
     
     def verify_wallet_signature(self, address: str, message: str, signature: str) -> bool:
         """Verify a message was signed by the wallet owner"""
@@ -65,6 +302,14 @@ class WalletService:
             logger.error(f"Signature verification failed: {str(e)}")
             return False
     
+    async def averify_wallet_signature(self, address: str, message: str, signature: str) -> bool:
+        """verify_wallet_signature off the event loop, batched with concurrent requests"""
+        try:
+            return await self.signature_service.verify(address, message, signature)
+        except Exception as e:
+            logger.error(f"Signature verification failed: {str(e)}")
+            return False
+    
     def store_encrypted_wallet(self, wallet: Wallet, user_id: str) -> str:
         """Securely store wallet with encryption"""
         wallet_data = {
@@ -73,21 +318,27 @@ class WalletService:
         }
         
         encrypted = encrypt_data(json.dumps(wallet_data), self.encryption_key)
-        # In production, store in a secure database
         storage_key = f"wallet:{user_id}:{wallet.address}"
         
-        # Mock storage - in production use a secure database
-        with open(f"./secure_storage/{storage_key}.enc", "w") as f:
-            f.write(encrypted)
-            
+        self.keystore.put(storage_key, encrypted)
+        self._storage_keys[wallet.address] = storage_key
+        self._unstored.discard(wallet.address)
+        self.balance_snapshots.watch([wallet.address])
         return storage_key
     
     def load_encrypted_wallet(self, storage_key: str) -> Optional[Wallet]:
         """Load an encrypted wallet"""
         try:
-            # Mock storage - in production use a secure database
-            with open(f"./secure_storage/{storage_key}.enc", "r") as f:
-                encrypted_data = f.read()
+            encrypted_data = self.keystore.get(storage_key)
+            if encrypted_data is None:
+                # Wallets stored before the keystore existed move into it on first load
+                legacy_file = f"{os.path.dirname(self.keystore.path)}/{storage_key}.enc"
+                if not os.path.exists(legacy_file):
+                    return None
+                with open(legacy_file, "r") as f:
+                    encrypted_data = f.read()
+                self.keystore.put(storage_key, encrypted_data)
+                os.remove(legacy_file)
                 
             decrypted_data = decrypt_data(encrypted_data, self.encryption_key)
             wallet_data = json.loads(decrypted_data)
@@ -97,7 +348,8 @@ class WalletService:
                 private_key=wallet_data["private_key"],
                 public_key=wallet_data["address"]
             )
-            self._wallets[wallet.address] = wallet
+            self._storage_keys[wallet.address] = storage_key
+            self.key_cache.put(wallet.address, Web3.to_bytes(hexstr=wallet.private_key))
             return wallet
         except Exception as e:
             logger.error(f"Failed to load encrypted wallet: {str(e)}")
@@ -106,7 +358,9 @@ class WalletService:
     def get_wallet_balance(self, address: str) -> Dict[str, Any]:
         """Get wallet balance information"""
         try:
-            avax_balance = self.w3.eth.get_balance(address)
+            avax_balance = self.balance_snapshots.native_balance(address)
+            if avax_balance is None:
+                avax_balance = self.w3.eth.get_balance(address)
             return {
                 "avax": self.w3.from_wei(avax_balance, 'ether'),
                 "avax_wei": avax_balance
@@ -117,50 +371,98 @@ class WalletService:
     
     async def get_token_balances(self, address: str, token_addresses: list) -> Dict[str, float]:
         """Get ERC20 token balances"""
-        balances = {}
-        
-        # Basic ERC20 ABI for balanceOf function
-        erc20_abi = [
-            {
-                "constant": True,
-                "inputs": [{"name": "_owner", "type": "address"}],
-                "name": "balanceOf",
-                "outputs": [{"name": "balance", "type": "uint256"}],
-                "type": "function"
-            },
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "decimals",
-                "outputs": [{"name": "", "type": "uint8"}],
-                "type": "function"
-            },
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "symbol",
-                "outputs": [{"name": "", "type": "string"}],
-                "type": "function"
-            }
-        ]
+        portfolios = await self.get_portfolio_balances([address], token_addresses)
+        return portfolios.get(address, {})
+    
+    async def get_portfolio_balances(self, addresses: List[str],
+                                     token_addresses: list) -> Dict[str, Dict[str, float]]:
+        """
+        Get the ERC20 token balances of several wallets at once
+        
+        Token decimals and symbols come from the token registry, so a
+        refresh only reads balanceOf: every read is batched into Multicall3
+        aggregates and costs one round trip (more only past the multicall
+        batch size, and those chunks are sent concurrently). RPC calls run on
+        worker threads, keeping the event loop free. A token whose metadata or
+        balance cannot be read is logged and left out; the others are returned.
         
+        Args:
+            addresses: Wallet addresses
+            token_addresses: ERC20 contract addresses
+            
+        Returns:
+            Dictionary of wallet address -> token symbol -> balance
+        """
+        tokens = {}
+        if self.token_registry.missing(token_addresses):
+            try:
+                tokens = await asyncio.to_thread(self.token_registry.resolve, self.multicall, token_addresses)
+            except Exception as e:
+                logger.error(f"Failed to resolve token metadata: {str(e)}")
         for token_address in token_addresses:
+            metadata = tokens.get(token_address) or self.token_registry.get(token_address)
+            if metadata is None:
+                logger.error(f"Failed to get token balance for {token_address}: unknown token metadata")
+                tokens.pop(token_address, None)
+            else:
+                tokens[token_address] = metadata
+        
+        calls: List[Call] = [
+            (token_address, balance_of_call(address))
+            for address in addresses
+            for token_address in tokens
+        ]
+        results = []
+        if calls:
             try:
-                token_contract = self.w3.eth.contract(address=token_address, abi=erc20_abi)
-                raw_balance = token_contract.functions.balanceOf(address).call()
-                decimals = token_contract.functions.decimals().call()
-                symbol = token_contract.functions.symbol().call()
-                
-                balance = raw_balance / (10 ** decimals)
-                balances[symbol] = balance
+                results = await self.multicall.aggregate_async(calls)
             except Exception as e:
-                logger.error(f"Failed to get token balance for {token_address}: {str(e)}")
-                continue
-                
-        return balances
+                logger.error(f"Failed to read token balances: {str(e)}")
+                results = [(False, b"")] * len(calls)
+        results = iter(results)
+        
+        portfolios = {}
+        for address in addresses:
+            balances = {}
+            for token_address, metadata in tokens.items():
+                success, data = next(results)
+                try:
+                    if not success:
+                        raise ValueError("balanceOf() reverted")
+                    balances[metadata["symbol"]] = decode_uint(data) / (10 ** metadata["decimals"])
+                except Exception as e:
+                    logger.error(f"Failed to get token balance for {token_address}: {str(e)}")
+            portfolios[address] = balances
+        return portfolios
     
     def sign_message(self, wallet: Wallet, message: str) -> str:
         """Sign a message with the wallet's private key"""
         message_hash = encode_defunct(text=message)
         signed_message = Account.sign_message(message_hash, wallet.private_key)
-        return signed_message.signature.hex()
\ No newline at end of file
+        return signed_message.signature.hex()
+    
+    def sign_messages(self, addresses: List[str], message: str) -> Dict[str, Optional[str]]:
+        """
+        Sign a message with many wallets, by address
+        
+        Keys come from the key cache, the unstored wallets or one indexed
+        keystore read each and are never turned into Wallet objects, so
+        signing a large set of stored wallets keeps at most the cache's
+        worth of decrypted keys resident.
+        
+        Args:
+            addresses: Wallet addresses
+            message: Text message to sign
+            
+        Returns:
+            Dictionary of address -> signature hex (None for unknown wallets)
+        """
+        message_hash = encode_defunct(text=message)
+        signatures = {}
+        for address in addresses:
+            key = self._private_key(address)
+            if key is None:
+                signatures[address] = None
+                continue
+            signatures[address] = Account.sign_message(message_hash, key).signature.hex()
+        return signatures
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+Seekable block-compressed files
+
+A file is compressed as a sequence of independently zlib-compressed blocks
+followed by an index of (uncompressed offset, compressed offset, compressed
+length) entries. BlockCompressedFile decompresses only the blocks touched by
+a read, so byte offsets into the original file keep working for seeks.
+"""
+
+import os
+import zlib
+import struct
+import bisect
+from collections import OrderedDict
+from typing import Iterator, List
+
+COMPRESSED_SUFFIX = ".z"
+
+# Uncompressed bytes per block
+BLOCK_SIZE = 256 * 1024
+
+_MAGIC = b"QBLKZ001"
+_INDEX_ENTRY = struct.Struct("<QQI")
+# index offset, block count, uncompressed size, magic
+_FOOTER = struct.Struct("<QIQ8s")
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(COMPRESSED_SUFFIX)
+
+
+def compress_file(src_path: str, dst_path: str, block_size: int = BLOCK_SIZE, level: int = 6) -> int:
+    """
+    Compress a file into seekable blocks, atomically replacing dst_path
+
+    The modification time of the source is kept, so age-based retention
+    treats the compressed file like the original.
+
+    Returns:
+        Size of the compressed file in bytes
+    """
+    tmp_path = f"{dst_path}.tmp"
+    index = []
+    with open(src_path, "rb") as src, open(tmp_path, "wb") as dst:
+        dst.write(_MAGIC)
+        uncompressed_offset = 0
+        while True:
+            chunk = src.read(block_size)
+            if not chunk:
+                break
+            compressed = zlib.compress(chunk, level)
+            index.append((uncompressed_offset, dst.tell(), len(compressed)))
+            dst.write(compressed)
+            uncompressed_offset += len(chunk)
+
+        index_offset = dst.tell()
+        for entry in index:
+            dst.write(_INDEX_ENTRY.pack(*entry))
+        dst.write(_FOOTER.pack(index_offset, len(index), uncompressed_offset, _MAGIC))
+
+    stat = os.stat(src_path)
+    os.utime(tmp_path, (stat.st_atime, stat.st_mtime))
+    os.replace(tmp_path, dst_path)
+    return os.path.getsize(dst_path)
+
+
+class BlockCompressedFile:
+    """Read-only, seekable binary file object over a block-compressed file"""
+
+    def __init__(self, path: str, cache_blocks: int = 4):
+        self.path = path
+        self._f = open(path, "rb")
+        self._f.seek(-_FOOTER.size, os.SEEK_END)
+        index_offset, count, self.size, magic = _FOOTER.unpack(self._f.read(_FOOTER.size))
+        if magic != _MAGIC:
+            self._f.close()
+            raise ValueError(f"{path} is not a block-compressed file")
+
+        self._f.seek(index_offset)
+        entries = list(_INDEX_ENTRY.iter_unpack(self._f.read(count * _INDEX_ENTRY.size)))
+        self._starts: List[int] = [entry[0] for entry in entries]
+        self._locations = [(entry[1], entry[2]) for entry in entries]
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._position = 0
+
+    def _block(self, block: int) -> bytes:
+        data = self._cache.get(block)
+        if data is None:
+            offset, length = self._locations[block]
+            self._f.seek(offset)
+            data = zlib.decompress(self._f.read(length))
+            self._cache[block] = data
+            if len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(block)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.size - self._position
+        chunks = []
+        while size > 0 and self._position < self.size:
+            block = bisect.bisect_right(self._starts, self._position) - 1
+            data = self._block(block)
+            start = self._position - self._starts[block]
+            chunk = data[start:start + size]
+            chunks.append(chunk)
+            self._position += len(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def readline(self) -> bytes:
+        chunks = []
+        while self._position < self.size:
+            block = bisect.bisect_right(self._starts, self._position) - 1
+            data = self._block(block)
+            start = self._position - self._starts[block]
+            newline = data.find(b"\n", start)
+            end = newline + 1 if newline >= 0 else len(data)
+            chunks.append(data[start:end])
+            self._position += end - start
+            if newline >= 0:
+                break
+        return b"".join(chunks)
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def close(self):
+        self._f.close()
+        self._cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_segment(path: str):
+    """Open a stored file for binary reading, decompressing transparently"""
+    if is_compressed(path):
+        return BlockCompressedFile(path)
+    return open(path, "rb")
+
+
+def stored_size(path: str) -> int:
+    """Uncompressed size of a stored file, i.e. the range of its byte offsets"""
+    if is_compressed(path):
+        with BlockCompressedFile(path) as f:
+            return f.size
+    return os.path.getsize(path)
+
+
+def original_path(path: str) -> str:
+    """Path of a stored file without its compression suffix"""
+    return path[:-len(COMPRESSED_SUFFIX)] if is_compressed(path) else path
@@ -4,22 +4,32 @@ from web3 import Web3
 from web3.types import TxParams, TxReceipt
 from eth_account.messages import encode_defunct
 from app.core.config import settings
+from app.utils.erc20 import balance_of_call, decode_uint
+from app.utils.multicall import Multicall
+from app.utils.token_registry import TokenRegistry, get_token_registry
+from app.services.gas_oracle import GasOracle, get_gas_oracle
+from app.services.signature_service import get_signature_service
 import time
-import json
-import os
 from web3.middleware import geth_poa_middleware
 
 class BlockchainUtils:
-    def __init__(self):
+    def __init__(self, token_registry: Optional[TokenRegistry] = None,
+                 gas_oracle: Optional[GasOracle] = None):
         """Initialize connection to blockchain."""
         self.w3 = Web3(Web3.HTTPProvider(settings.WEB3_PROVIDER_URI))
         
         # Add middleware for Avalanche C-Chain compatibility
         self.w3.middleware_onion.inject(geth_poa_middleware, layer=0)
         
+        # Token decimals/symbols are read once and shared with WalletService
+        self.multicall = Multicall(self.w3)
+        self.token_registry = token_registry or get_token_registry()
+        
+        # Fee suggestions are shared with TransactionManager and refreshed per block
+        self.gas_oracle = gas_oracle or get_gas_oracle(settings.WEB3_PROVIDER_URI)
+        
         self.chain_id = settings.CHAIN_ID
         self.max_retries = 3
-        self.gas_price_multiplier = 1.1  # 10% buffer on gas price
         
         # Gas limits per contract function (can be adjusted based on empirical data)
         self.gas_limits = {
@@ -34,11 +44,10 @@ class BlockchainUtils:
         """Check if connected to blockchain."""
         return self.w3.is_connected()
     
-    def get_gas_price(self) -> int:
-        """Get current gas price with multiplier applied."""
+    def get_gas_price(self, urgency: str = "standard") -> int:
+        """Get current legacy gas price for an urgency tier from the gas oracle."""
         try:
-            base_gas_price = self.w3.eth.gas_price
-            return int(base_gas_price * self.gas_price_multiplier)
+            return self.gas_oracle.gas_price(urgency)
         except Exception:
             # Fallback gas price in case of API failure (40 Gwei)
             return 40 * 10**9
@@ -94,6 +103,16 @@ class BlockchainUtils:
         recovered_address = self.w3.eth.account.recover_message(message_encoded, signature=signature)
         return recovered_address.lower() == address.lower()
     
+    async def averify_signature(
+        self,
+        message: str,
+        signature: str,
+        address: str
+    ) -> bool:
+        """Verify a signature matches the expected signer address, off the event loop."""
+        # Recovery runs in the shared verification pool, batched with concurrent requests
+        return await get_signature_service().verify(address, message, signature)
+    
     async def send_transaction(
         self,
         signed_tx: str,
@@ -175,18 +194,17 @@ class BlockchainUtils:
     ) -> Dict[str, Any]:
         """Get ERC20 token balance for a wallet."""
         try:
-            # Load standard ERC20 ABI
-            abi_path = os.path.join("app/contracts/abi", "ERC20.json")
-            with open(abi_path, "r") as f:
-                erc20_abi = json.load(f)
-            
-            # Create contract instance
-            token_contract = self.w3.eth.contract(address=token_address, abi=erc20_abi)
+            # Metadata is cached in the registry; only balanceOf hits the chain
+            metadata = self.token_registry.resolve(self.multicall, [token_address]).get(token_address)
+            if metadata is None:
+                raise ValueError(f"Could not read decimals/symbol of token {token_address}")
+            decimals = metadata["decimals"]
+            symbol = metadata["symbol"]
             
-            # Get balance and decimals
-            balance = token_contract.functions.balanceOf(wallet_address).call()
-            decimals = token_contract.functions.decimals().call()
-            symbol = token_contract.functions.symbol().call()
+            balance = decode_uint(self.w3.eth.call({
+                "to": Web3.to_checksum_address(token_address),
+                "data": balance_of_call(wallet_address)
+            }))
             
             # Calculate human-readable balance
             human_balance = balance / (10 ** decimals)
@@ -238,12 +256,22 @@ class BlockchainUtils:
         data: str = "",
         gas_limit: Optional[int] = None,
         gas_price: Optional[int] = None,
-        nonce: Optional[int] = None
+        nonce: Optional[int] = None,
+        urgency: str = "standard"
     ) -> TxParams:
-        """Create transaction parameters."""
+        """Create transaction parameters; EIP-1559 fees unless a legacy gas_price is given."""
         # Use provided values or get from blockchain
-        if gas_price is None:
-            gas_price = self.get_gas_price()
+        if gas_price is not None:
+            fees = {'gasPrice': gas_price}
+        else:
+            try:
+                suggestion = self.gas_oracle.suggest(urgency)
+                fees = {
+                    'maxFeePerGas': suggestion["maxFeePerGas"],
+                    'maxPriorityFeePerGas': suggestion["maxPriorityFeePerGas"]
+                }
+            except Exception:
+                fees = {'gasPrice': self.get_gas_price(urgency)}
         
         if nonce is None:
             nonce = self.get_transaction_count(from_address)
@@ -253,9 +281,9 @@ class BlockchainUtils:
             'to': to_address,
             'value': value,
             'gas': gas_limit if gas_limit is not None else self.gas_limits["default"],
-            'gasPrice': gas_price,
             'nonce': nonce,
-            'chainId': self.chain_id
+            'chainId': self.chain_id,
+            **fees
         }
         
         if data:
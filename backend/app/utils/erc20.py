@@ -0,0 +1,57 @@
+"""
+Raw ERC20 call encoding and result decoding
+
+Read calls are built from their 4-byte selectors so they can be batched into
+Multicall3 aggregates or JSON-RPC batches without going through a contract
+object per token.
+"""
+
+from eth_abi import decode
+from web3 import Web3
+
+ERC20_ABI = [
+    {
+        "constant": True,
+        "inputs": [{"name": "_owner", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"name": "balance", "type": "uint256"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "decimals",
+        "outputs": [{"name": "", "type": "uint8"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "symbol",
+        "outputs": [{"name": "", "type": "string"}],
+        "type": "function"
+    }
+]
+
+BALANCE_OF_SELECTOR = bytes.fromhex("70a08231")
+DECIMALS_CALL = bytes.fromhex("313ce567")
+SYMBOL_CALL = bytes.fromhex("95d89b41")
+
+
+def balance_of_call(owner: str) -> bytes:
+    """Call data of balanceOf(owner)"""
+    return BALANCE_OF_SELECTOR + bytes(12) + bytes.fromhex(Web3.to_checksum_address(owner)[2:])
+
+
+def decode_uint(data: bytes) -> int:
+    """Decode a uint256 / uint8 return value"""
+    if len(data) < 32:
+        raise ValueError("Empty or short return data")
+    return int.from_bytes(data[:32], "big")
+
+
+def decode_symbol(data: bytes) -> str:
+    """Decode a symbol() return value, accepting the legacy bytes32 form"""
+    if len(data) == 32:
+        return data.rstrip(b"\0").decode("utf-8", errors="replace")
+    return decode(["string"], data)[0]
@@ -0,0 +1,63 @@
+"""
+Field selection helpers for event queries
+
+Fields are addressed by dotted paths such as ``"data.user_id"``. A set of
+paths is compiled into a field tree (nested dicts; None marks a path whose
+whole value is wanted) that decoders use to materialize only those fields.
+"""
+
+from typing import Dict, Any, Iterable, Optional, Callable, Union
+
+FieldTree = Dict[str, Optional[dict]]
+Condition = Union[Any, Callable[[Any], bool]]
+
+
+def field_tree(paths: Iterable[str]) -> FieldTree:
+    """Compile dotted paths into a field tree"""
+    tree: FieldTree = {}
+    for path in paths:
+        node = tree
+        parts = path.split(".")
+        for part in parts[:-1]:
+            child = node.get(part, {})
+            if child is None:
+                break  # an ancestor is already wanted whole
+            node = node.setdefault(part, child)
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def project(value: Any, tree: Optional[FieldTree]) -> Any:
+    """Keep only the fields of a decoded event named by the tree"""
+    if tree is None or not isinstance(value, dict):
+        return value
+    return {key: project(value[key], subtree) for key, subtree in tree.items() if key in value}
+
+
+def get_path(event: Dict[str, Any], path: str) -> Any:
+    value = event
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def matches(event: Dict[str, Any], where: Optional[Dict[str, Condition]]) -> bool:
+    """
+    Test an event against field conditions
+
+    Each condition is either a value the field must equal or a callable
+    that receives the field value (None if missing) and returns a bool.
+    """
+    if not where:
+        return True
+    for path, condition in where.items():
+        value = get_path(event, path)
+        if callable(condition):
+            if not condition(value):
+                return False
+        elif value != condition:
+            return False
+    return True
@@ -0,0 +1,45 @@
+import os
+from typing import Iterator
+
+from .block_file import open_segment
+
+# Read size used when walking files backwards from EOF
+REVERSE_BLOCK_SIZE = 64 * 1024
+
+
+def read_lines_reverse(path: str, block_size: int = REVERSE_BLOCK_SIZE) -> Iterator[str]:
+    """
+    Yield the lines of a text file newest-first (last line first)
+
+    The file is read backwards from EOF in blocks of ``block_size`` bytes, so a
+    caller that stops after N lines only pays for the tail of the file.
+    Block-compressed files are decompressed transparently.
+
+    Args:
+        path: Path of the file to read
+        block_size: Number of bytes read per backwards step
+
+    Yields:
+        Decoded lines without their trailing newline; blank lines are skipped
+    """
+    with open_segment(path) as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b""
+
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size) + remainder
+
+            lines = block.split(b"\n")
+            # The first piece may be the tail of a line that starts in an
+            # earlier block, so hold it back until that block has been read
+            remainder = lines.pop(0)
+
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode("utf-8")
+
+        if remainder.strip():
+            yield remainder.decode("utf-8")
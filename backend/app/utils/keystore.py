@@ -0,0 +1,208 @@
+"""
+Indexed, append-only store of encrypted wallet records
+
+Records are appended to a single container file, each encrypted on its own
+with the service's encryption key, so one wallet can be read and decrypted
+without touching the others. An offset index (storage key -> offset, length)
+is appended alongside and loaded at startup; records written after the last
+index entry (e.g. after a crash between the two writes) are recovered by
+scanning the container tail. A later record for the same storage key
+supersedes the earlier one.
+
+Container record layout: <u16 key length> <u32 payload length> key payload
+"""
+
+import os
+import json
+import time
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+_HEADER = struct.Struct("<HI")
+
+
+class EncryptedKeystore:
+    def __init__(self, path: str = "./secure_storage/keystore.bin"):
+        """
+        Open (or create) a keystore container and load its offset index
+
+        Args:
+            path: Container file; the index is kept next to it with an ``.idx`` suffix
+        """
+        self.path = path
+        self.index_path = f"{path}.idx"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # storage key -> (payload offset, payload length)
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._load_index()
+        self._reader = open(self.path, "rb")
+
+    def _load_index(self):
+        indexed_end = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb+") as f:
+                valid = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated line")
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn final line: cut it off so later appends start on a fresh line;
+                        # its record is recovered from the container below
+                        f.truncate(valid)
+                        break
+                    self._index[entry["key"]] = (entry["offset"], entry["length"])
+                    indexed_end = max(indexed_end, entry["offset"] + entry["length"])
+                    valid += len(line)
+
+        if not os.path.exists(self.path):
+            open(self.path, "ab").close()
+        container_size = os.path.getsize(self.path)
+        if indexed_end < container_size:
+            recovered = list(self._scan(indexed_end, container_size))
+            for key, offset, length in recovered:
+                self._index[key] = (offset, length)
+            if recovered:
+                self._append_index(recovered)
+                logger.info(f"Recovered {len(recovered)} keystore records missing from the index")
+
+    def _scan(self, start: int, end: int) -> Iterator[Tuple[str, int, int]]:
+        """Yield (key, payload offset, payload length) of complete records in [start, end)"""
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            position = start
+            while position + _HEADER.size <= end:
+                key_length, payload_length = _HEADER.unpack(f.read(_HEADER.size))
+                record_end = position + _HEADER.size + key_length + payload_length
+                if record_end > end:
+                    break  # torn final record
+                key = f.read(key_length).decode()
+                f.seek(payload_length, os.SEEK_CUR)
+                yield key, position + _HEADER.size + key_length, payload_length
+                position = record_end
+
+    def _append_index(self, entries: List[Tuple[str, int, int]]):
+        with open(self.index_path, "a") as f:
+            for key, offset, length in entries:
+                f.write(json.dumps({"key": key, "offset": offset, "length": length}) + "\n")
+
+    def put(self, key: str, payload: str):
+        """Append an encrypted payload for a storage key"""
+        self.put_many([(key, payload)])
+
+    def put_many(self, records: List[Tuple[str, str]]):
+        """Append several encrypted payloads with one write and one index update"""
+        with self._lock:
+            buffer = bytearray()
+            entries = []
+            with open(self.path, "ab") as f:
+                position = f.tell()
+                for key, payload in records:
+                    key_bytes, payload_bytes = key.encode(), payload.encode()
+                    buffer += _HEADER.pack(len(key_bytes), len(payload_bytes)) + key_bytes + payload_bytes
+                    entries.append((key, position + len(buffer) - len(payload_bytes), len(payload_bytes)))
+                f.write(buffer)
+                f.flush()
+                os.fsync(f.fileno())
+            self._append_index(entries)
+            for key, offset, length in entries:
+                self._index[key] = (offset, length)
+
+    def get(self, key: str) -> Optional[str]:
+        """Encrypted payload of a storage key, read with one seek"""
+        location = self._index.get(key)
+        if location is None:
+            return None
+        offset, length = location
+        with self._lock:
+            self._reader.seek(offset)
+            return self._reader.read(length).decode()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def keys(self) -> List[str]:
+        return list(self._index)
+
+    def close(self):
+        self._reader.close()
+
+
+class KeyCache:
+    """
+    Small LRU of decrypted private keys with a time-to-live
+
+    Keys are held as bytearrays and overwritten with zeros when they are
+    evicted, expire or the cache is cleared, so plaintext key material only
+    stays resident for recently used wallets. Copies handed to callers as
+    bytes or str cannot be wiped and should be short-lived.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[bytearray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _wipe(secret: bytearray):
+        # Same-size slice assignment overwrites the buffer in place
+        secret[:] = bytes(len(secret))
+
+    def _evict(self, address: str):
+        secret, _ = self._entries.pop(address)
+        self._wipe(secret)
+
+    def put(self, address: str, private_key: bytes, now: float = None):
+        """Cache a decrypted key; the caller's copy is not retained"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if address in self._entries:
+                self._evict(address)
+            self._entries[address] = (bytearray(private_key), now + self.ttl_seconds)
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def get(self, address: str, now: float = None) -> Optional[bytes]:
+        """Copy of a cached key, or None if absent or expired"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(address)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                self._evict(address)
+                return None
+            self._entries.move_to_end(address)
+            return bytes(entry[0])
+
+    def discard(self, address: str):
+        """Wipe and remove a key, if it is cached"""
+        with self._lock:
+            if address in self._entries:
+                self._evict(address)
+
+    def purge_expired(self, now: float = None) -> int:
+        """Wipe every expired key; returns how many were removed"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [address for address, (_, expires_at) in self._entries.items() if expires_at <= now]
+            for address in expired:
+                self._evict(address)
+            return len(expired)
+
+    def clear(self):
+        with self._lock:
+            for address in list(self._entries):
+                self._evict(address)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,130 @@
+"""
+Batching of read-only contract calls through Multicall3
+
+Multicall3 is deployed at the same address on Avalanche C-Chain and the
+other major EVM chains. Its aggregate3 function runs a list of calls inside
+a single eth_call, so N reads cost one round trip, and allowFailure lets a
+reverting call fail on its own without failing the whole batch. On chains
+without a deployment, or when an aggregate itself fails, the calls are made
+one by one instead.
+"""
+
+import asyncio
+from typing import List, Optional, Sequence, Tuple
+
+from web3 import Web3
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"name": "target", "type": "address"},
+                    {"name": "allowFailure", "type": "bool"},
+                    {"name": "callData", "type": "bytes"}
+                ],
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"name": "success", "type": "bool"},
+                    {"name": "returnData", "type": "bytes"}
+                ],
+                "name": "returnData",
+                "type": "tuple[]"
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    }
+]
+
+# Multicall3.getEthBalance(address): native balances inside the same aggregate
+GET_ETH_BALANCE_SELECTOR = bytes.fromhex("4d2301cc")
+
+# (target contract, call data)
+Call = Tuple[str, bytes]
+# (success, return data)
+CallResult = Tuple[bool, bytes]
+
+
+class Multicall:
+    def __init__(self, w3: Web3, address: str = MULTICALL3_ADDRESS, batch_size: int = 500):
+        """
+        Initialize the Multicall3 client
+
+        Args:
+            w3: Connected Web3 instance
+            address: Multicall3 deployment address
+            batch_size: Maximum calls per eth_call, bounding the node's gas and response size
+        """
+        self.w3 = w3
+        self.contract = w3.eth.contract(address=Web3.to_checksum_address(address), abi=MULTICALL3_ABI)
+        self.batch_size = batch_size
+        self._deployed: Optional[bool] = None
+
+    def is_deployed(self) -> bool:
+        """Whether Multicall3 exists on the connected chain (checked once)"""
+        if self._deployed is None:
+            self._deployed = len(self.w3.eth.get_code(self.contract.address)) > 0
+        return self._deployed
+
+    def eth_balance_call(self, owner: str) -> Call:
+        """Call reading the native balance of owner through Multicall3 itself"""
+        return self.contract.address, GET_ETH_BALANCE_SELECTOR + bytes(12) + bytes.fromhex(
+            Web3.to_checksum_address(owner)[2:])
+
+    def _call(self, call: Call, block_identifier) -> CallResult:
+        """Single eth_call, reporting a revert as a failed result like aggregate3 does"""
+        target, data = call
+        try:
+            return True, bytes(self.w3.eth.call({"to": Web3.to_checksum_address(target), "data": data},
+                                                 block_identifier))
+        except Exception:
+            return False, b""
+
+    def _aggregate_chunk(self, calls: Sequence[Call], block_identifier) -> List[CallResult]:
+        results = self.contract.functions.aggregate3([
+            (Web3.to_checksum_address(target), True, data) for target, data in calls
+        ]).call(block_identifier=block_identifier)
+        return [(bool(success), bytes(data)) for success, data in results]
+
+    def _aggregate_or_split(self, calls: Sequence[Call], block_identifier) -> List[CallResult]:
+        """aggregate3 over a chunk, falling back to one eth_call per call if the aggregate fails"""
+        try:
+            return self._aggregate_chunk(calls, block_identifier)
+        except Exception as e:
+            logger.warning(f"Multicall of {len(calls)} calls failed, calling one by one: {str(e)}")
+            return [self._call(call, block_identifier) for call in calls]
+
+    def aggregate(self, calls: Sequence[Call], block_identifier="latest") -> List[CallResult]:
+        """Execute calls in as few eth_calls as batch_size allows, results in call order"""
+        if not self.is_deployed():
+            return [self._call(call, block_identifier) for call in calls]
+        results = []
+        for start in range(0, len(calls), self.batch_size):
+            results.extend(self._aggregate_or_split(calls[start:start + self.batch_size], block_identifier))
+        return results
+
+    async def aggregate_async(self, calls: Sequence[Call], block_identifier="latest") -> List[CallResult]:
+        """aggregate() on worker threads, keeping the event loop free; chunks are sent concurrently"""
+        deployed = self._deployed if self._deployed is not None else await asyncio.to_thread(self.is_deployed)
+        if not deployed:
+            return list(await asyncio.gather(*(
+                asyncio.to_thread(self._call, call, block_identifier) for call in calls
+            )))
+        chunks = [calls[start:start + self.batch_size] for start in range(0, len(calls), self.batch_size)]
+        chunk_results = await asyncio.gather(*(
+            asyncio.to_thread(self._aggregate_or_split, chunk, block_identifier) for chunk in chunks
+        ))
+        return [result for chunk in chunk_results for result in chunk]
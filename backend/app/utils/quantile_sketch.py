@@ -0,0 +1,108 @@
+import math
+from typing import Dict, Any, Iterable, Optional
+
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch with bounded relative error
+
+    Values are counted in logarithmically sized bins (DDSketch style), so any
+    quantile is estimated within ``relative_accuracy`` of the true value and two
+    sketches merge by adding bin counts. Memory is capped at ``max_bins`` bins;
+    beyond that the lowest bins are collapsed, which only affects low quantiles.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 1024):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, float] = {}
+        self.zero_count = 0.0
+        self.count = 0.0
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float, weight: float = 1.0):
+        """Add a single value"""
+        if value <= 0:
+            self.zero_count += weight
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0.0) + weight
+            self._collapse()
+        self.count += weight
+
+    def add_many(self, values: Iterable[float], weights: Optional[Iterable[float]] = None):
+        """Add an array of values (optionally weighted) in one vectorized step"""
+        values = np.asarray(values, dtype=np.float64)
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+        present = ~np.isnan(values)
+        values, weights = values[present], weights[present]
+        positive = values > 0
+        indexes, inverse = np.unique(np.ceil(np.log(values[positive]) / self._log_gamma), return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=weights[positive], minlength=len(indexes))
+        for index, count in zip(indexes.astype(np.int64).tolist(), counts.tolist()):
+            self.bins[index] = self.bins.get(index, 0.0) + count
+        self.zero_count += float(weights[~positive].sum())
+        self.count += float(weights.sum())
+        self._collapse()
+
+    def merge(self, other: "QuantileSketch"):
+        """Fold another sketch with the same accuracy into this one"""
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0.0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self._collapse()
+
+    def _collapse(self):
+        if len(self.bins) <= self.max_bins:
+            return
+        indexes = sorted(self.bins)
+        excess = indexes[:len(indexes) - self.max_bins + 1]
+        collapsed = sum(self.bins.pop(index) for index in excess)
+        self.bins[excess[-1]] = collapsed
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile (0 <= q <= 1); 0 for an empty sketch"""
+        if self.count <= 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_bins": self.max_bins,
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "bins": {str(index): count for index, count in self.bins.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"], data["max_bins"])
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.bins = {int(index): count for index, count in data["bins"].items()}
+        return sketch
+
+
+def percentile_summary(sketch: QuantileSketch) -> Dict[str, float]:
+    """p50/p90/p99 of a sketch, as reported by the analytics endpoints"""
+    return {
+        "p50": sketch.quantile(0.50),
+        "p90": sketch.quantile(0.90),
+        "p99": sketch.quantile(0.99)
+    }
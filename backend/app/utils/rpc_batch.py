@@ -0,0 +1,82 @@
+"""
+JSON-RPC batch requests
+
+A JSON-RPC batch sends a list of requests in one HTTP POST and gets the
+responses back together, so independent reads (eth_estimateGas, eth_getBalance,
+fee lookups, ...) cost one round trip instead of one each. Providers that are
+not plain HTTP, or nodes that reject batches, get the requests one by one.
+"""
+
+import json
+from typing import Any, List, Sequence, Tuple
+
+from web3 import HTTPProvider, Web3
+from web3._utils.request import make_post_request
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# (method, params)
+RPCCall = Tuple[str, list]
+
+
+class RPCError(Exception):
+    """Error object a node returned for one request of a batch"""
+
+
+def _result(response: Any) -> Any:
+    if not isinstance(response, dict):
+        return RPCError("No response for request")
+    if response.get("error") is not None:
+        error = response["error"]
+        return RPCError(error.get("message", str(error)) if isinstance(error, dict) else str(error))
+    return response.get("result")
+
+
+def batch_request(w3: Web3, calls: Sequence[RPCCall]) -> List[Any]:
+    """
+    Send raw JSON-RPC requests in one batch
+
+    Results are the undecoded ``result`` fields (hex quantities stay hex
+    strings). A request that fails on its own yields an RPCError in its
+    slot instead of failing the whole batch.
+
+    Args:
+        w3: Web3 instance whose provider receives the batch
+        calls: (method, params) pairs
+
+    Returns:
+        One result or RPCError per call, in order
+    """
+    if not calls:
+        return []
+    provider = w3.provider
+    if isinstance(provider, HTTPProvider):
+        payload = [
+            {"jsonrpc": "2.0", "id": index, "method": method, "params": params}
+            for index, (method, params) in enumerate(calls)
+        ]
+        try:
+            raw = make_post_request(provider.endpoint_uri, json.dumps(payload).encode(),
+                                    **provider.get_request_kwargs())
+            responses = json.loads(raw)
+            if isinstance(responses, list):
+                by_id = {response.get("id"): response for response in responses if isinstance(response, dict)}
+                return [_result(by_id.get(index)) for index in range(len(calls))]
+            logger.warning("Node answered a JSON-RPC batch with a single response, sending one by one")
+        except Exception as e:
+            logger.warning(f"JSON-RPC batch failed, sending one by one: {str(e)}")
+
+    results = []
+    for method, params in calls:
+        try:
+            results.append(_result(provider.make_request(method, params)))
+        except Exception as e:
+            results.append(RPCError(str(e)))
+    return results
+
+
+def to_int(value: Any) -> int:
+    """Decode a hex quantity from a raw result"""
+    return int(value, 16) if isinstance(value, str) else int(value)
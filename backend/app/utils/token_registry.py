@@ -0,0 +1,110 @@
+"""
+Persistent registry of ERC20 token metadata
+
+decimals() and symbol() never change for a deployed token, so they are read
+once per token address, kept in memory and persisted to a JSON file that
+survives restarts. WalletService and BlockchainUtils share one registry, so
+balance refreshes only have to read balanceOf.
+"""
+
+import os
+import json
+import threading
+from functools import lru_cache
+from typing import Dict, Any, Iterable, Optional
+
+from .erc20 import DECIMALS_CALL, SYMBOL_CALL, decode_symbol, decode_uint
+from .multicall import Multicall
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# {"decimals": int, "symbol": str}
+TokenMetadata = Dict[str, Any]
+
+
+class TokenRegistry:
+    def __init__(self, path: str = "./data/token_metadata.json"):
+        """
+        Initialize the registry, loading previously resolved tokens
+
+        Args:
+            path: JSON file the metadata is persisted to
+        """
+        self.path = path
+        self._tokens: Dict[str, TokenMetadata] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._tokens = json.load(f)
+            except Exception as e:
+                logger.error(f"Failed to load token metadata, starting empty: {str(e)}")
+
+    def get(self, token_address: str) -> Optional[TokenMetadata]:
+        return self._tokens.get(token_address.lower())
+
+    def missing(self, token_addresses: Iterable[str]) -> list:
+        """Token addresses without registered metadata, in input order"""
+        return [address for address in token_addresses if address.lower() not in self._tokens]
+
+    def _persist(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump(self._tokens, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def register(self, entries: Dict[str, TokenMetadata]):
+        """Add metadata for token addresses and persist the registry"""
+        with self._lock:
+            self._tokens.update({address.lower(): metadata for address, metadata in entries.items()})
+            self._persist()
+
+    def resolve(self, multicall: Multicall, token_addresses: Iterable[str]) -> Dict[str, TokenMetadata]:
+        """
+        Metadata of the given tokens, reading unknown ones in one multicall
+
+        Tokens whose decimals() or symbol() fails, or every unknown token if
+        the read itself fails, are left out and retried on the next call.
+
+        Args:
+            multicall: Multicall client of the caller's Web3 connection
+            token_addresses: ERC20 contract addresses
+
+        Returns:
+            Dictionary of token address (as given) -> metadata
+        """
+        token_addresses = list(token_addresses)
+        missing = self.missing(token_addresses)
+        if missing:
+            calls = []
+            for address in missing:
+                calls.append((address, DECIMALS_CALL))
+                calls.append((address, SYMBOL_CALL))
+            try:
+                results = multicall.aggregate(calls)
+            except Exception as e:
+                logger.error(f"Failed to read metadata of {len(missing)} tokens: {str(e)}")
+                results = [(False, b"")] * len(calls)
+
+            resolved = {}
+            for index, address in enumerate(missing):
+                (decimals_ok, decimals_data), (symbol_ok, symbol_data) = results[2 * index:2 * index + 2]
+                try:
+                    if not (decimals_ok and symbol_ok):
+                        raise ValueError("decimals() or symbol() reverted")
+                    resolved[address] = {"decimals": decode_uint(decimals_data),
+                                         "symbol": decode_symbol(symbol_data)}
+                except Exception as e:
+                    logger.error(f"Failed to get token metadata for {address}: {str(e)}")
+            if resolved:
+                self.register(resolved)
+
+        return {address: self.get(address) for address in token_addresses if self.get(address)}
+
+
+@lru_cache()
+def get_token_registry() -> TokenRegistry:
+    """Process-wide registry shared by the wallet and blockchain services"""
+    return TokenRegistry()
@@ -0,0 +1,78 @@
+import pytest
+
+from app.services import analytics_codec
+from app.services.analytics_codec import BinaryRecordCodec, FieldTable, JsonLinesCodec
+from app.utils.event_fields import field_tree
+
+EVENTS = [
+    {"event_type": "ai_decision", "timestamp": 100 + i, "data": {
+        "user_id": f"u{i}", "success": i % 2 == 0, "processing_time_ms": i * 1.5, "note": None,
+        "wei": 10 ** 30 + i, "tags": ["a", i, {"nested": "ü"}], "rewards": {"gold": -i}}}
+    for i in range(40)
+]
+
+
+def _write(tmp_path, codec, events):
+    path = tmp_path / f"events{codec.extension}"
+    path.write_bytes(b"".join(codec.encode(event) for event in events))
+    return path
+
+
+@pytest.fixture(params=["jsonl", "binary"])
+def codec(request, tmp_path):
+    if request.param == "jsonl":
+        return JsonLinesCodec()
+    return BinaryRecordCodec(str(tmp_path / "fields.names"))
+
+
+def test_records_round_trip(codec, tmp_path):
+    path = _write(tmp_path, codec, EVENTS)
+    with open(path, "rb") as f:
+        scanned = list(codec.scan(f))
+    assert [event for _, _, event in scanned] == EVENTS
+    with open(path, "rb") as f:
+        assert codec.decode(codec.read_record_at(f, scanned[7][0])) == EVENTS[7]
+
+
+def test_scan_filters_by_time_and_projects_fields(codec, tmp_path):
+    path = _write(tmp_path, codec, EVENTS)
+    fields = field_tree(["timestamp", "data.user_id"])
+    with open(path, "rb") as f:
+        events = [event for _, _, event in codec.scan(f, start_time=110, end_time=112, fields=fields)]
+    assert events == [{"timestamp": t, "data": {"user_id": f"u{t - 100}"}} for t in (110, 111, 112)]
+
+
+def test_reverse_iteration_across_blocks(codec, tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics_codec, "REVERSE_BLOCK_SIZE", 64)
+    events = EVENTS + [{"timestamp": 1, "data": {"blob": "x" * 500}}]
+    path = _write(tmp_path, codec, events)
+    # Intact files never need the forward recovery pass
+    monkeypatch.setattr(codec, "iter_records", None)
+    decoded = [codec.decode(record) for record in codec.iter_records_reverse(str(path))]
+    assert decoded == events[::-1]
+
+
+def test_binary_reverse_iteration_skips_torn_tail(tmp_path):
+    codec = BinaryRecordCodec(str(tmp_path / "fields.names"))
+    path = _write(tmp_path, codec, EVENTS[:5])
+    with open(path, "ab") as f:
+        f.write(codec.encode(EVENTS[5])[:-3])
+    decoded = [codec.decode(record) for record in codec.iter_records_reverse(str(path))]
+    assert decoded == EVENTS[4::-1]
+
+
+def test_field_table_reads_only_other_writers_names(tmp_path):
+    path = str(tmp_path / "fields.names")
+    first, second = FieldTable(path), FieldTable(path)
+    assert first.id_of("a") == 0
+    assert second.id_of("b") == 1
+    assert first.id_of("b") == 1
+    assert first.name_of(1) == "b"
+    assert second.id_of("a") == 0
+
+    reloads = []
+    original = first.reload
+    first.reload = lambda: reloads.append(1) or original()
+    first.id_of("a")
+    assert reloads == []
+    assert FieldTable(path).names == ["a", "b"]
@@ -0,0 +1,59 @@
+import numpy as np
+
+from app.services.analytics_columnar import (
+    AIPerformanceAggregator, ColumnBatch, ColumnBuilder, GameMetricsAggregator
+)
+
+
+def _build(events):
+    builder = ColumnBuilder()
+    for event in events:
+        builder.add(event)
+    return builder.build()
+
+
+def _batch_and_event_results(aggregator_cls, args, event_type, events):
+    batched = aggregator_cls(*args)
+    batch = _build(events)
+    batched.add_batch(event_type, batch, np.ones(len(batch), dtype=bool))
+    incremental = aggregator_cls(*args)
+    for event in events:
+        incremental.add_event(event_type, event)
+    return batched.result(), incremental.result()
+
+
+def test_ai_metrics_match_between_batch_and_event_paths():
+    events = [
+        {"timestamp": 100 + i, "data": {"intent": intent, "success": i % 2 == 0, "processing_time_ms": 10 * i}}
+        for i, intent in enumerate(["swap", "", None, "swap", "unknown", ""])
+    ]
+    batched, incremental = _batch_and_event_results(AIPerformanceAggregator, (), "ai_decision", events)
+
+    assert set(batched["intent_metrics"]) == {"swap", "unknown"}
+    assert batched["intent_metrics"]["unknown"]["total_requests"] == 4
+    assert batched == incremental
+    assert isinstance(batched["total_decisions"], int)
+    assert isinstance(incremental["total_decisions"], int)
+
+
+def test_game_metrics_match_between_batch_and_event_paths():
+    events = [
+        {"timestamp": 100 + i, "data": {"quest_id": f"q{i}", "quest_type": quest_type}}
+        for i, quest_type in enumerate(["raid", "", None, "raid", 0])
+    ]
+    batched, incremental = _batch_and_event_results(
+        GameMetricsAggregator, ("dfk",), "dfk_quest_started", events)
+
+    assert batched["quest_type_distribution"] == {"raid": 2}
+    assert batched == incremental
+
+
+def test_segments_compacted_with_empty_strings_read_as_missing():
+    # Older segments dictionary-encoded "" as a regular value
+    batch = ColumnBatch({
+        "timestamp": np.array([1, 2, 3], dtype=np.int64),
+        "intent": np.array([0, 1, -1], dtype=np.int32),
+        "intent.vocab": np.array(["", "swap"]),
+    })
+
+    assert batch.present_codes("intent").tolist() == [-1, 1, -1]
@@ -0,0 +1,49 @@
+from app.services.analytics_recent import RecentEvents
+from app.services.analytics_service import AnalyticsService
+
+
+def _event(timestamp, **data):
+    return {"event_type": "ai_decision", "timestamp": timestamp, "data": data}
+
+
+def test_buffer_keeps_its_own_copy_of_appended_events():
+    recent = RecentEvents(capacity=10)
+    event = _event(recent.created_at + 1, user_id="u1", rewards={"gold": 1})
+    recent.append("ai_decision", event)
+    event["data"]["user_id"] = "changed"
+    event["data"]["rewards"]["gold"] = 99
+
+    assert recent.events("ai_decision", recent.created_at) == [
+        _event(recent.created_at + 1, user_id="u1", rewards={"gold": 1})
+    ]
+
+
+def test_service_readers_get_copies_of_buffered_events(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1)
+    start = analytics.recent_events.created_at
+    data = {"timestamp": start + 1, "tags": ["a"]}
+    analytics.track_event("ai_decision", data)
+    data["tags"].append("caller")
+
+    first = analytics.get_events("ai_decision", start_time=start)
+    first[0]["data"]["tags"].append("reader")
+    first[0]["timestamp"] = 0
+
+    second = analytics.get_events("ai_decision", start_time=start)
+    assert second[0]["timestamp"] == start + 1
+    assert second[0]["data"]["tags"] == ["a"]
+    analytics.close()
+
+
+def test_windows_are_ordered_bounded_and_counted():
+    recent = RecentEvents(capacity=3)
+    start = recent.created_at
+    for offset in (5, 1, 3, 4):
+        recent.append("ai_decision", _event(start + offset))
+
+    # The oldest event was evicted, so the buffer only covers later windows
+    assert recent.events("ai_decision", start) is None
+    assert [event["timestamp"] for event in recent.events("ai_decision", start + 2)] == [start + 5, start + 4, start + 3]
+    assert recent.count("ai_decision", start + 2, start + 4) == 2
+    assert recent.events("quest_started", start) == []
@@ -0,0 +1,179 @@
+import json
+import os
+import time
+
+from app.services import analytics_rollups
+from app.services.analytics_rollups import ARCHIVE_DAY, USER_DAY_HORIZON, MetricRollups, day_key
+
+
+def _events(now):
+    return [
+        ("dfk_quest_started", {"timestamp": now - 100, "data": {"user_id": "u1", "quest_id": "q1",
+                                                                "quest_type": "mining"}}),
+        ("dfk_quest_completed", {"timestamp": now - 40, "data": {"user_id": "u1", "quest_id": "q1",
+                                                                 "xp_gained": 5, "rewards": {"gold": 3}}}),
+        ("dfk_quest_started", {"timestamp": now - 20, "data": {"user_id": "u2", "quest_id": "q2"}}),
+        ("ai_decision", {"timestamp": now - 10, "data": {"user_id": "u2", "intent": "quest", "success": True,
+                                                         "processing_time_ms": 12}}),
+    ]
+
+
+def _snapshot(rollups):
+    return (
+        rollups.game_metrics("dfk"),
+        rollups.ai_metrics(),
+        rollups.leaderboard("xp_gained"),
+        rollups.leaderboard("ai_decisions"),
+        rollups.cohort_metrics(cohort_by="day"),
+        dict(rollups.open_starts),
+    )
+
+
+def _log_records(rollups):
+    with open(rollups.log_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_flush_round_trips_through_delta_log(tmp_path):
+    path = str(tmp_path / "rollups.json")
+    rollups = MetricRollups(path)
+    for offset, (event_type, event) in enumerate(_events(int(time.time()))):
+        rollups.apply(event_type, event, (1, offset))
+    rollups.flush()
+
+    assert not os.path.exists(path)
+    reloaded = MetricRollups(path)
+    assert reloaded.load()
+    assert _snapshot(reloaded) == _snapshot(rollups)
+    assert reloaded.watermarks == rollups.watermarks
+
+
+def test_delta_holds_only_changed_days_and_keys(tmp_path):
+    now = int(time.time())
+    rollups = MetricRollups(str(tmp_path / "rollups.json"))
+    old = now - 3 * 86400
+    rollups.apply("ai_decision", {"timestamp": old, "data": {"user_id": "u1", "success": True}})
+    rollups.flush()
+    rollups.apply("ai_decision", {"timestamp": now, "data": {"user_id": "u2", "success": False}})
+    rollups.flush()
+    rollups.flush()
+
+    records = _log_records(rollups)
+    assert len(records) == 2
+    assert list(records[1]["days"]) == [day_key(now)]
+    assert list(records[1]["user_days"]) == [f"{day_key(now)}:u2"]
+    assert list(records[1]["first_seen"]) == ["u2"]
+
+
+def test_requeued_delta_is_written_by_next_flush(tmp_path):
+    now = int(time.time())
+    rollups = MetricRollups(str(tmp_path / "rollups.json"))
+    rollups.apply("ai_decision", {"timestamp": now, "data": {"user_id": "u1", "success": True}})
+    line = rollups.take_delta()
+    assert rollups.take_delta() is None
+    rollups.requeue(line)
+    rollups.apply("ai_decision", {"timestamp": now, "data": {"user_id": "u1", "success": True}})
+    rollups.flush()
+
+    reloaded = MetricRollups(rollups.path)
+    assert reloaded.load()
+    assert reloaded.leaderboard("ai_decisions") == [{"rank": 1, "user_id": "u1", "value": 2}]
+
+
+def test_old_user_days_fold_into_archive_bucket(tmp_path):
+    now = int(time.time())
+    rollups = MetricRollups(str(tmp_path / "rollups.json"))
+    old_days = [now - (USER_DAY_HORIZON + extra) * 86400 for extra in (2, 5)]
+    for timestamp in old_days + [now]:
+        rollups.apply("ai_decision", {"timestamp": timestamp, "data": {"user_id": "u1", "success": True}})
+    rollups.flush()
+
+    assert set(rollups.users["u1"]) == {ARCHIVE_DAY, day_key(now)}
+    assert rollups.users["u1"][ARCHIVE_DAY]["ai_total"] == 2
+    assert rollups.leaderboard("ai_decisions")[0]["value"] == 3
+    assert rollups.leaderboard("ai_decisions", start_day=day_key(now))[0]["value"] == 1
+
+    reloaded = MetricRollups(rollups.path)
+    assert reloaded.load()
+    assert set(reloaded.users["u1"]) == {ARCHIVE_DAY, day_key(now)}
+    assert reloaded.leaderboard("ai_decisions")[0]["value"] == 3
+
+
+def test_compaction_folds_log_into_base_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics_rollups, "LOG_COMPACT_MIN_BYTES", 0)
+    rollups = MetricRollups(str(tmp_path / "rollups.json"))
+    for offset, (event_type, event) in enumerate(_events(int(time.time()))):
+        rollups.apply(event_type, event, (1, offset))
+        rollups.flush()
+
+    assert os.path.exists(rollups.path)
+    assert os.path.getsize(rollups.log_path) < os.path.getsize(rollups.path)
+    reloaded = MetricRollups(rollups.path)
+    assert reloaded.load()
+    assert _snapshot(reloaded) == _snapshot(rollups)
+
+
+def test_completed_quests_are_removed_from_open_starts(tmp_path):
+    now = int(time.time())
+    rollups = MetricRollups(str(tmp_path / "rollups.json"))
+    rollups.apply("dfk_quest_started", {"timestamp": now - 50, "data": {"quest_id": "q1"}})
+    rollups.flush()
+    rollups.apply("dfk_quest_completed", {"timestamp": now, "data": {"quest_id": "q1"}})
+    rollups.flush()
+
+    assert _log_records(rollups)[1]["open_starts"] == {"dfk:q1": None}
+    reloaded = MetricRollups(rollups.path)
+    assert reloaded.load()
+    assert reloaded.open_starts == {}
+    assert reloaded.game_metrics("dfk")["avg_quest_duration_seconds"] == 50
+
+
+def test_older_layout_is_removed(tmp_path):
+    path = tmp_path / "rollups.json"
+    path.write_text(json.dumps({"version": 1, "games": {}}))
+    rollups = MetricRollups(str(path))
+
+    assert not rollups.load()
+    assert not path.exists()
+
+
+def _brute_force_leaderboard(rollups, metric, start_day="", game_id=None):
+    scores = {}
+    for user_id, days in rollups.users.items():
+        value = 0
+        for day, bucket in days.items():
+            if day < start_day:
+                continue
+            if metric == "ai_decisions":
+                value += bucket["ai_total"]
+            else:
+                value += sum(game[metric] for game_id_, game in bucket["games"].items()
+                             if not game_id or game_id_ == game_id)
+        if value:
+            scores[user_id] = value
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def test_leaderboard_reads_running_totals_and_windows(tmp_path):
+    now = int(time.time())
+    rollups = MetricRollups(str(tmp_path / "rollups.json"))
+    for i in range(120):
+        timestamp = now - (i % 45) * 86400
+        user_id = f"u{i % 7}"
+        rollups.apply("ai_decision", {"timestamp": timestamp, "data": {"user_id": user_id, "success": i % 3 == 0}})
+        game_id = "dfk" if i % 2 else "other"
+        rollups.apply(f"{game_id}_quest_completed", {"timestamp": timestamp, "data": {
+            "user_id": user_id, "quest_id": f"q{i}", "xp_gained": i}})
+    rollups.flush()
+
+    for start_day in ("", day_key(now - 6 * 86400), day_key(now)):
+        for metric, game_id in (("ai_decisions", None), ("quests_completed", "dfk"), ("xp_gained", None)):
+            entries = rollups.leaderboard(metric, start_day, limit=100, game_id=game_id)
+            ranked = sorted(((entry["user_id"], entry["value"]) for entry in entries),
+                            key=lambda item: (-item[1], item[0]))
+            assert ranked == _brute_force_leaderboard(rollups, metric, start_day, game_id)
+
+    reloaded = MetricRollups(rollups.path)
+    assert reloaded.load()
+    assert reloaded.leaderboard("xp_gained", limit=3) == rollups.leaderboard("xp_gained", limit=3)
+    assert reloaded.cohort_metrics(cohort_by="month") == rollups.cohort_metrics(cohort_by="month")
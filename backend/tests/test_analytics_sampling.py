@@ -0,0 +1,73 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import analytics_sampling
+from app.services.analytics_sampling import (RateSampling, ReservoirSampling, add_to_intent_bucket,
+                                             ai_estimates, event_weight, new_intent_bucket)
+from app.services.analytics_service import AnalyticsService
+
+
+def test_rate_sampling_keeps_one_in_n_with_weight_n():
+    assert RateSampling(1).offer({"timestamp": 1}) == [{"timestamp": 1}]
+    policy = RateSampling(4, seed=3)
+    kept = [event for i in range(4000) for event in policy.offer({"timestamp": i})]
+    assert 800 < len(kept) < 1200
+    assert {event_weight(event) for event in kept} == {4}
+    with pytest.raises(ValueError):
+        RateSampling(0)
+
+
+def test_reservoir_holds_a_window_and_weights_it_on_close(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(analytics_sampling, "time", SimpleNamespace(time=lambda: now[0]))
+    policy = ReservoirSampling(size=3, window_seconds=60, seed=1)
+    for i in range(10):
+        assert policy.offer({"timestamp": 1000 + i}) == []
+    assert policy.drain() == []
+
+    now[0] += 60
+    sample = policy.offer({"timestamp": 1060})
+    assert len(sample) == 3
+    assert sum(event_weight(event) for event in sample) == pytest.approx(10)
+    assert [event["timestamp"] for event in sample] == sorted(event["timestamp"] for event in sample)
+    # A window that kept every event stores them unweighted
+    assert policy.drain(force=True) == [{"timestamp": 1060}]
+
+
+def test_unsampled_estimates_are_exact():
+    bucket = new_intent_bucket()
+    for success, processing_time in ((True, 10.0), (False, 30.0), (True, None)):
+        add_to_intent_bucket(bucket, 1, success, processing_time)
+    estimates = ai_estimates({"quest": bucket})
+    assert estimates["total_decisions"] == 3
+    assert estimates["overall_success_rate"] == pytest.approx(2 / 3)
+    assert estimates["avg_processing_time_ms"] == 20.0
+    assert estimates["confidence_intervals"]["overall_success_rate"] == [pytest.approx(2 / 3)] * 2
+    assert estimates["intent_metrics"]["quest"]["success_rate_ci"] == [pytest.approx(2 / 3)] * 2
+
+
+def test_sampled_service_metrics_cover_the_full_stream(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1, sampling={"ai_decision": RateSampling(5, seed=11)})
+    now = int(time.time())
+    for i in range(2000):
+        analytics.track_event("ai_decision", {"timestamp": now, "intent": "quest", "success": i % 4 != 0,
+                                              "processing_time_ms": 100})
+
+    metrics = analytics.get_ai_performance_metrics("today")
+    low, high = metrics["confidence_intervals"]["total_decisions"]
+    assert low <= 2000 <= high
+    assert metrics["sampled_decisions"] < 600
+    low, high = metrics["confidence_intervals"]["overall_success_rate"]
+    assert low <= 0.75 <= high
+    analytics.close()
+
+
+def test_only_weighted_event_types_can_be_sampled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError, match="dfk_quest_started"):
+        AnalyticsService(max_workers=1, sampling={"ai_decision": RateSampling(5),
+                                                  "dfk_quest_started": RateSampling(5)})
+    AnalyticsService(max_workers=1, sampling={"ai_decision": RateSampling(5)}).close()
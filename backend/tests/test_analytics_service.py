@@ -0,0 +1,173 @@
+import threading
+
+import pytest
+
+from app.services import analytics_service
+from app.services.analytics_service import AnalyticsService
+
+
+def _track_game_and_ai_events(analytics):
+    for i in range(60):
+        analytics.track_event("dfk_quest_started", {"timestamp": 1000 + i, "quest_id": f"q{i}",
+                                                    "quest_type": ("raid", "gather")[i % 2]})
+        if i % 3 == 0:
+            analytics.track_event("dfk_quest_completed", {"timestamp": 1007 + i, "quest_id": f"q{i}"})
+            analytics.track_event("dfk_rewards_collected", {"timestamp": 1007 + i, "rewards": {"gold": i}})
+        analytics.track_event("ai_decision", {"timestamp": 1000 + i, "intent": ("swap", "quest")[i % 2],
+                                              "success": i % 4 != 0, "processing_time_ms": i})
+        if i == 20:
+            analytics.compact_event_type("dfk_quest_started")
+        if i == 40:
+            analytics.seal_segment("ai_decision")
+
+
+def test_seal_waits_for_open_readers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1)
+    for timestamp in range(100, 103):
+        analytics.track_event("ai_decision", {"timestamp": timestamp})
+
+    events = analytics.iter_events("ai_decision", newest_first=False)
+    first = next(events)
+    sealed = []
+    sealer = threading.Thread(target=lambda: sealed.append(analytics.seal_segment("ai_decision")))
+    sealer.start()
+    # The reader listed the active file before the seal, so it must not move yet
+    sealer.join(0.1)
+    assert sealed == []
+    assert [first["timestamp"]] + [event["timestamp"] for event in events] == [100, 101, 102]
+
+    sealer.join(5)
+    assert sealed == [0]
+    assert [event["timestamp"] for event in analytics.iter_events("ai_decision", newest_first=False)] == [100, 101, 102]
+    analytics.close()
+
+
+@pytest.mark.parametrize("codec", ["jsonl", "binary"])
+def test_parallel_scan_matches_sequential_scan(codec, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Far below one line per range, so JSON lines are split mid-record
+    monkeypatch.setattr(analytics_service, "PARTITION_BYTES", 37)
+    analytics = AnalyticsService(max_workers=2, parallel_min_bytes=0, codec=codec)
+    _track_game_and_ai_events(analytics)
+    with open(analytics._active_file("ai_decision"), "rb") as f:
+        assert f.read()[36:37] != b"\n"
+
+    parallel = (analytics.calculate_game_metrics("dfk", start_time=1005, end_time=1050),
+                analytics.get_ai_performance_metrics(start_time=1005, end_time=1050))
+    assert analytics._executor is not None
+    analytics.close()
+
+    sequential_service = AnalyticsService(max_workers=1, codec=codec)
+    sequential = (sequential_service.calculate_game_metrics("dfk", start_time=1005, end_time=1050),
+                  sequential_service.get_ai_performance_metrics(start_time=1005, end_time=1050))
+    sequential_service.close()
+    assert parallel == sequential
+    assert parallel[0]["total_quests"] == 46
+    assert parallel[1]["total_decisions"] == 46
+
+
+def _track_in_three_files(analytics, event_types):
+    """Events at 100..129 per type: segments 0 and 1 hold 100-119, the active file 120-129"""
+    for timestamp in range(100, 130):
+        for event_type in event_types:
+            analytics.track_event(event_type, {"timestamp": timestamp, "user_id": "u1"})
+        if timestamp in (109, 119):
+            for event_type in event_types:
+                analytics.seal_segment(event_type)
+
+
+@pytest.mark.parametrize("codec", ["jsonl", "binary"])
+def test_get_events_returns_the_newest_events_first(codec, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1, codec=codec)
+    _track_in_three_files(analytics, ["ai_decision"])
+    read_paths = []
+    for codec_impl in analytics.codecs.values():
+        original = codec_impl.iter_records_reverse
+        monkeypatch.setattr(codec_impl, "iter_records_reverse",
+                            lambda path, original=original: read_paths.append(path) or original(path))
+
+    assert [event["timestamp"] for event in analytics.get_events("ai_decision", limit=5)] == list(range(129, 124, -1))
+    assert read_paths == [analytics._active_file("ai_decision")]
+
+    read_paths.clear()
+    events = analytics.get_events("ai_decision", limit=15)
+    assert [event["timestamp"] for event in events] == list(range(129, 114, -1))
+    assert read_paths == [analytics._active_file("ai_decision"), analytics._segment_file("ai_decision", 1)]
+    analytics.close()
+
+
+def test_user_events_merge_types_and_stop_at_limit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1)
+    _track_in_three_files(analytics, ["quest_started", "ai_decision"])
+    opened = []
+    original = analytics_service.open_segment
+    monkeypatch.setattr(analytics_service, "open_segment", lambda path: opened.append(path) or original(path))
+
+    events = analytics.get_user_events("u1", limit=24)
+    assert [event["timestamp"] for event in events] == [t for t in range(129, 117, -1) for _ in range(2)]
+    assert all({event["event_type"] for event in events[i:i + 2]} == {"quest_started", "ai_decision"}
+               for i in range(0, 24, 2))
+    # Segment 0 (100-109) of either type is never opened
+    assert sorted(opened) == sorted(analytics._segment_file(event_type, seq)
+                                    for event_type in ("quest_started", "ai_decision") for seq in (1, 2))
+    analytics.close()
+
+
+def test_ad_hoc_metrics_match_values_computed_from_the_events(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1)
+    starts, completions, rewards, decisions = [], [], [], []
+    for i in range(80):
+        starts.append({"timestamp": 1000 + 3 * i, "quest_id": f"q{i % 25}", "quest_type": ("raid", "gather", "")[i % 3]})
+        analytics.track_event("dfk_quest_started", starts[-1])
+        if i % 4 == 0:
+            completions.append({"timestamp": 1005 + 3 * i + i % 7, "quest_id": f"q{i % 25}"})
+            rewards.append({"timestamp": completions[-1]["timestamp"], "rewards": {"gold": i, "gems": 0.5}})
+            analytics.track_event("dfk_quest_completed", completions[-1])
+            analytics.track_event("dfk_rewards_collected", rewards[-1])
+        decisions.append({"timestamp": 1000 + 2 * i, "intent": ("swap", "quest", "chat")[i % 3],
+                          "success": i % 5 != 0, "processing_time_ms": i * 1.25})
+        analytics.track_event("ai_decision", decisions[-1])
+        if i == 30:
+            analytics.compact_event_type("dfk_quest_started")
+            analytics.seal_segment("ai_decision")
+        if i == 50:
+            analytics.seal_segment("dfk_quest_completed")
+            analytics.compact_event_type("ai_decision")
+
+    def in_range(events):
+        return [event for event in events if 1030 <= event["timestamp"] <= 1200]
+
+    latest_start = {}
+    for event in in_range(starts):
+        latest_start[event["quest_id"]] = event["timestamp"]
+    durations = [event["timestamp"] - latest_start[event["quest_id"]] for event in in_range(completions)
+                 if event["timestamp"] > latest_start.get(event["quest_id"], event["timestamp"])]
+    game = analytics.calculate_game_metrics("dfk", start_time=1030, end_time=1200)
+    assert game["total_quests"] == len(in_range(starts))
+    assert game["completed_quests"] == len(in_range(completions))
+    assert game["completion_rate"] == pytest.approx(len(in_range(completions)) / len(in_range(starts)))
+    assert game["avg_quest_duration_seconds"] == pytest.approx(sum(durations) / len(durations))
+    assert game["quest_type_distribution"] == {
+        quest_type: sum(event["quest_type"] == quest_type for event in in_range(starts))
+        for quest_type in ("raid", "gather")
+    }
+    assert game["total_rewards"] == {
+        "gold": sum(event["rewards"]["gold"] for event in in_range(rewards)),
+        "gems": 0.5 * len(in_range(rewards)),
+    }
+
+    ai = analytics.get_ai_performance_metrics(start_time=1030, end_time=1200)
+    selected = in_range(decisions)
+    assert ai["total_decisions"] == len(selected)
+    assert ai["successful_decisions"] == sum(event["success"] for event in selected)
+    assert ai["avg_processing_time_ms"] == pytest.approx(
+        sum(event["processing_time_ms"] for event in selected) / len(selected))
+    for intent in ("swap", "quest", "chat"):
+        of_intent = [event for event in selected if event["intent"] == intent]
+        assert ai["intent_metrics"][intent]["total_requests"] == len(of_intent)
+        assert ai["intent_metrics"][intent]["successful"] == sum(event["success"] for event in of_intent)
+    analytics.close()
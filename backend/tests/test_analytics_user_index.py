@@ -0,0 +1,109 @@
+import os
+
+from app.services.analytics_service import AnalyticsService
+from app.services.analytics_user_index import RECORD, UserEventIndex, pack_position, unpack_position
+
+
+def test_positions_pack_round_trip():
+    assert unpack_position(pack_position(3, 12345)) == (3, 12345)
+    assert pack_position(1, 0) > pack_position(0, (1 << 40) - 1)
+
+
+def test_postings_survive_reload_and_torn_record(tmp_path):
+    path = str(tmp_path / "user_index.bin")
+    index = UserEventIndex(path)
+    index.add("u1", "ai_decision", 0, 0)
+    index.add("u2", "ai_decision", 0, 80)
+    index.add("u1", "quest_started", 1, 40)
+    index.add("u1", "ai_decision", 1, 0)
+    with open(path, "ab") as f:
+        f.write(RECORD.pack(0, 0, 2, 0)[:-3])
+
+    reloaded = UserEventIndex(path)
+    reloaded.load()
+    assert reloaded.event_types("u1") == ["ai_decision", "quest_started"]
+    assert [unpack_position(p) for p in reloaded.positions("u1", "ai_decision")] == [(0, 0), (1, 0)]
+    assert reloaded.last_position("ai_decision") == (1, 0)
+    assert reloaded.last_position("unknown") == (-1, -1)
+    assert list(reloaded.positions("nobody", "ai_decision")) == []
+
+
+def test_prune_drops_old_segments_on_disk(tmp_path):
+    path = str(tmp_path / "user_index.bin")
+    index = UserEventIndex(path)
+    index.add("u1", "ai_decision", 0, 0)
+    index.add("u1", "ai_decision", 2, 10)
+    index.add("u1", "quest_started", 0, 0)
+    index.prune("ai_decision", 1)
+
+    reloaded = UserEventIndex(path)
+    reloaded.load()
+    assert [unpack_position(p) for p in reloaded.positions("u1", "ai_decision")] == [(2, 10)]
+    assert [unpack_position(p) for p in reloaded.positions("u1", "quest_started")] == [(0, 0)]
+
+
+def test_service_reads_user_events_through_the_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1)
+    for timestamp in range(100, 110):
+        analytics.track_event("ai_decision", {"timestamp": timestamp, "user_id": f"u{timestamp % 2}"})
+    analytics.track_event("quest_started", {"timestamp": 106, "user_id": "u1"})
+    analytics.seal_segment("ai_decision")
+
+    events = analytics.get_user_events("u1", limit=3)
+    assert [(event["event_type"], event["timestamp"]) for event in events] == [
+        ("ai_decision", 109), ("ai_decision", 107), ("quest_started", 106)
+    ]
+    analytics.close()
+
+    # Events appended after the index was last written are indexed on startup
+    os.remove(analytics.user_index.path)
+    reopened = AnalyticsService(max_workers=1)
+    assert [event["timestamp"] for event in reopened.get_user_events("u0", "ai_decision")] == [108, 106, 104, 102, 100]
+    reopened.close()
+
+
+def _count_reads(monkeypatch):
+    reads = []
+    original = AnalyticsService._iter_events_from
+
+    def counting(self, *args, **kwargs):
+        for item in original(self, *args, **kwargs):
+            reads.append(item[0]["timestamp"])
+            yield item
+
+    monkeypatch.setattr(AnalyticsService, "_iter_events_from", counting)
+    return reads
+
+
+def test_startup_resumes_after_events_without_users(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1)
+    analytics.track_event("quest_started", {"timestamp": 100, "user_id": "u1"})
+    for timestamp in range(101, 121):
+        analytics.track_event("quest_started", {"timestamp": timestamp})
+        analytics.track_event("system_tick", {"timestamp": timestamp})
+    analytics.close()
+
+    reads = _count_reads(monkeypatch)
+    reopened = AnalyticsService(max_workers=1)
+    assert reads == []
+    assert [event["timestamp"] for event in reopened.get_user_events("u1")] == [100]
+    reopened.close()
+
+
+def test_lagging_position_does_not_duplicate_postings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1)
+    analytics.track_event("quest_started", {"timestamp": 100, "user_id": "u1"})
+    analytics.close()
+    # Tracked after the position was last saved, then the process dies
+    crashed = AnalyticsService(max_workers=1)
+    crashed.track_event("quest_started", {"timestamp": 101, "user_id": "u1"})
+    crashed.track_event("quest_started", {"timestamp": 102})
+
+    reads = _count_reads(monkeypatch)
+    reopened = AnalyticsService(max_workers=1)
+    assert sorted(set(reads)) == [101, 102]
+    assert len(reopened.user_index.positions("u1", "quest_started")) == 2
+    reopened.close()
@@ -0,0 +1,68 @@
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from app.services.balance_snapshot import BalanceSnapshotService
+
+ALICE = "0x" + "11" * 20
+BOB = "0x" + "22" * 20
+
+
+class Node(BaseProvider):
+    """Chain without Multicall3 that records the requests it answers"""
+
+    def __init__(self, balances, head=7):
+        self.balances = balances
+        self.head = head
+        self.requests = []
+
+    def make_request(self, method, params):
+        self.requests.append((method, params))
+        if method == "eth_getCode":
+            result = "0x"
+        elif method == "eth_blockNumber":
+            result = hex(self.head)
+        elif method == "eth_getBalance":
+            if params[0] not in self.balances:
+                return {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "header not found"}}
+            result = hex(self.balances[params[0]])
+        else:
+            raise ValueError(method)
+        return {"jsonrpc": "2.0", "id": 1, "result": result}
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+def test_native_balances_without_multicall_are_read_at_one_block():
+    node = Node({ALICE: 5, BOB: 9})
+    snapshots = BalanceSnapshotService(Web3(node))
+    snapshots.watch([ALICE, BOB, ALICE])
+
+    assert snapshots.refresh(block_number=6) == 2
+    assert [params for method, params in node.requests if method == "eth_getBalance"] == [
+        [ALICE, "0x6"], [BOB, "0x6"]
+    ]
+    assert snapshots.native_balance(ALICE) == 5
+    assert snapshots.get_snapshot(BOB)["block_number"] == 6
+
+
+def test_failed_balance_is_none_and_unwatched_wallets_are_dropped():
+    snapshots = BalanceSnapshotService(Web3(Node({ALICE: 5})))
+    snapshots.watch([ALICE, BOB])
+    assert snapshots.refresh() == 2
+    assert snapshots.get_snapshot(BOB)["native_wei"] is None
+    assert snapshots.get_snapshot(ALICE)["block_number"] == 7
+
+    snapshots.unwatch(ALICE)
+    assert snapshots.get_snapshot(ALICE) is None
+    assert snapshots.refresh() == 1
+
+
+def test_snapshot_goes_stale_when_the_head_moves_on():
+    node = Node({ALICE: 5})
+    snapshots = BalanceSnapshotService(Web3(node), max_blocks_behind=2)
+    snapshots.watch([ALICE])
+    snapshots.refresh(block_number=7)
+    snapshots._advance(10)
+    assert snapshots.native_balance(ALICE) is None
+    assert snapshots.get_snapshot(ALICE)["stale"]
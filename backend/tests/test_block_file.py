@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from app.utils.block_file import (BlockCompressedFile, compress_file, is_compressed, open_segment,
+                                  original_path, stored_size)
+
+DATA = b"".join(b'{"seq": %d, "pad": "%s"}\n' % (i, b"x" * (i % 13)) for i in range(400))
+
+
+@pytest.fixture
+def compressed(tmp_path):
+    src = tmp_path / "events.jsonl"
+    src.write_bytes(DATA)
+    os.utime(src, (1000, 1000))
+    dst = str(src) + ".z"
+    assert compress_file(str(src), dst, block_size=500) < len(DATA)
+    return dst
+
+
+def test_reads_and_seeks_by_original_offsets(compressed):
+    with BlockCompressedFile(compressed, cache_blocks=2) as f:
+        assert f.size == len(DATA) == stored_size(compressed)
+        assert f.read() == DATA
+        for offset, size in ((0, 10), (495, 20), (len(DATA) - 5, 50), (1234, 3000)):
+            f.seek(offset)
+            assert f.read(size) == DATA[offset:offset + size]
+        f.seek(-30, os.SEEK_END)
+        assert f.tell() == len(DATA) - 30
+        assert f.read() == DATA[-30:]
+
+
+def test_lines_span_block_boundaries(compressed):
+    with open_segment(compressed) as f:
+        assert list(f) == DATA.splitlines(keepends=True)
+    with open_segment(compressed[:-2]) as f:
+        assert f.read(5) == DATA[:5]
+
+
+def test_metadata_and_paths(compressed, tmp_path):
+    assert os.path.getmtime(compressed) == 1000
+    assert is_compressed(compressed) and not is_compressed(original_path(compressed))
+    assert original_path(compressed) == str(tmp_path / "events.jsonl")
+    not_compressed = tmp_path / "plain.z"
+    not_compressed.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        BlockCompressedFile(str(not_compressed))
@@ -0,0 +1,19 @@
+import pytest
+from eth_abi import encode
+
+from app.utils.erc20 import BALANCE_OF_SELECTOR, balance_of_call, decode_symbol, decode_uint
+
+
+def test_balance_of_call_matches_abi_encoding():
+    owner = "0x" + "ab" * 20
+    assert balance_of_call(owner) == BALANCE_OF_SELECTOR + encode(["address"], [owner])
+
+
+def test_decoders_accept_abi_and_legacy_forms():
+    assert decode_uint(encode(["uint256"], [10 ** 30])) == 10 ** 30
+    assert decode_uint(encode(["uint8"], [18])) == 18
+    with pytest.raises(ValueError):
+        decode_uint(b"")
+    assert decode_symbol(encode(["string"], ["GOLD"])) == "GOLD"
+    # bytes32 symbols of older tokens such as MKR
+    assert decode_symbol(b"MKR".ljust(32, b"\0")) == "MKR"
@@ -0,0 +1,46 @@
+from app.services.analytics_service import AnalyticsService
+from app.utils.event_fields import field_tree, get_path, matches, project
+
+EVENT = {"event_type": "ai_decision", "timestamp": 100,
+         "data": {"user_id": "u1", "success": True, "rewards": {"gold": 5, "xp": 2}}}
+
+
+def test_field_tree_prefers_whole_ancestors():
+    assert field_tree(["timestamp", "data.user_id", "data.rewards.gold"]) == {
+        "timestamp": None, "data": {"user_id": None, "rewards": {"gold": None}}
+    }
+    assert field_tree(["data", "data.user_id"]) == {"data": None}
+    assert field_tree(["data.user_id", "data"]) == {"data": None}
+
+
+def test_project_keeps_only_named_fields():
+    assert project(EVENT, field_tree(["timestamp", "data.rewards.gold", "data.missing"])) == {
+        "timestamp": 100, "data": {"rewards": {"gold": 5}}
+    }
+    assert project(EVENT, None) is EVENT
+
+
+def test_conditions_match_values_and_predicates():
+    assert get_path(EVENT, "data.rewards.xp") == 2
+    assert get_path(EVENT, "data.user_id.deeper") is None
+    assert matches(EVENT, {"data.user_id": "u1", "data.rewards.gold": lambda gold: gold > 3})
+    assert not matches(EVENT, {"data.success": False})
+    assert matches(EVENT, {"data.missing": lambda value: value is None})
+    assert matches(EVENT, None)
+
+
+def test_iter_events_pushes_filters_and_fields_down(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1)
+    for timestamp in range(100, 110):
+        analytics.track_event("ai_decision", {"timestamp": timestamp, "user_id": f"u{timestamp % 3}",
+                                              "success": timestamp % 2 == 0})
+    analytics.seal_segment("ai_decision")
+
+    events = analytics.iter_events("ai_decision", start_time=102, end_time=108,
+                                   where={"data.user_id": "u0"}, fields=["timestamp"])
+    assert list(events) == [{"timestamp": 108}, {"timestamp": 105}, {"timestamp": 102}]
+
+    user_events = analytics.iter_user_events("u1", where={"data.success": True}, fields=["data.user_id"])
+    assert list(user_events) == [{"data": {"user_id": "u1"}}] * 2
+    analytics.close()
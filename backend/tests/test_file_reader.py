@@ -0,0 +1,33 @@
+import pytest
+
+from app.utils.block_file import compress_file
+from app.utils.file_reader import read_lines_reverse
+
+LINES = [f'{{"seq": {i}, "note": "{"x" * (i % 7)}"}}' for i in range(50)]
+
+
+@pytest.fixture(params=["plain", "compressed"])
+def path(request, tmp_path):
+    path = tmp_path / "events.jsonl"
+    path.write_text("\n".join(LINES[:25]) + "\n\n" + "\n".join(LINES[25:]) + "\n")
+    if request.param == "plain":
+        return str(path)
+    compress_file(str(path), str(path) + ".z", block_size=100)
+    return str(path) + ".z"
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1 << 16])
+def test_lines_are_read_newest_first_across_blocks(path, block_size):
+    assert list(read_lines_reverse(path, block_size=block_size)) == LINES[::-1]
+
+
+def test_stopping_early_reads_only_the_tail(path):
+    lines = read_lines_reverse(path, block_size=32)
+    assert [next(lines) for _ in range(3)] == LINES[:-4:-1]
+    lines.close()
+
+
+def test_last_line_without_newline_and_unicode(tmp_path):
+    path = tmp_path / "events.jsonl"
+    path.write_bytes("première\nzweite ü\n\nlast".encode("utf-8"))
+    assert list(read_lines_reverse(str(path), block_size=3)) == ["last", "zweite ü", "première"]
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from app.services import gas_oracle
+from app.services.gas_oracle import GasOracle, get_gas_oracle
+
+GWEI = 10 ** 9
+
+
+class FakeEth:
+    """Fee history where block n has base fee n gwei and tips of 1/2/3 gwei at the 10/50/90th percentile"""
+
+    def __init__(self, head):
+        self.block_number = head
+        self.history_calls = []
+
+    def fee_history(self, block_count, newest_block, percentiles):
+        self.history_calls.append((block_count, newest_block))
+        oldest = newest_block - block_count + 1
+        return {
+            "oldestBlock": oldest,
+            "gasUsedRatio": [0.5] * block_count,
+            "reward": [[GWEI, 2 * GWEI, 3 * GWEI]] * block_count,
+            "baseFeePerGas": [block * GWEI for block in range(oldest, newest_block + 2)],
+        }
+
+
+def _oracle(head=100, **kwargs):
+    eth = FakeEth(head)
+    return GasOracle(SimpleNamespace(eth=eth), block_count=5, **kwargs), eth
+
+
+def test_suggestions_per_tier_from_fee_history():
+    oracle, _ = _oracle()
+    assert oracle.suggest("slow") == {"maxPriorityFeePerGas": GWEI, "maxFeePerGas": int(101 * GWEI * 1.125) + GWEI,
+                                      "baseFeePerGas": 101 * GWEI, "block_number": 100}
+    assert oracle.suggest("fast")["maxPriorityFeePerGas"] == 3 * GWEI
+    assert oracle.gas_price("standard") == 103 * GWEI
+
+
+def test_on_demand_refresh_fetches_only_new_blocks():
+    oracle, eth = _oracle(refresh_interval=0)
+    oracle.suggest()
+    eth.block_number = 102
+    assert oracle.suggest()["block_number"] == 102
+    oracle.suggest()
+    assert eth.history_calls == [(5, 100), (2, 102)]
+
+    throttled, eth = _oracle(refresh_interval=60)
+    throttled.suggest()
+    eth.block_number = 101
+    assert throttled.suggest()["block_number"] == 100
+    assert len(eth.history_calls) == 1
+
+
+def test_shared_oracle_does_not_start_a_thread(monkeypatch):
+    get_gas_oracle.cache_clear()
+    monkeypatch.setattr(gas_oracle.GasOracle, "refresh", lambda self, block_number=None: False)
+    oracle = get_gas_oracle("http://localhost:8545")
+    assert oracle._thread is None
+
+    oracle.start(poll_interval=0.01)
+    assert oracle._thread.is_alive()
+    thread = oracle._thread
+    oracle.stop()
+    assert not thread.is_alive() and oracle._thread is None
+    get_gas_oracle.cache_clear()
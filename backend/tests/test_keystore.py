@@ -0,0 +1,62 @@
+import os
+
+from app.utils.keystore import EncryptedKeystore, KeyCache
+
+
+def test_records_round_trip_and_later_records_supersede(tmp_path):
+    path = str(tmp_path / "keystore.bin")
+    keystore = EncryptedKeystore(path)
+    keystore.put("wallet:u1:0xA", "first")
+    keystore.put_many([("wallet:u1:0xB", "ü-payload"), ("wallet:u1:0xA", "second")])
+    assert keystore.get("wallet:u1:0xA") == "second"
+    assert keystore.get("wallet:u1:0xB") == "ü-payload"
+    assert keystore.get("missing") is None
+    keystore.close()
+
+    reopened = EncryptedKeystore(path)
+    assert sorted(reopened.keys()) == ["wallet:u1:0xA", "wallet:u1:0xB"]
+    assert reopened.get("wallet:u1:0xA") == "second"
+    reopened.close()
+
+
+def test_records_missing_from_the_index_are_recovered(tmp_path):
+    path = str(tmp_path / "keystore.bin")
+    keystore = EncryptedKeystore(path)
+    keystore.put("wallet:u1:0xA", "a")
+    keystore.put("wallet:u1:0xB", "b")
+    keystore.close()
+    # Crash between the container write and the index write, then a torn record
+    with open(f"{path}.idx") as f:
+        first_entry = f.readline()
+    with open(f"{path}.idx", "w") as f:
+        f.write(first_entry + '{"key": "torn')
+    with open(path, "ab") as f:
+        f.write(b"\x05\x00\x10\x00\x00\x00wal")
+
+    recovered = EncryptedKeystore(path)
+    assert recovered.get("wallet:u1:0xB") == "b"
+    assert "wallet:u1:0xA" in recovered
+    recovered.put("wallet:u1:0xC", "c")
+    recovered.close()
+
+    # The torn index line was cut off, so the recovered entries load from the index
+    index_size = os.path.getsize(f"{path}.idx")
+    reopened = EncryptedKeystore(path)
+    assert [reopened.get(f"wallet:u1:0x{name}") for name in "ABC"] == ["a", "b", "c"]
+    assert os.path.getsize(f"{path}.idx") == index_size
+    reopened.close()
+
+
+def test_key_cache_expires_evicts_and_wipes():
+    cache = KeyCache(max_entries=2, ttl_seconds=10)
+    cache.put("a", b"\x01" * 32, now=0)
+    cache.put("b", b"\x02" * 32, now=0)
+    secret = cache._entries["a"][0]
+    assert cache.get("a", now=5) == b"\x01" * 32
+    cache.put("c", b"\x03" * 32, now=5)
+    # b was least recently used
+    assert cache.get("b", now=5) is None
+    assert cache.get("a", now=10) is None
+    assert secret == bytearray(32)
+    assert cache.purge_expired(now=15) == 1
+    assert len(cache) == 0
@@ -0,0 +1,42 @@
+import asyncio
+
+from web3 import Web3
+
+from app.utils.multicall import Multicall
+
+TARGETS = ["0x" + f"{i:02x}" * 20 for i in range(1, 6)]
+
+
+def _multicall(monkeypatch, fail_chunk_with=None):
+    multicall = Multicall(Web3(Web3.HTTPProvider("http://localhost:8545")), batch_size=2)
+    multicall._deployed = True
+    chunks = []
+
+    def aggregate_chunk(calls, block_identifier):
+        chunks.append(list(calls))
+        if fail_chunk_with and any(target == fail_chunk_with for target, _ in calls):
+            raise ValueError("out of gas")
+        return [(True, data) for _, data in calls]
+
+    def call(call, block_identifier):
+        target, data = call
+        return (target != fail_chunk_with, data)
+
+    monkeypatch.setattr(multicall, "_aggregate_chunk", aggregate_chunk)
+    monkeypatch.setattr(multicall, "_call", call)
+    return multicall, chunks
+
+
+def test_calls_are_chunked_by_batch_size(monkeypatch):
+    multicall, chunks = _multicall(monkeypatch)
+    calls = [(target, bytes([i])) for i, target in enumerate(TARGETS)]
+    assert multicall.aggregate(calls) == [(True, bytes([i])) for i in range(5)]
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+
+def test_failed_aggregate_falls_back_to_single_calls(monkeypatch):
+    multicall, _ = _multicall(monkeypatch, fail_chunk_with=TARGETS[2])
+    calls = [(target, bytes([i])) for i, target in enumerate(TARGETS)]
+    expected = [(i != 2, bytes([i])) for i in range(5)]
+    assert multicall.aggregate(calls) == expected
+    assert asyncio.run(multicall.aggregate_async(calls)) == expected
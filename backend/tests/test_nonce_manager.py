@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services.nonce_manager import NonceManager, is_nonce_too_low
+
+WALLET = "0x" + "11" * 20
+
+
+class FakeEth:
+    """Node view of the wallet's pending transaction count"""
+
+    def __init__(self, pending=0):
+        self.pending = pending
+        self.count_calls = 0
+
+    def get_transaction_count(self, address, block_identifier):
+        assert block_identifier == "pending"
+        self.count_calls += 1
+        return self.pending
+
+
+def _manager(pending=0):
+    eth = FakeEth(pending)
+    return NonceManager(SimpleNamespace(eth=eth)), eth
+
+
+def test_allocation_is_local_after_one_count_and_reuses_gaps():
+    async def scenario():
+        nonces, eth = _manager(pending=5)
+        assert await nonces.allocate_many(WALLET, 4) == [5, 6, 7, 8]
+        await nonces.release(WALLET, 6)
+        await nonces.release(WALLET, 7)
+        # Lowest gap first, then the counter
+        assert await nonces.allocate_many(WALLET, 3) == [6, 7, 9]
+        # Releasing the newest nonce rolls the counter back instead of leaving a gap
+        await nonces.release(WALLET, 9)
+        assert await nonces.allocate(WALLET) == 9
+        assert eth.count_calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_allocations_never_share_a_nonce():
+    async def scenario():
+        nonces, _ = _manager(pending=3)
+        allocated = await asyncio.gather(*(nonces.allocate(WALLET) for _ in range(20)))
+        assert sorted(allocated) == list(range(3, 23))
+
+    asyncio.run(scenario())
+
+
+def test_resync_after_nonce_too_low():
+    async def scenario():
+        nonces, eth = _manager(pending=0)
+        first = await nonces.allocate(WALLET)
+        await nonces.mark_sent(WALLET, first, "0xa")
+        held = await nonces.allocate(WALLET)
+        # The wallet sent two transactions this manager did not allocate
+        eth.pending = 3
+        assert is_nonce_too_low(ValueError("{'code': -32000, 'message': 'nonce too low'}"))
+        assert not is_nonce_too_low(ValueError("insufficient funds for gas"))
+
+        assert await nonces.resync(WALLET) == 3
+        assert await nonces.allocate(WALLET) == 3
+        # The stale reservation below the node's count is dropped, not reused
+        await nonces.release(WALLET, held)
+        assert await nonces.allocate(WALLET) == 4
+
+    asyncio.run(scenario())
+
+
+def test_reconcile_reports_dropped_transactions_and_refills_the_gap():
+    async def scenario():
+        nonces, eth = _manager(pending=10)
+        for nonce, tx_hash in zip(await nonces.allocate_many(WALLET, 3), ("0xa", "0xb", "0xc")):
+            await nonces.mark_sent(WALLET, nonce, tx_hash)
+        eth.pending = 13
+        assert await nonces.reconcile(WALLET) == []
+
+        for nonce, tx_hash in zip(await nonces.allocate_many(WALLET, 3), ("0xd", "0xe", "0xf")):
+            await nonces.mark_sent(WALLET, nonce, tx_hash)
+        # 0xd was mined, 0xe fell out of the pool and 0xf is stuck behind it
+        eth.pending = 14
+        assert await nonces.reconcile(WALLET) == ["0xe", "0xf"]
+        assert await nonces.allocate(WALLET) == 14
+        assert await nonces.reconcile(WALLET) == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from app.utils.quantile_sketch import QuantileSketch, percentile_summary
+
+_rng = random.Random(7)
+VALUES = [_rng.lognormvariate(4, 1.5) for _ in range(20000)]
+
+
+def _exact(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+@pytest.mark.parametrize("q", [0.01, 0.5, 0.9, 0.99, 1.0])
+def test_quantiles_are_within_relative_accuracy(q):
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    sketch.add_many(VALUES)
+    assert sketch.quantile(q) == pytest.approx(_exact(VALUES, q), rel=0.01)
+
+
+def test_single_adds_merge_and_vectorized_adds_agree():
+    one_by_one, halves, vectorized = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    second_half = QuantileSketch()
+    for value in VALUES[:500]:
+        one_by_one.add(value)
+    halves.add_many(VALUES[:250])
+    second_half.add_many(VALUES[250:500])
+    halves.merge(second_half)
+    vectorized.add_many(VALUES[:500])
+    assert len(one_by_one.bins) > 100
+    assert one_by_one.bins == pytest.approx(halves.bins)
+    assert one_by_one.bins == pytest.approx(vectorized.bins)
+    assert percentile_summary(one_by_one) == percentile_summary(vectorized)
+
+
+def test_zeros_nans_and_weights():
+    sketch = QuantileSketch()
+    sketch.add_many([0.0, float("nan"), 10.0, 100.0], weights=[2, 5, 1, 1])
+    assert sketch.count == 4
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(100, rel=0.01)
+    assert QuantileSketch().quantile(0.5) == 0.0
+
+
+def test_bin_cap_only_collapses_low_values_and_round_trips():
+    sketch = QuantileSketch(max_bins=200)
+    sketch.add_many(VALUES)
+    assert len(sketch.bins) <= 200
+    # Collapsed low bins are reported at the lowest kept bin
+    assert sketch.quantile(0.01) > _exact(VALUES, 0.01) * 1.01
+    assert sketch.quantile(0.99) == pytest.approx(_exact(VALUES, 0.99), rel=0.01)
+
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+    assert restored.bins == sketch.bins
+    assert percentile_summary(restored) == percentile_summary(sketch)
@@ -0,0 +1,50 @@
+import time
+
+from app.services.analytics_service import AnalyticsService
+from app.utils.query_cache import GenerationalCache
+
+
+def test_hits_only_at_the_stored_generation():
+    cache = GenerationalCache()
+    cache.put("q", 1, {"total": 3})
+    assert cache.get("q", 1) == {"total": 3}
+    assert cache.get("q", 2) is None
+    # The stale entry was dropped, so the old generation misses too
+    assert cache.get("q", 1) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["stale"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_values_are_copied_and_least_recently_used_evicted():
+    cache = GenerationalCache(max_entries=2)
+    value = {"rows": [1]}
+    cache.put("a", 0, value)
+    value["rows"].append(2)
+    cache.get("a", 0)["rows"].append(3)
+    assert cache.get("a", 0) == {"rows": [1]}
+
+    cache.put("b", 0, {})
+    cache.get("a", 0)
+    cache.put("c", 0, {})
+    assert cache.get("b", 0) is None and cache.get("a", 0) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_service_results_are_invalidated_by_their_event_types(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = AnalyticsService(max_workers=1)
+    now = int(time.time())
+    analytics.track_event("ai_decision", {"timestamp": now, "processing_time_ms": 10, "success": True})
+
+    first = analytics.get_ai_performance_metrics("today")
+    assert analytics.get_ai_performance_metrics("today") == first
+    assert analytics.get_cache_stats()["hits"] == 1
+
+    # Other event types leave the entry valid
+    analytics.track_event("quest_started", {"timestamp": now, "user_id": "u1"})
+    analytics.get_ai_performance_metrics("today")
+    assert analytics.get_cache_stats()["hits"] == 2
+
+    analytics.track_event("ai_decision", {"timestamp": now, "processing_time_ms": 30, "success": False})
+    assert analytics.get_ai_performance_metrics("today") != first
+    assert analytics.get_cache_stats()["stale"] == 1
+    analytics.close()
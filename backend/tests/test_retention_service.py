@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app.services.analytics_service import AnalyticsService
+from app.services.retention_service import RetentionManager, RetentionPolicy
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def analytics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = AnalyticsService(max_workers=1)
+    yield service
+    service.close()
+
+
+def _segment(analytics, *timestamps):
+    for timestamp in timestamps:
+        analytics.track_event("ai_decision", {"timestamp": timestamp, "intent": "quest", "success": True})
+    return analytics.seal_segment("ai_decision")
+
+
+def _manager(analytics, **policy):
+    return RetentionManager(analytics, default_policy=RetentionPolicy(max_active_bytes=0, max_active_age=0,
+                                                                      **policy))
+
+
+def test_segments_expire_by_their_newest_event_not_mtime(analytics):
+    now = int(time.time())
+    old = _segment(analytics, now - 10 * DAY, now - 9 * DAY)
+    recent = _segment(analytics, now - 10 * DAY, now - 60)
+    # Rewritten by compression, so the old segment's mtime is fresh
+    assert analytics.compress_segment("ai_decision", old)
+    os.utime(analytics.closed_segments("ai_decision")[1]["path"], (now - 10 * DAY, now - 10 * DAY))
+
+    stats = _manager(analytics, retention_seconds=7 * DAY, compress=False).run()
+
+    assert stats["dropped"] == 1
+    assert [segment["seq"] for segment in analytics.closed_segments("ai_decision")] == [recent]
+    assert [event["timestamp"] for event in analytics.get_events("ai_decision")] == [now - 60, now - 10 * DAY]
+
+
+def test_expiry_stops_at_first_segment_with_recent_events(analytics):
+    now = int(time.time())
+    _segment(analytics, now - 60)
+    _segment(analytics, now - 10 * DAY)
+
+    stats = _manager(analytics, retention_seconds=7 * DAY, compress=False).run()
+
+    assert stats["dropped"] == 0
+    assert len(analytics.closed_segments("ai_decision")) == 2
+
+
+def test_newest_timestamps_survive_migration_and_drop(analytics):
+    now = int(time.time())
+    first = _segment(analytics, now - 5, now - 50)
+    second = _segment(analytics, now - 3)
+    assert [segment["newest_timestamp"] for segment in analytics.closed_segments("ai_decision")] == [now - 5, now - 3]
+
+    assert analytics.migrate_codec("binary")
+    assert analytics._newest_timestamps("ai_decision") == {first: now - 5, second: now - 3}
+    assert analytics.drop_segments("ai_decision", first) == 1
+    assert analytics._newest_timestamps("ai_decision") == {second: now - 3}
+
+
+def test_compression_waits_for_open_readers(analytics):
+    now = int(time.time())
+    seq = _segment(analytics, now - 2, now - 1)
+    reader = analytics.iter_events("ai_decision", newest_first=False)
+    next(reader)
+
+    compressor = threading.Thread(target=analytics.compress_segment, args=("ai_decision", seq))
+    compressor.start()
+    compressor.join(0.3)
+    assert compressor.is_alive()
+    assert [event["timestamp"] for event in reader] == [now - 1]
+
+    reader.close()
+    compressor.join(5)
+    assert not compressor.is_alive()
+    assert analytics.closed_segments("ai_decision")[0]["compressed"]
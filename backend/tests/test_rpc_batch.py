@@ -0,0 +1,51 @@
+import json
+
+from web3 import Web3
+
+from app.utils import rpc_batch
+from app.utils.rpc_batch import RPCError, batch_request, to_int
+
+CALLS = [("eth_blockNumber", []), ("eth_getBalance", ["0x" + "11" * 20, "0x10"]), ("eth_chainId", [])]
+
+
+def _http(monkeypatch, answer):
+    w3 = Web3(Web3.HTTPProvider("http://localhost:8545"))
+    posts, singles = [], []
+
+    def post(endpoint_uri, data, **kwargs):
+        posts.append(json.loads(data))
+        return json.dumps(answer(posts[-1])).encode()
+
+    monkeypatch.setattr(rpc_batch, "make_post_request", post)
+    monkeypatch.setattr(w3.provider, "make_request",
+                        lambda method, params: singles.append(method) or {"jsonrpc": "2.0", "id": 1, "result": "0x1"})
+    return w3, posts, singles
+
+
+def test_batch_is_one_post_with_results_in_call_order(monkeypatch):
+    def answer(payload):
+        responses = [{"jsonrpc": "2.0", "id": request["id"], "result": hex(request["id"] + 5)} for request in payload]
+        responses[1] = {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "header not found"}}
+        return responses[::-1]
+
+    w3, posts, singles = _http(monkeypatch, answer)
+    results = batch_request(w3, CALLS)
+    assert [request["method"] for request in posts[0]] == [method for method, _ in CALLS]
+    assert to_int(results[0]) == 5 and to_int(results[2]) == 7
+    assert isinstance(results[1], RPCError) and str(results[1]) == "header not found"
+    assert len(posts) == 1 and singles == []
+    assert batch_request(w3, []) == []
+
+
+def test_nodes_without_batch_support_get_single_requests(monkeypatch):
+    w3, posts, singles = _http(monkeypatch, lambda payload: {"jsonrpc": "2.0", "id": None,
+                                                             "error": {"message": "batch not supported"}})
+    assert [to_int(result) for result in batch_request(w3, CALLS)] == [1, 1, 1]
+    assert len(posts) == 1 and singles == [method for method, _ in CALLS]
+
+
+def test_missing_responses_are_errors(monkeypatch):
+    w3, _, _ = _http(monkeypatch, lambda payload: [{"jsonrpc": "2.0", "id": 0, "result": "0x2a"}])
+    results = batch_request(w3, CALLS)
+    assert to_int(results[0]) == 42
+    assert all(isinstance(result, RPCError) for result in results[1:])
@@ -0,0 +1,38 @@
+import threading
+
+from app.utils.rw_lock import ReadWriteLock
+
+
+def test_readers_share_and_writers_wait_for_them():
+    lock = ReadWriteLock()
+    acquired = threading.Event()
+
+    def write():
+        with lock.exclusive():
+            acquired.set()
+
+    with lock.shared():
+        # Re-entrant for a thread that already reads, e.g. nested generators
+        with lock.shared():
+            writer = threading.Thread(target=write)
+            writer.start()
+            assert not acquired.wait(0.1)
+        assert not acquired.wait(0.05)
+    writer.join(5)
+    assert acquired.is_set()
+
+
+def test_readers_wait_for_an_active_writer():
+    lock = ReadWriteLock()
+    reading = threading.Event()
+
+    def read():
+        with lock.shared():
+            reading.set()
+
+    with lock.exclusive():
+        reader = threading.Thread(target=read)
+        reader.start()
+        assert not reading.wait(0.1)
+    reader.join(5)
+    assert reading.is_set()
@@ -0,0 +1,63 @@
+import asyncio
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from app.services.signature_service import SignatureService
+
+ACCOUNT = Account.from_key("0x" + "42" * 32)
+MESSAGE = "Sign in to Quest-AI"
+SIGNATURE = Account.sign_message(encode_defunct(text=MESSAGE), ACCOUNT.key).signature.hex()
+
+
+class BrokenPool(Executor):
+    """Pool whose worker died: every submitted task fails"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+
+def test_concurrent_requests_share_one_batch_and_memo():
+    service = SignatureService(use_processes=False, max_workers=1)
+
+    async def verify_many():
+        return await asyncio.gather(
+            service.verify(ACCOUNT.address, MESSAGE, SIGNATURE),
+            service.verify(ACCOUNT.address.lower(), MESSAGE, SIGNATURE),
+            service.verify("0x" + "11" * 20, MESSAGE, SIGNATURE),
+            service.verify(ACCOUNT.address, MESSAGE, "0x1234"),
+        )
+
+    assert asyncio.run(verify_many()) == [True, True, False, False]
+    assert service._memo_get((MESSAGE, SIGNATURE)) == (True, ACCOUNT.address)
+    assert service._in_flight == {}
+    service.close()
+
+
+def test_shut_down_pool_resolves_waiters_and_is_replaced():
+    service = SignatureService(use_processes=False, max_workers=1)
+    dead = ThreadPoolExecutor(max_workers=1)
+    dead.shutdown()
+    service._executor = dead
+
+    assert asyncio.run(asyncio.wait_for(service.verify(ACCOUNT.address, MESSAGE, SIGNATURE), 5)) is False
+    assert service._in_flight == {}
+    assert service._executor is None
+    # The failure was not memoized, so the retry recovers on a new pool
+    assert asyncio.run(service.verify(ACCOUNT.address, MESSAGE, SIGNATURE)) is True
+    service.close()
+
+
+def test_broken_pool_resolves_waiters_and_is_replaced():
+    service = SignatureService(use_processes=False, max_workers=1)
+    service._executor = BrokenPool()
+
+    assert asyncio.run(asyncio.wait_for(service.verify(ACCOUNT.address, MESSAGE, SIGNATURE), 5)) is False
+    assert service._in_flight == {}
+    assert service._executor is None
+    assert asyncio.run(service.verify(ACCOUNT.address, MESSAGE, SIGNATURE)) is True
+    service.close()
@@ -0,0 +1,43 @@
+from eth_abi import encode
+
+from app.utils.erc20 import DECIMALS_CALL, SYMBOL_CALL
+from app.utils.token_registry import TokenRegistry
+
+GOLD = "0x" + "aa" * 20
+BROKEN = "0x" + "bb" * 20
+
+
+class FakeMulticall:
+    """Answers decimals() and symbol() of GOLD; every other call reverts"""
+
+    def __init__(self):
+        self.batches = []
+
+    def aggregate(self, calls, block_identifier="latest"):
+        self.batches.append(list(calls))
+        answers = {(GOLD, DECIMALS_CALL): encode(["uint8"], [18]), (GOLD, SYMBOL_CALL): encode(["string"], ["GOLD"])}
+        return [((target, data) in answers, answers.get((target, data), b"")) for target, data in calls]
+
+
+def test_unknown_tokens_are_read_once_in_one_batch_and_persisted(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    multicall = FakeMulticall()
+    registry = TokenRegistry(path)
+    assert registry.resolve(multicall, [GOLD, BROKEN]) == {GOLD: {"decimals": 18, "symbol": "GOLD"}}
+    assert len(multicall.batches) == 1 and len(multicall.batches[0]) == 4
+
+    # Failed tokens are retried, known ones are not read again
+    registry.resolve(multicall, [GOLD.upper().replace("0X", "0x"), BROKEN])
+    assert multicall.batches[1] == [(BROKEN, DECIMALS_CALL), (BROKEN, SYMBOL_CALL)]
+
+    assert TokenRegistry(path).get(GOLD) == {"decimals": 18, "symbol": "GOLD"}
+    assert TokenRegistry(path).missing([BROKEN, GOLD]) == [BROKEN]
+
+
+def test_corrupt_file_starts_empty(tmp_path):
+    path = tmp_path / "tokens.json"
+    path.write_text("{not json")
+    registry = TokenRegistry(str(path))
+    assert registry.missing([GOLD]) == [GOLD]
+    registry.register({GOLD: {"decimals": 6, "symbol": "G"}})
+    assert TokenRegistry(str(path)).get(GOLD.upper().replace("0X", "0x")) == {"decimals": 6, "symbol": "G"}
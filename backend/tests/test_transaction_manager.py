@@ -0,0 +1,157 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import rlp
+from eth_account import Account
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from app.services import balance_snapshot
+from app.services.balance_snapshot import BalanceSnapshotService
+from app.services.nonce_manager import NonceManager
+from app.services.transaction_manager import TransactionManager
+
+ACCOUNT = Account.from_key("0x" + "42" * 32)
+WALLET = SimpleNamespace(address=ACCOUNT.address, private_key=ACCOUNT.key.hex())
+TARGET = "0x" + "22" * 20
+GWEI = 10 ** 9
+
+
+class FakeNode(BaseProvider):
+    """Node without Multicall3 that tracks the pending nonce of each sender"""
+
+    def __init__(self, balance=10 ** 18, pending=0):
+        self.balance = balance
+        self.pending = pending
+        self.sent = []
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def make_request(self, method, params):
+        with self.lock:
+            self.requests.append(method)
+        if method == "eth_chainId":
+            result = hex(43114)
+        elif method == "eth_blockNumber":
+            result = hex(100)
+        elif method == "eth_getCode":
+            result = "0x"
+        elif method == "eth_getBalance":
+            result = hex(self.balance)
+        elif method == "eth_getTransactionCount":
+            result = hex(self.pending)
+        elif method == "eth_estimateGas":
+            result = hex(21000)
+        elif method == "eth_sendRawTransaction":
+            raw = bytes.fromhex(params[0][2:])
+            # Type-2 envelope: 0x02 || rlp([chainId, nonce, ...])
+            nonce = int.from_bytes(rlp.decode(raw[1:])[1], "big")
+            with self.lock:
+                if nonce < self.pending:
+                    return {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "nonce too low"}}
+                self.sent.append(nonce)
+                self.pending = max(self.pending, nonce + 1)
+            result = "0x" + f"{nonce:064x}"
+        else:
+            raise ValueError(method)
+        return {"jsonrpc": "2.0", "id": 1, "result": result}
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+    def count(self, method):
+        return self.requests.count(method)
+
+
+class FixedFees:
+    """Gas oracle with a fresh suggestion for every tier"""
+
+    def cached(self, tier="standard"):
+        return {"maxFeePerGas": 30 * GWEI, "maxPriorityFeePerGas": 2 * GWEI}
+
+
+def _manager(node, **kwargs):
+    w3 = Web3(node)
+    kwargs.setdefault("balance_snapshots", BalanceSnapshotService(w3))
+    manager = TransactionManager("http://localhost:8545", nonce_manager=NonceManager(w3),
+                                 gas_oracle=FixedFees(), **kwargs)
+    manager.w3 = w3
+    return manager
+
+
+def test_shared_balance_snapshots_by_default():
+    balance_snapshot.get_balance_snapshots.cache_clear()
+    manager = TransactionManager("http://localhost:8545", gas_oracle=FixedFees())
+    assert manager.balance_snapshots is balance_snapshot.get_balance_snapshots("http://localhost:8545")
+    balance_snapshot.get_balance_snapshots.cache_clear()
+
+
+def test_fresh_snapshot_replaces_the_balance_rpc():
+    node = FakeNode()
+    manager = _manager(node)
+
+    asyncio.run(manager.build_transaction(WALLET, TARGET, "0x"))
+    assert node.count("eth_getBalance") == 1
+    # The sender is watched now, so the next refresh covers it
+    assert WALLET.address in manager.balance_snapshots._addresses
+    manager.balance_snapshots.refresh()
+    before = node.count("eth_getBalance")
+
+    asyncio.run(manager.build_transaction(WALLET, TARGET, "0x"))
+    asyncio.run(manager.build_transactions(WALLET, [{"to": TARGET}, {"to": TARGET, "value": 1}]))
+    assert node.count("eth_getBalance") == before
+
+
+def test_concurrent_builds_get_distinct_nonces_from_one_count():
+    node = FakeNode(pending=7)
+    manager = _manager(node)
+
+    async def build_many():
+        return await asyncio.gather(*(manager.build_transaction(WALLET, TARGET, "0x") for _ in range(10)))
+
+    assert sorted(tx["nonce"] for tx in asyncio.run(build_many())) == list(range(7, 17))
+    assert node.count("eth_getTransactionCount") == 1
+
+
+def test_batch_reserves_consecutive_nonces_in_request_order():
+    node = FakeNode(pending=3)
+    manager = _manager(node)
+    txs = asyncio.run(manager.build_transactions(WALLET, [
+        {"to": TARGET}, {"to": TARGET, "value": 5}, {"to": TARGET, "data": "0x01"}
+    ]))
+    assert [tx["nonce"] for tx in txs] == [3, 4, 5]
+    assert [tx["value"] for tx in txs] == [0, 5, 0]
+    assert asyncio.run(manager.build_transaction(WALLET, TARGET, "0x"))["nonce"] == 6
+    assert node.count("eth_getTransactionCount") == 1
+
+
+def test_nonces_are_released_when_funds_are_short():
+    node = FakeNode(balance=1, pending=2)
+    manager = _manager(node)
+    for build in (lambda: manager.build_transaction(WALLET, TARGET, "0x"),
+                  lambda: manager.build_transactions(WALLET, [{"to": TARGET}, {"to": TARGET}])):
+        try:
+            asyncio.run(build())
+        except ValueError as e:
+            assert "Insufficient funds" in str(e)
+        else:
+            raise AssertionError("build did not fail")
+
+    node.balance = 10 ** 18
+    manager.balance_snapshots.refresh()
+    assert asyncio.run(manager.build_transaction(WALLET, TARGET, "0x"))["nonce"] == 2
+
+
+def test_send_retries_once_after_nonce_too_low():
+    node = FakeNode()
+    manager = _manager(node)
+    first = asyncio.run(manager.execute_transaction(WALLET, TARGET, "0x", wait_for_receipt=False))
+    assert first["status"] == "sent"
+    # The wallet sent two transactions elsewhere, so local nonce 1 is already used
+    node.pending = 3
+
+    second = asyncio.run(manager.execute_transaction(WALLET, TARGET, "0x", wait_for_receipt=False))
+    assert second["status"] == "sent"
+    assert node.sent == [0, 3]
+    assert asyncio.run(manager.nonces.allocate(WALLET.address)) == 4
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+from web3 import Web3
+
+from app.services.balance_snapshot import BalanceSnapshotService
+from app.services.signature_service import SignatureService
+from app.services.wallet_service import WalletService
+from app.utils.token_registry import TokenRegistry
+
+OWNER = "0x" + "11" * 20
+GOLD = "0x" + "aa" * 20
+GEMS = "0x" + "bb" * 20
+UNKNOWN = "0x" + "cc" * 20
+
+
+def _uint(value):
+    return value.to_bytes(32, "big")
+
+
+class FakeMulticall:
+    """Answers balanceOf from a token -> raw balance map; a missing token reverts"""
+
+    def __init__(self, balances, fail_aggregate=False):
+        self.balances = balances
+        self.fail_aggregate = fail_aggregate
+
+    def aggregate(self, calls, block_identifier="latest"):
+        raise ConnectionError("node unreachable")
+
+    async def aggregate_async(self, calls, block_identifier="latest"):
+        if self.fail_aggregate:
+            raise ConnectionError("node unreachable")
+        return [(target in self.balances, _uint(self.balances.get(target, 0))) for target, _ in calls]
+
+
+def _service(tmp_path, **kwargs):
+    registry = TokenRegistry(str(tmp_path / "tokens.json"))
+    registry.register({GOLD: {"decimals": 18, "symbol": "GOLD"}, GEMS: {"decimals": 6, "symbol": "GEMS"}})
+    kwargs.setdefault("balance_snapshots", BalanceSnapshotService(Web3()))
+    return WalletService("http://localhost:8545", encryption_key="secret", token_registry=registry,
+                         keystore_path=str(tmp_path / "keystore.bin"), max_workers=1, **kwargs)
+
+
+@pytest.fixture
+def service(tmp_path):
+    wallets = _service(tmp_path)
+    wallets.multicall = FakeMulticall({GOLD: 2 * 10 ** 18, GEMS: 5 * 10 ** 6})
+    yield wallets
+    wallets.close()
+
+
+def test_failed_token_is_left_out_and_others_returned(service):
+    del service.multicall.balances[GEMS]
+    balances = asyncio.run(service.get_portfolio_balances([OWNER], [GOLD, GEMS]))
+    assert balances == {OWNER: {"GOLD": 2.0}}
+
+
+def test_metadata_failure_keeps_registered_tokens(service):
+    balances = asyncio.run(service.get_portfolio_balances([OWNER], [GOLD, UNKNOWN, GEMS]))
+    assert balances == {OWNER: {"GOLD": 2.0, "GEMS": 5.0}}
+    assert service.token_registry.get(UNKNOWN) is None
+
+
+def test_balance_read_failure_returns_empty_balances(service):
+    service.multicall.fail_aggregate = True
+    balances = asyncio.run(service.get_portfolio_balances([OWNER, OWNER.replace("1", "2")], [GOLD]))
+    assert balances == {OWNER: {}, OWNER.replace("1", "2"): {}}
+
+
+def test_unstored_wallets_outlive_the_key_cache(tmp_path):
+    wallets = _service(tmp_path, key_cache_size=1, key_ttl_seconds=0)
+    created = wallets.create_wallet()
+    imported = wallets.import_wallet("0x" + "42" * 32)
+    wallets.key_cache.clear()
+
+    assert wallets.get_wallet(created.address).private_key == created.private_key
+    assert wallets.get_wallet(imported.address).private_key == imported.private_key
+    assert wallets.get_wallet(OWNER) is None
+    wallets.close()
+
+
+def test_unstored_keys_are_wiped_when_stored_evicted_or_closed(tmp_path):
+    wallets = _service(tmp_path, unstored_key_limit=2)
+    first, second = wallets.create_wallet(), wallets.create_wallet()
+    first_key, second_key = (wallets._unstored._entries[w.address][0] for w in (first, second))
+    wallets.store_encrypted_wallet(second, "user-1")
+    assert second_key == bytearray(32)
+
+    wallets.create_wallet()
+    fourth = wallets.create_wallet()
+    # The least recently used unstored key was evicted
+    assert first_key == bytearray(32)
+    assert wallets.get_wallet(first.address) is None
+    assert wallets.get_wallet(second.address).private_key == second.private_key
+    fourth_key = wallets._unstored._entries[fourth.address][0]
+    wallets.close()
+    assert fourth_key == bytearray(32)
+    assert len(wallets._unstored) == 0
+
+
+def test_stored_wallets_are_read_back_from_the_keystore(tmp_path):
+    wallets = _service(tmp_path, key_cache_size=1)
+    created = wallets.create_wallet()
+    storage_key = wallets.store_encrypted_wallet(created, "user-1")
+    assert wallets._unstored.get(created.address) is None
+    wallets.key_cache.clear()
+
+    assert wallets.get_wallet(created.address).private_key == created.private_key
+    wallets.close()
+    assert _service(tmp_path).load_encrypted_wallet(storage_key).address == created.address
+
+
+def test_signature_verification_sync_and_batched(service):
+    service.signature_service = SignatureService(use_processes=False, max_workers=1)
+    wallet = service.create_wallet()
+    signature = service.sign_message(wallet, "hello")
+    assert service.verify_wallet_signature(wallet.address, "hello", signature) is True
+    assert service.verify_wallet_signature(wallet.address, "other", signature) is False
+    assert asyncio.run(service.averify_wallet_signature(wallet.address, "hello", signature)) is True
+    service.signature_service.close()
+
+
+def test_created_and_stored_wallets_are_watched(tmp_path):
+    wallets = _service(tmp_path)
+    created = wallets.create_wallet()
+    imported = wallets.import_wallets(["0x" + "42" * 32], user_id="user-1")[0]
+    assert list(wallets.balance_snapshots._addresses) == [created.address, imported.address]
+    wallets.close()
+
+    reopened = _service(tmp_path)
+    assert list(reopened.balance_snapshots._addresses) == [imported.address]
+
+
+@pytest.mark.parametrize("chunk_size", [256, 2])
+def test_bulk_wallets_bypass_the_key_cache(tmp_path, chunk_size):
+    wallets = _service(tmp_path, key_cache_size=1)
+    keys = ["0x" + f"{i:02x}" * 32 for i in range(1, 6)]
+    unstored = wallets.import_wallets(keys[:3], chunk_size=chunk_size)
+    stored = list(wallets.iter_import_wallets(keys[3:], user_id="user-1", chunk_size=chunk_size))
+    assert len(wallets.key_cache) == 0
+    assert len(wallets._unstored) == len(unstored)
+
+    signatures = wallets.sign_messages([wallet.address for wallet in unstored + stored], "hello")
+    for wallet in unstored + stored:
+        assert wallets.verify_wallet_signature(wallet.address, "hello", signatures[wallet.address])
+    assert len(wallets.key_cache) == 1
+    wallets.close()